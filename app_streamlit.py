@@ -3,12 +3,284 @@ Application Streamlit - Estimateur Immobilier DVF
 Version complète avec backend robuste
 """
 
+import io
+from typing import Dict, Optional
+
 import streamlit as st
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-from dvf_backend import estimer_bien, Standing
+from dvf_backend import (
+    donnees_simulees, estimer_depuis_analyse, prix_reference_commune, source_donnees,
+    BienImmobilier, COEFFICIENTS_STANDING, Standing
+)
+from dvf_chargements import ChargementsAnalyses
+from dvf_resultats import Estimation
+
+# Latence maximale d'une estimation avant bascule sur les données simulées (secondes)
+DEADLINE_ESTIMATION = 8.0
+# Délai avant d'interroger la source DVF secondaire en parallèle (secondes)
+DELAI_HEDGE = 1.5
+# Durée de conservation d'une analyse de marché, partagée entre sessions (secondes)
+TTL_ANALYSES = 3600
+# Intervalle de rafraîchissement de la page pendant le chargement (secondes)
+INTERVALLE_SONDAGE = 0.5
+
+AIDE_FOURCHETTE = ("Prix au m² de 95 % des ventes retenues de la commune (quantiles "
+                   "2,5 % et 97,5 %), ajustés du standing : écart de prix d'un bien à l'autre")
+
+
+# ============================================================================
+# CHARGEMENTS EN ARRIÈRE-PLAN ET CACHES
+# ============================================================================
+
+@st.cache_resource
+def obtenir_chargements() -> ChargementsAnalyses:
+    """Chargements partagés par toutes les sessions (les threads n'appellent jamais Streamlit)"""
+    return ChargementsAnalyses(
+        workers=4,
+        ttl=TTL_ANALYSES,
+        delai_hedge=DELAI_HEDGE,
+        deadline=DEADLINE_ESTIMATION
+    )
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def tracer_evolution(evolution: pd.DataFrame) -> bytes:
+    """Graphique d'évolution en PNG, mis en cache selon le contenu de `evolution`"""
+    # matplotlib importé au premier graphique seulement (démarrage de l'application)
+    from matplotlib.figure import Figure
+    
+    # Figure sans pyplot : rendu sûr depuis les threads des différentes sessions
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    
+    ax.plot(
+        evolution['annee'],
+        evolution['prix_m2'],
+        marker='o',
+        color='#2ecc71',
+        linewidth=2,
+        markersize=8
+    )
+    
+    ax.set_title(
+        "Évolution du prix au m²",
+        fontsize=14,
+        fontweight='bold'
+    )
+    ax.set_xlabel("Année", fontsize=11)
+    ax.set_ylabel("Prix €/m²", fontsize=11)
+    ax.grid(True, linestyle='--', alpha=0.3)
+    
+    # Ligne de tendance si suffisamment de données
+    if len(evolution) > 1:
+        z = np.polyfit(evolution['annee'], evolution['prix_m2'], 1)
+        p = np.poly1d(z)
+        ax.plot(
+            evolution['annee'],
+            p(evolution['annee']),
+            "r--",
+            alpha=0.5,
+            label=f"Tendance: {'+' if z[0]>0 else ''}{int(z[0])}€/an"
+        )
+        ax.legend()
+    
+    fig.tight_layout()
+    tampon = io.BytesIO()
+    fig.savefig(tampon, format='png', dpi=100)
+    return tampon.getvalue()
+
+
+# ============================================================================
+# AFFICHAGE DES RÉSULTATS
+# ============================================================================
+
+def afficher_zone_resultats(sondage: bool) -> None:
+    """
+    Résultat provisoire tant que l'analyse charge, puis résultat complet
+    
+    Exécutée comme fragment rafraîchi toutes les INTERVALLE_SONDAGE secondes
+    pendant le chargement : seul ce bloc est réexécuté, pas la page entière.
+    """
+    demande = st.session_state.demande
+    chargement = st.session_state.chargement
+    
+    if not chargement.done():
+        afficher_resultat_provisoire(demande)
+        return
+    
+    if sondage:
+        # Réexécution complète pour arrêter le rafraîchissement périodique
+        st.rerun()
+    
+    try:
+        analyse, warning = chargement.result()
+    except Exception as e:
+        analyse, warning = None, f"Erreur lors de l'analyse : {e}"
+    
+    estimation = None
+    if analyse is not None:
+        bien = BienImmobilier(demande['code_insee'], demande['ville'], demande['surface'],
+                              demande['pieces'], demande['standing'])
+        estimation, warning = estimer_depuis_analyse(bien, analyse, warning)
+    
+    afficher_resultats(demande, estimation, warning)
+
+
+def afficher_resultat_provisoire(demande: Dict) -> None:
+    """Ordre de grandeur immédiat d'après le prix de référence du département"""
+    prix_m2 = prix_reference_commune(demande['code_insee']) * COEFFICIENTS_STANDING[demande['standing']]
+    
+    st.info(f"🔄 Analyse des transactions DVF en cours pour {demande['ville']}...")
+    
+    provisoire_col1, provisoire_col2 = st.columns(2)
+    with provisoire_col1:
+        st.metric(
+            "Estimation provisoire",
+            f"{int(prix_m2 * demande['surface']):,} €".replace(',', ' '),
+            help="Prix de référence du département, affiné dès que les transactions sont analysées"
+        )
+    with provisoire_col2:
+        st.metric(
+            "Prix de référence",
+            f"{int(prix_m2):,} €/m²".replace(',', ' ')
+        )
+
+
+def afficher_resultats(demande: Dict, estimation: Optional[Estimation], warning: Optional[str]) -> None:
+    """Statistiques du marché, graphique et estimation finale"""
+    ville = demande['ville']
+    code_insee = demande['code_insee']
+    surface = demande['surface']
+    pieces = demande['pieces']
+    standing_label = demande['standing_label']
+    
+    if estimation is None:
+        st.error(f"❌ {warning}")
+        st.info("""
+        **Suggestions:**
+        - Vérifiez que le code INSEE est correct (5 chiffres)
+        - Essayez avec une ville plus grande
+        - Consultez le site de l'INSEE pour le bon code
+        """)
+    else:
+        # Afficher l'avertissement si données simulées ou complétées
+        if donnees_simulees(warning):
+            st.warning(warning)
+            st.info("""
+            Les APIs DVF officielles sont temporairement indisponibles. 
+            Cette estimation utilise des données simulées réalistes basées 
+            sur les prix moyens du département.
+            """)
+        elif warning:
+            st.info(f"ℹ️ {warning} : {estimation['stats']['nb_transactions']} transactions DVF analysées")
+        else:
+            st.success(f"✅ {estimation['stats']['nb_transactions']} transactions DVF analysées pour {ville}")
+        
+        # Affichage des résultats
+        col1, col2 = st.columns([1, 1])
+        
+        with col1:
+            st.subheader("📊 Statistiques du marché")
+            
+            # Métriques en 2 colonnes
+            metric_col1, metric_col2 = st.columns(2)
+            with metric_col1:
+                st.metric(
+                    "Prix minimum",
+                    f"{estimation['stats']['min']:,} €/m²".replace(',', ' ')
+                )
+                st.metric(
+                    "Prix moyen",
+                    f"{estimation['stats']['moyen']:,} €/m²".replace(',', ' ')
+                )
+            
+            with metric_col2:
+                st.metric(
+                    "Prix maximum",
+                    f"{estimation['stats']['max']:,} €/m²".replace(',', ' ')
+                )
+                st.metric(
+                    "Médiane",
+                    f"{estimation['stats']['mediane']:,} €/m²".replace(',', ' ')
+                )
+            
+            st.info(f"📈 **{estimation['stats']['nb_transactions']}** transactions analysées")
+            
+            # Tendance
+            if estimation['tendance'] != 0:
+                tendance_emoji = "📈" if estimation['tendance'] > 0 else "📉"
+                tendance_text = "hausse" if estimation['tendance'] > 0 else "baisse"
+                st.metric(
+                    "Tendance du marché",
+                    f"{abs(estimation['tendance'])} €/m²/an",
+                    delta=f"{tendance_text}",
+                    delta_color="normal" if estimation['tendance'] > 0 else "inverse"
+                )
+            
+            st.markdown("---")
+            
+            st.subheader("🏠 Détails du bien")
+            st.write(f"**Localisation:** {ville} ({code_insee})")
+            st.write(f"**Surface:** {surface} m²")
+            st.write(f"**Pièces:** {pieces}")
+            st.write(f"**Standing:** {standing_label}")
+            st.write(f"**Coefficient appliqué:** {estimation['coefficient']}")
+        
+        with col2:
+            st.subheader("📈 Évolution des prix")
+            
+            if not estimation['evolution'].empty:
+                st.image(tracer_evolution(estimation['evolution']))
+            else:
+                st.info("Pas assez de données pour afficher l'évolution")
+        
+        # Résultat final
+        st.markdown("---")
+        st.markdown("## 💰 RÉSULTAT DE L'ESTIMATION")
+        
+        result_col1, result_col2, result_col3 = st.columns(3)
+        
+        with result_col1:
+            st.metric(
+                "Fourchette basse",
+                f"{estimation['fourchette_basse']:,} €".replace(',', ' '),
+                help=AIDE_FOURCHETTE
+            )
+        
+        with result_col2:
+            st.metric(
+                "🏠 VALEUR ESTIMÉE",
+                f"{estimation['valeur_estimee']:,} €".replace(',', ' ')
+            )
+        
+        with result_col3:
+            st.metric(
+                "Fourchette haute",
+                f"{estimation['fourchette_haute']:,} €".replace(',', ' '),
+                help=AIDE_FOURCHETTE
+            )
+        
+        # Informations complémentaires
+        with st.expander("🔍 Détails techniques"):
+            st.write(f"**Prix moyen secteur (brut):** {estimation['stats']['moyen']:,} €/m²".replace(',', ' '))
+            st.write(f"**Prix ajusté (avec standing):** {estimation['prix_moyen_m2']:,} €/m²".replace(',', ' '))
+            st.write(f"**Surface du bien:** {surface} m²")
+            st.write(f"**Formule:** Prix ajusté × Surface = {estimation['prix_moyen_m2']:,} × {surface} = {estimation['valeur_estimee']:,} €".replace(',', ' '))
+            intervalle = getattr(estimation, 'intervalle', None)
+            if intervalle:
+                st.write(f"**Intervalle de confiance du prix moyen ({intervalle['niveau']:.0%}, bootstrap):** "
+                         f"{intervalle['bas']:,.0f} – {intervalle['haut']:,.0f} €/m²".replace(',', ' '))
+            st.write(f"**Source des données:** {source_donnees(warning)}")
+        
+        # Note finale
+        st.success("""
+        ✅ **Note importante**
+        
+        Cette estimation est indicative et ne constitue pas un avis de valeur professionnel.
+        Elle est basée sur l'analyse des transactions immobilières récentes dans la commune.
+        """)
+
 
 # Configuration de la page
 st.set_page_config(
@@ -108,173 +380,20 @@ with st.sidebar:
 
 # Zone principale
 if estimer_button:
-    with st.spinner(f"🔄 Analyse en cours pour {ville}..."):
-        
-        # Appel du backend
-        estimation, warning = estimer_bien(
-            ville=ville,
-            code_insee=code_insee,
-            surface=surface,
-            pieces=pieces,
-            standing=standing
-        )
-        
-        if estimation is None:
-            st.error(f"❌ {warning}")
-            st.info("""
-            **Suggestions:**
-            - Vérifiez que le code INSEE est correct (5 chiffres)
-            - Essayez avec une ville plus grande
-            - Consultez le site de l'INSEE pour le bon code
-            """)
-        else:
-            # Afficher l'avertissement si données simulées
-            if warning:
-                st.warning(warning)
-                st.info("""
-                Les APIs DVF officielles sont temporairement indisponibles. 
-                Cette estimation utilise des données simulées réalistes basées 
-                sur les prix moyens du département.
-                """)
-            else:
-                st.success(f"✅ {estimation['stats']['nb_transactions']} transactions DVF analysées pour {ville}")
-            
-            # Affichage des résultats
-            col1, col2 = st.columns([1, 1])
-            
-            with col1:
-                st.subheader("📊 Statistiques du marché")
-                
-                # Métriques en 2 colonnes
-                metric_col1, metric_col2 = st.columns(2)
-                with metric_col1:
-                    st.metric(
-                        "Prix minimum",
-                        f"{estimation['stats']['min']:,} €/m²".replace(',', ' ')
-                    )
-                    st.metric(
-                        "Prix moyen",
-                        f"{estimation['stats']['moyen']:,} €/m²".replace(',', ' ')
-                    )
-                
-                with metric_col2:
-                    st.metric(
-                        "Prix maximum",
-                        f"{estimation['stats']['max']:,} €/m²".replace(',', ' ')
-                    )
-                    st.metric(
-                        "Médiane",
-                        f"{estimation['stats']['mediane']:,} €/m²".replace(',', ' ')
-                    )
-                
-                st.info(f"📈 **{estimation['stats']['nb_transactions']}** transactions analysées")
-                
-                # Tendance
-                if estimation['tendance'] != 0:
-                    tendance_emoji = "📈" if estimation['tendance'] > 0 else "📉"
-                    tendance_text = "hausse" if estimation['tendance'] > 0 else "baisse"
-                    st.metric(
-                        "Tendance du marché",
-                        f"{abs(estimation['tendance'])} €/m²/an",
-                        delta=f"{tendance_text}",
-                        delta_color="normal" if estimation['tendance'] > 0 else "inverse"
-                    )
-                
-                st.markdown("---")
-                
-                st.subheader("🏠 Détails du bien")
-                st.write(f"**Localisation:** {ville} ({code_insee})")
-                st.write(f"**Surface:** {surface} m²")
-                st.write(f"**Pièces:** {pieces}")
-                st.write(f"**Standing:** {standing_label}")
-                st.write(f"**Coefficient appliqué:** {estimation['coefficient']}")
-            
-            with col2:
-                st.subheader("📈 Évolution des prix")
-                
-                if not estimation['evolution'].empty:
-                    # Créer le graphique
-                    fig, ax = plt.subplots(figsize=(10, 5))
-                    
-                    evolution = estimation['evolution']
-                    ax.plot(
-                        evolution['annee'],
-                        evolution['prix_m2'],
-                        marker='o',
-                        color='#2ecc71',
-                        linewidth=2,
-                        markersize=8
-                    )
-                    
-                    ax.set_title(
-                        "Évolution du prix au m²",
-                        fontsize=14,
-                        fontweight='bold'
-                    )
-                    ax.set_xlabel("Année", fontsize=11)
-                    ax.set_ylabel("Prix €/m²", fontsize=11)
-                    ax.grid(True, linestyle='--', alpha=0.3)
-                    
-                    # Ligne de tendance si suffisamment de données
-                    if len(evolution) > 1:
-                        import numpy as np
-                        z = np.polyfit(evolution['annee'], evolution['prix_m2'], 1)
-                        p = np.poly1d(z)
-                        ax.plot(
-                            evolution['annee'],
-                            p(evolution['annee']),
-                            "r--",
-                            alpha=0.5,
-                            label=f"Tendance: {'+' if z[0]>0 else ''}{int(z[0])}€/an"
-                        )
-                        ax.legend()
-                    
-                    plt.tight_layout()
-                    st.pyplot(fig)
-                    plt.close()
-                else:
-                    st.info("Pas assez de données pour afficher l'évolution")
-            
-            # Résultat final
-            st.markdown("---")
-            st.markdown("## 💰 RÉSULTAT DE L'ESTIMATION")
-            
-            result_col1, result_col2, result_col3 = st.columns(3)
-            
-            with result_col1:
-                st.metric(
-                    "Fourchette basse (-5%)",
-                    f"{estimation['fourchette_basse']:,} €".replace(',', ' ')
-                )
-            
-            with result_col2:
-                st.metric(
-                    "🏠 VALEUR ESTIMÉE",
-                    f"{estimation['valeur_estimee']:,} €".replace(',', ' ')
-                )
-            
-            with result_col3:
-                st.metric(
-                    "Fourchette haute (+5%)",
-                    f"{estimation['fourchette_haute']:,} €".replace(',', ' ')
-                )
-            
-            # Informations complémentaires
-            with st.expander("🔍 Détails techniques"):
-                st.write(f"**Prix moyen secteur (brut):** {estimation['stats']['moyen']:,} €/m²".replace(',', ' '))
-                st.write(f"**Prix ajusté (avec standing):** {estimation['prix_moyen_m2']:,} €/m²".replace(',', ' '))
-                st.write(f"**Surface du bien:** {surface} m²")
-                st.write(f"**Formule:** Prix ajusté × Surface = {estimation['prix_moyen_m2']:,} × {surface} = {estimation['valeur_estimee']:,} €".replace(',', ' '))
-                st.write(f"**Source des données:** {'Données simulées' if warning else 'API DVF officielle'}")
-            
-            # Note finale
-            st.success("""
-            ✅ **Note importante**
-            
-            Cette estimation est indicative et ne constitue pas un avis de valeur professionnel.
-            Elle est basée sur l'analyse des transactions immobilières récentes dans la commune.
-            """)
+    # La demande est conservée entre les reruns, le chargement démarre en arrière-plan
+    st.session_state.demande = {
+        'ville': ville,
+        'code_insee': code_insee,
+        'surface': surface,
+        'pieces': pieces,
+        'standing': standing,
+        'standing_label': standing_label,
+    }
+    st.session_state.chargement = obtenir_chargements().lancer(code_insee)
 
+if 'demande' in st.session_state:
+    en_cours = not st.session_state.chargement.done()
+    st.fragment(run_every=INTERVALLE_SONDAGE if en_cours else None)(afficher_zone_resultats)(en_cours)
 else:
     # Message d'accueil
     st.info("👈 Configurez les paramètres dans la barre latérale et cliquez sur **Estimer le bien**")
@@ -0,0 +1,653 @@
+"""
+Estimateur Immobilier - Benchmarks du pipeline DVF
+Mesures entièrement hors ligne (serveur DVF local, fixtures CSV enregistrées
+ou générées), étape par étape : temps médian et pic mémoire.
+
+Usage :
+    python benchmark_dvf.py pipeline --sortie bench_base.json
+    python benchmark_dvf.py pipeline --comparer bench_base.json
+    python benchmark_dvf.py parsing --lignes 150000
+    python benchmark_dvf.py demarrage --budget 100
+    python benchmark_dvf.py parallele --lignes 4000000 --workers-max 32
+    python benchmark_dvf.py enregistrer --fixtures ./fixtures_bench
+
+Les contrôles de justesse (budget de démarrage, parsing en flux, détection
+des régressions) tournent aussi sous pytest : test_benchmark_dvf.py.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+from typing import Callable, Dict, List, Optional
+
+
+# Communes de référence : (nom du cas, code INSEE, lignes générées à défaut de fixture)
+COMMUNES_BENCH = [
+    ('petite', '33114', 150),
+    ('moyenne', '33063', 12_000),
+    ('grande', '75056', 60_000),
+]
+
+# Taille des jeux synthétiques (transactions déjà filtrées)
+LIGNES_SYNTHETIQUES = 1_000_000
+
+# Modèle hédonique : départements × communes synthétiques et taille du lot prédit
+DEPARTEMENTS_HEDONIQUES = 40
+COMMUNES_PAR_DEPARTEMENT = 60
+LOT_PREDICTION = 10_000
+
+# Statistiques par commune en parallèle : communes synthétiques (ordre national)
+COMMUNES_PARALLELE = 35_000
+
+# Budget de `python -X importtime -c "import dvf_backend"` (ms, cumul du module)
+BUDGET_IMPORT_MS = 100
+
+# Écart relatif au-delà duquel une étape est signalée comme régression
+SEUIL_REGRESSION = 0.10
+
+# Écart absolu en deçà duquel une variation est considérée comme du bruit
+PLANCHER_BRUIT_S = 0.001
+
+REPERTOIRE_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures_bench')
+
+
+def _rss_pic_mo() -> float:
+    """Pic de mémoire résidente du processus courant (Mo)"""
+    try:
+        with open('/proc/self/status') as f:
+            for ligne in f:
+                if ligne.startswith('VmHWM:'):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return pic / (1024 * 1024) if sys.platform == 'darwin' else pic / 1024
+
+
+def _reinitialiser_pic_rss() -> None:
+    """Ramène le pic RSS au niveau courant (Linux uniquement, sinon sans effet)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+# ============================================================================
+# PARSING DES CSV (AVANT / APRÈS LECTURE EN FLUX)
+# ============================================================================
+
+def _parsing_complet(url: str):
+    """Ancien chemin : corps entier en str, toutes colonnes inférées, puis filtrage"""
+    from io import StringIO
+    import pandas as pd
+    from dvf_backend import _filtrer_transactions
+    from dvf_fetch import obtenir_session
+
+    response = obtenir_session().get(url, timeout=60)
+    return _filtrer_transactions(pd.read_csv(StringIO(response.text)))
+
+
+def _parsing_flux(url: str):
+    """Chemin actuel : lecture en flux, colonnes élaguées, types explicites"""
+    from dvf_backend import lire_csv_dvf
+    from dvf_fetch import obtenir_session
+
+    with obtenir_session().get(url, timeout=60, stream=True) as response:
+        response.raw.decode_content = True
+        return lire_csv_dvf(response.raw)
+
+
+def _mesurer_parsing(variante: str, url: str) -> Dict:
+    """Exécuté dans un sous-processus isolé pour que le pic RSS soit comparable"""
+    import pandas  # noqa: F401  (import exclu de la mesure)
+    import dvf_backend  # noqa: F401
+
+    _reinitialiser_pic_rss()
+    rss_depart = _rss_pic_mo()
+    debut = time.perf_counter()
+    df = (_parsing_complet if variante == 'avant' else _parsing_flux)(url)
+    return {
+        'variante': variante,
+        'duree_s': round(time.perf_counter() - debut, 3),
+        'rss_pic_mo': round(_rss_pic_mo() - rss_depart, 1),
+        'lignes': len(df),
+    }
+
+
+def bench_parsing(nb_lignes: int = 150_000) -> Dict:
+    """Compare le parsing d'un gros CSV communal (type Paris) avant/après"""
+    from dvf_serveur_local import ServeurDVFLocal, generer_csv_dvf
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        corps = generer_csv_dvf('75056', 2023, nb_lignes, prix_m2=10000)
+        with open(os.path.join(repertoire, '75056.csv'), 'wb') as f:
+            f.write(corps)
+
+        with ServeurDVFLocal(repertoire, generer=False) as serveur:
+            url = serveur.url_datagouv.format(annee=2023, dept='75', code_insee='75056')
+            resultats = {}
+            for variante in ('avant', 'apres'):
+                sortie = subprocess.run(
+                    [sys.executable, __file__, '_parsing', variante, url],
+                    check=True, capture_output=True, text=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                )
+                resultats[variante] = json.loads(sortie.stdout.strip().splitlines()[-1])
+
+    resultats['csv_mo'] = round(len(corps) / (1024 * 1024), 1)
+    return resultats
+
+
+# ============================================================================
+# DÉMARRAGE (IMPORTS DIFFÉRÉS)
+# ============================================================================
+
+def _duree_import_ms(module: str = 'dvf_backend') -> float:
+    """Cumul `-X importtime` de `module` dans un interpréteur neuf (ms)"""
+    sortie = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    for ligne in reversed(sortie.stderr.splitlines()):
+        champs = [c.strip() for c in ligne.split('|')]
+        if len(champs) == 3 and champs[2] == module:
+            return int(champs[1]) / 1000
+    raise RuntimeError(f"{module} absent de la sortie -X importtime")
+
+
+def _mesurer_estimation_table(chemin: str, code_insee: str) -> Dict:
+    """Exécuté dans un sous-processus : import puis estimation depuis la table précalculée"""
+    debut = time.perf_counter()
+    import dvf_backend as backend
+    duree_import = time.perf_counter() - debut
+
+    backend.configurer_table_stats(chemin)
+    estimation, _ = backend.estimer_bien('Bench', code_insee, 75.0, 3, backend.Standing.STANDARD)
+    return {
+        'import_ms': round(duree_import * 1000, 1),
+        'total_ms': round((time.perf_counter() - debut) * 1000, 1),
+        'valeur_estimee': estimation['valeur_estimee'],
+        'pandas_importe': 'pandas' in sys.modules,
+    }
+
+
+def bench_demarrage(repetitions: int = 5) -> Dict:
+    """
+    Coût de démarrage : import de dvf_backend (médiane de `repetitions`
+    interpréteurs neufs) et estimation d'un bien depuis la table précalculée
+    """
+    import numpy as np
+    from dvf_stats_communes import calculer_stats_communes
+
+    durees = sorted(_duree_import_ms() for _ in range(repetitions))
+    transactions = transactions_hedoniques(50_000)
+    code_insee = transactions['code_commune'].iloc[0]
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        chemin = os.path.join(repertoire, 'stats_communes.npz')
+        np.savez(chemin, **calculer_stats_communes(transactions))
+        sortie = subprocess.run(
+            [sys.executable, __file__, '_table', chemin, code_insee],
+            check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    return {
+        'import_ms': round(statistics.median(durees), 1),
+        'import_min_ms': round(durees[0], 1),
+        'estimation_table': json.loads(sortie.stdout.strip().splitlines()[-1]),
+    }
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+def preparer_fixtures(repertoire: str = REPERTOIRE_FIXTURES) -> Dict[str, bytes]:
+    """
+    CSV geo-dvf des communes de référence
+
+    Les fichiers enregistrés ({repertoire}/{code}.csv, voir `enregistrer`) sont
+    utilisés tels quels ; les autres sont générés de façon déterministe.
+    """
+    from dvf_serveur_local import generer_csv_dvf
+
+    fixtures = {}
+    for cas, code_insee, lignes in COMMUNES_BENCH:
+        chemin = os.path.join(repertoire, f"{code_insee}.csv")
+        if os.path.exists(chemin):
+            with open(chemin, 'rb') as f:
+                fixtures[cas] = f.read()
+        else:
+            fixtures[cas] = generer_csv_dvf(code_insee, 2023, lignes)
+    return fixtures
+
+
+def enregistrer_fixtures(repertoire: str = REPERTOIRE_FIXTURES, annee: int = 2023) -> List[str]:
+    """Télécharge les CSV réels des communes de référence (nécessite le réseau)"""
+    from dvf_backend import URL_DATAGOUV
+    from dvf_fetch import obtenir_session
+
+    os.makedirs(repertoire, exist_ok=True)
+    enregistres = []
+    for _, code_insee, _ in COMMUNES_BENCH:
+        url = URL_DATAGOUV.format(annee=annee, dept=code_insee[:2], code_insee=code_insee)
+        response = obtenir_session().get(url, timeout=60)
+        response.raise_for_status()
+        chemin = os.path.join(repertoire, f"{code_insee}.csv")
+        with open(chemin, 'wb') as f:
+            f.write(response.content)
+        enregistres.append(chemin)
+    return enregistres
+
+
+# ============================================================================
+# PIPELINE ÉTAPE PAR ÉTAPE
+# ============================================================================
+
+def mesurer(fonction: Callable, repetitions: int = 5) -> Dict:
+    """Temps médian / minimal et pic d'allocation (tracemalloc) d'une étape"""
+    fonction()  # échauffement (imports, caches internes de pandas)
+
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+
+    tracemalloc.start()
+    try:
+        fonction()
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_s': round(statistics.median(durees), 6),
+        'min_s': round(min(durees), 6),
+        'pic_mo': round(pic / (1024 * 1024), 2),
+    }
+
+
+def bench_pipeline(repetitions: int = 5, repertoire_fixtures: str = REPERTOIRE_FIXTURES) -> Dict:
+    """
+    Mesure séparément récupération, parsing, filtrage, analyse, estimation et
+    recherche de comparables
+
+    Caches disque, store local et table précalculée sont désactivés ; la
+    récupération passe par le serveur DVF local (boucle HTTP complète).
+    """
+    import pandas as pd
+    import dvf_backend as backend
+    from dvf_comparables import IndexComparables
+    from dvf_serveur_local import ServeurDVFLocal
+
+    backend.configurer_cache(actif=False)
+    backend.configurer_store(None)
+    backend.configurer_table_stats(None)
+    # Un seul millésime : étapes comparables d'une référence à l'autre
+    backend.configurer_annees([2023])
+
+    bien = backend.BienImmobilier('00000', 'Bench', 75.0, 3, backend.Standing.STANDARD)
+    fixtures = preparer_fixtures(repertoire_fixtures)
+    resultats = {}
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        for (cas, code_insee, _), corps in zip(COMMUNES_BENCH, (fixtures[c] for c, _, _ in COMMUNES_BENCH)):
+            with open(os.path.join(repertoire, f"{code_insee}.csv"), 'wb') as f:
+                f.write(corps)
+
+        with ServeurDVFLocal(repertoire, generer=False) as serveur:
+            url_origine = backend.URL_DATAGOUV
+            backend.URL_DATAGOUV = serveur.url_datagouv
+            try:
+                for cas, code_insee, _ in COMMUNES_BENCH:
+                    corps = fixtures[cas]
+                    brut = pd.read_csv(BytesIO(corps), low_memory=False)
+                    transactions = backend.lire_csv_dvf(BytesIO(corps))
+                    analyse = backend._analyser_marche(transactions)
+                    index = IndexComparables(transactions)
+                    centre = {c: float(transactions[c].median()) for c in ('latitude', 'longitude')
+                              if c in transactions.columns}
+
+                    etapes = {
+                        'recuperer': lambda: backend._tentative_api_datagouv(code_insee),
+                        'parser': lambda: backend.lire_csv_dvf(BytesIO(corps)),
+                        'filtrer': lambda: backend._filtrer_transactions(brut),
+                        'analyser': lambda: backend._analyser_marche(transactions),
+                        'analyser_cache': lambda: backend.analyser_marche(transactions, code_insee),
+                        'estimer': lambda: backend.calculer_estimation_analyse(analyse, bien),
+                        'indexer_comparables': lambda: IndexComparables(transactions),
+                        'rechercher_comparables': lambda: index.rechercher(
+                            75.0, 3, 'Appartement', centre.get('latitude'), centre.get('longitude')),
+                    }
+                    for etape, fonction in etapes.items():
+                        resultats[f"{cas}/{etape}"] = dict(mesurer(fonction, repetitions),
+                                                           lignes=len(transactions))
+            finally:
+                backend.URL_DATAGOUV = url_origine
+
+    # Jeux synthétiques d'un million de transactions, puis d'un million de biens
+    synthetiques = backend._generer_donnees_simulees('75056', LIGNES_SYNTHETIQUES)
+    biens, analyses = biens_synthetiques(LIGNES_SYNTHETIQUES, backend._analyser_marche(synthetiques))
+    etapes = {
+        'generer': lambda: backend._generer_donnees_simulees('75056', LIGNES_SYNTHETIQUES),
+        'filtrer': lambda: backend._filtrer_transactions(synthetiques),
+        'analyser': lambda: backend._analyser_marche(synthetiques),
+        'estimer_lot': lambda: backend.estimer_lot(biens, analyses_connues=analyses),
+        'estimer_biens': lambda: backend.estimer_biens(biens, analyses_connues=analyses),
+    }
+    for etape, fonction in etapes.items():
+        resultats[f"synthetique_1m/{etape}"] = dict(mesurer(fonction, max(1, repetitions // 2)),
+                                                    lignes=LIGNES_SYNTHETIQUES)
+
+    # Modèle hédonique : entraînement en une passe puis prédiction d'un lot
+    resultats.update(bench_hedonique(max(1, repetitions // 2)))
+
+    # Statistiques de marché glissantes : construction, ajout incrémental, lectures
+    resultats.update(bench_marche(max(1, repetitions // 2)))
+
+    # Table des prix de référence : construction puis consultations en mémoire mappée
+    resultats.update(bench_references(max(1, repetitions // 2)))
+
+    return {
+        'commit': _commit_git(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plateforme': platform.platform(),
+        'resultats': resultats,
+    }
+
+
+def biens_synthetiques(nb_biens: int, analyse: Dict, nb_communes: int = COMMUNES_PAR_DEPARTEMENT,
+                       graine: int = 0):
+    """Biens répartis sur `nb_communes` communes partageant `analyse` (aucune récupération)"""
+    import numpy as np
+    import pandas as pd
+    from dvf_backend import Standing
+
+    rng = np.random.default_rng(graine)
+    codes = [f"75{i:03d}" for i in range(nb_communes)]
+    biens = pd.DataFrame({
+        'code_insee': pd.Categorical.from_codes(rng.integers(0, nb_communes, nb_biens), codes),
+        'surface': rng.uniform(15, 200, nb_biens),
+        'pieces': rng.integers(1, 7, nb_biens),
+        'standing': pd.Categorical.from_codes(rng.integers(0, len(Standing), nb_biens), list(Standing)),
+    })
+    return biens, {code: (analyse, None) for code in codes}
+
+
+def transactions_hedoniques(nb_lignes: int, graine: int = 0):
+    """Transactions synthétiques multi-départements pour le modèle hédonique"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(graine)
+    departements = rng.integers(1, DEPARTEMENTS_HEDONIQUES + 1, nb_lignes)
+    communes = departements * 1000 + rng.integers(1, COMMUNES_PAR_DEPARTEMENT + 1, nb_lignes)
+    surface = rng.uniform(15, 200, nb_lignes)
+    pieces = np.clip(np.round(surface / 22 + rng.normal(0, 0.7, nb_lignes)), 1, 10)
+    maison = rng.random(nb_lignes) < 0.4
+    annees = rng.integers(2019, 2025, nb_lignes)
+    effets = rng.normal(8.0, 0.3, (DEPARTEMENTS_HEDONIQUES + 1) * 1000)
+    log_prix = (effets[communes] - 0.15 * np.log(surface) + 0.03 * pieces + 0.1 * maison
+                + 0.04 * (annees - 2019) + rng.normal(0, 0.2, nb_lignes))
+
+    return pd.DataFrame({
+        'code_commune': pd.Series(communes).map('{:05d}'.format),
+        'date_mutation': pd.to_datetime(pd.Series(annees).astype(str) + '-06-01'),
+        'valeur_fonciere': np.exp(log_prix) * surface,
+        'surface_reelle_bati': surface,
+        'type_local': pd.Categorical(np.where(maison, 'Maison', 'Appartement')),
+        'nombre_pieces_principales': pieces,
+    })
+
+
+def bench_hedonique(repetitions: int = 2) -> Dict:
+    """Temps et mémoire d'entraînement du modèle hédonique, puis d'une prédiction en lot"""
+    import numpy as np
+    from dvf_hedonique import EntraineurHedonique, ModeleHedonique
+
+    transactions = transactions_hedoniques(LIGNES_SYNTHETIQUES)
+
+    def entrainer():
+        entraineur = EntraineurHedonique()
+        for debut in range(0, len(transactions), 250_000):
+            entraineur.ajouter(transactions.iloc[debut:debut + 250_000])
+        return entraineur.ajuster()
+
+    resultats = {'synthetique_1m/entrainer_hedonique': dict(mesurer(entrainer, repetitions),
+                                                            lignes=LIGNES_SYNTHETIQUES)}
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        chemin = os.path.join(repertoire, 'modele.npz')
+        np.savez(chemin, **entrainer())
+        modele = ModeleHedonique(chemin)
+
+    lot = transactions.iloc[:LOT_PREDICTION]
+    resultats['synthetique_1m/predire_hedonique'] = dict(mesurer(lambda: modele.predire(
+        lot['code_commune'], lot['surface_reelle_bati'].to_numpy(), lot['nombre_pieces_principales'].to_numpy(),
+        lot['type_local'], lot['date_mutation'].dt.year.to_numpy()
+    ), repetitions), lignes=LOT_PREDICTION)
+    return resultats
+
+
+def bench_marche(repetitions: int = 2) -> Dict:
+    """Construction des histogrammes mensuels, ajout d'un lot à la table pleine et lectures"""
+    import numpy as np
+    import pandas as pd
+    from dvf_marche import StatistiquesMarche
+
+    transactions = transactions_hedoniques(LIGNES_SYNTHETIQUES)
+    rng = np.random.default_rng(1)
+    transactions['date_mutation'] = (pd.Timestamp('2019-01-01')
+                                     + pd.to_timedelta(rng.integers(0, 6 * 365, len(transactions)), unit='D'))
+    code = transactions['code_commune'].iloc[0]
+
+    def construire():
+        statistiques = StatistiquesMarche()
+        for debut in range(0, len(transactions), 250_000):
+            statistiques.ajouter(transactions.iloc[debut:debut + 250_000])
+        return statistiques
+
+    resultats = {'synthetique_1m/construire_marche': dict(mesurer(construire, repetitions),
+                                                          lignes=LIGNES_SYNTHETIQUES)}
+    statistiques = construire()
+    lot = transactions.iloc[:LOT_PREDICTION]
+    etapes = {
+        'ajouter_lot_marche': (lambda: statistiques.ajouter(lot), LOT_PREDICTION),
+        'serie_marche': (lambda: statistiques.serie(code, pas='trimestre'), LIGNES_SYNTHETIQUES),
+        'estimation_ponderee': (lambda: statistiques.estimation_ponderee(code), LIGNES_SYNTHETIQUES),
+    }
+    for etape, (fonction, lignes) in etapes.items():
+        resultats[f"synthetique_1m/{etape}"] = dict(mesurer(fonction, repetitions), lignes=lignes)
+    return resultats
+
+
+def bench_references(repetitions: int = 2) -> Dict:
+    """Construction de la table des prix de référence et consultations (10 000 communes)"""
+    from dvf_references import TableReferences, calculer_references, ecrire_references
+
+    transactions = transactions_hedoniques(LIGNES_SYNTHETIQUES)
+    resultats = {'synthetique_1m/construire_references': dict(
+        mesurer(lambda: calculer_references(transactions), repetitions), lignes=LIGNES_SYNTHETIQUES)}
+
+    codes = transactions['code_commune'].iloc[:LOT_PREDICTION].tolist()
+    with tempfile.TemporaryDirectory() as repertoire:
+        chemin = os.path.join(repertoire, 'references.bin')
+        ecrire_references(chemin, **calculer_references(transactions))
+        table = TableReferences(chemin)
+        resultats['synthetique_1m/prix_reference'] = dict(
+            mesurer(lambda: [table.prix(code, 'Appartement', 2023) for code in codes], repetitions),
+            lignes=LOT_PREDICTION)
+        del table
+    return resultats
+
+
+def bench_parallele(nb_lignes: int = LIGNES_SYNTHETIQUES, workers_max: Optional[int] = None,
+                    repetitions: int = 3) -> Dict:
+    """
+    Statistiques de toutes les communes : groupby en un processus, puis calcul
+    en mémoire partagée avec 1, 2, 4… processus jusqu'au nombre de cœurs
+
+    Accélération et efficacité sont rapportées au calcul parallèle à 1 processus.
+    La numérotation des communes (pd.factorize des codes) reste dans le
+    processus parent : sa durée borne l'accélération atteignable.
+    """
+    import numpy as np
+    import pandas as pd
+    from dvf_stats_communes import calculer_stats_communes, calculer_stats_communes_parallele
+
+    workers_max = workers_max or os.cpu_count() or 1
+    transactions = transactions_hedoniques(nb_lignes)
+    rng = np.random.default_rng(2)
+    transactions['code_commune'] = np.char.zfill(
+        rng.integers(1000, 1000 + COMMUNES_PARALLELE, nb_lignes).astype(str), 5)
+
+    resultats = {
+        'groupby': mesurer(lambda: calculer_stats_communes(transactions), repetitions),
+        'numerotation': mesurer(lambda: pd.factorize(transactions['code_commune'], sort=True), repetitions),
+    }
+    nb_workers = sorted({min(2 ** i, workers_max) for i in range(workers_max.bit_length() + 1)})
+    for workers in nb_workers:
+        resultats[f"workers_{workers}"] = dict(
+            mesurer(lambda: calculer_stats_communes_parallele(transactions, workers), repetitions),
+            workers=workers)
+
+    reference = resultats['workers_1']['median_s']
+    for workers in nb_workers:
+        mesure = resultats[f"workers_{workers}"]
+        mesure['acceleration'] = round(reference / mesure['median_s'], 2)
+        mesure['efficacite'] = round(mesure['acceleration'] / workers, 2)
+    return {'lignes': nb_lignes, 'communes': COMMUNES_PARALLELE, 'coeurs': os.cpu_count(),
+            'acceleration_max': round(reference / resultats['numerotation']['median_s'], 1),
+            'resultats': resultats}
+
+
+def _commit_git() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparer(actuel: Dict, reference: Dict, seuil: float = SEUIL_REGRESSION) -> List[str]:
+    """Affiche l'écart par étape et retourne la liste des régressions"""
+    regressions = []
+    print(f"\n🔍 Comparaison avec {reference.get('commit')} ({reference.get('date')})")
+    for cle, mesure in actuel['resultats'].items():
+        ancienne = reference['resultats'].get(cle)
+        if not ancienne or not ancienne['median_s']:
+            continue
+        ecart = mesure['median_s'] / ancienne['median_s'] - 1
+        significatif = abs(mesure['median_s'] - ancienne['median_s']) >= PLANCHER_BRUIT_S
+        marque = '  '
+        if significatif and ecart > seuil:
+            marque = '🔴'
+        elif significatif and ecart < -seuil:
+            marque = '🟢'
+        print(f"   {marque} {cle:<32} {ancienne['median_s'] * 1000:>10.2f} ms -> "
+              f"{mesure['median_s'] * 1000:>10.2f} ms ({ecart:+.0%})")
+        if marque == '🔴':
+            regressions.append(cle)
+    return regressions
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '_parsing':
+        print(json.dumps(_mesurer_parsing(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '_table':
+        print(json.dumps(_mesurer_estimation_table(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline DVF")
+    sous_parsers = parser.add_subparsers(dest='benchmark', required=True)
+    p_pipeline = sous_parsers.add_parser('pipeline', help="Temps et mémoire par étape du pipeline")
+    p_pipeline.add_argument('--repetitions', type=int, default=5)
+    p_pipeline.add_argument('--fixtures', default=REPERTOIRE_FIXTURES, help="CSV enregistrés")
+    p_pipeline.add_argument('--sortie', help="Fichier JSON des résultats")
+    p_pipeline.add_argument('--comparer', help="Fichier JSON de référence (autre commit)")
+    p_pipeline.add_argument('--seuil', type=float, default=SEUIL_REGRESSION)
+    p_parsing = sous_parsers.add_parser('parsing', help="Parsing CSV avant/après lecture en flux")
+    p_parsing.add_argument('--lignes', type=int, default=150_000)
+    p_demarrage = sous_parsers.add_parser('demarrage', help="Temps d'import et estimation sans pandas")
+    p_demarrage.add_argument('--repetitions', type=int, default=5)
+    p_demarrage.add_argument('--budget', type=float, default=BUDGET_IMPORT_MS, help="Budget d'import (ms)")
+    p_parallele = sous_parsers.add_parser('parallele', help="Statistiques par commune selon le nombre de processus")
+    p_parallele.add_argument('--lignes', type=int, default=LIGNES_SYNTHETIQUES)
+    p_parallele.add_argument('--workers-max', type=int, help="Processus au plus (défaut : nombre de cœurs)")
+    p_parallele.add_argument('--repetitions', type=int, default=3)
+    p_enregistrer = sous_parsers.add_parser('enregistrer', help="Télécharge les CSV réels de référence")
+    p_enregistrer.add_argument('--fixtures', default=REPERTOIRE_FIXTURES)
+    args = parser.parse_args()
+
+    if args.benchmark == 'pipeline':
+        resultats = bench_pipeline(args.repetitions, args.fixtures)
+        print(f"📊 Pipeline DVF ({resultats['commit']}, Python {resultats['python']})")
+        for cle, mesure in resultats['resultats'].items():
+            print(f"   {cle:<32} {mesure['median_s'] * 1000:>10.2f} ms  "
+                  f"pic {mesure['pic_mo']:>8.2f} Mo  ({mesure['lignes']} lignes)")
+
+        if args.sortie:
+            with open(args.sortie, 'w') as f:
+                json.dump(resultats, f, indent=2)
+            print(f"✅ Résultats enregistrés dans {args.sortie}")
+
+        if args.comparer:
+            with open(args.comparer) as f:
+                regressions = comparer(resultats, json.load(f), args.seuil)
+            if regressions:
+                print(f"⚠️  {len(regressions)} régression(s) au-delà de {args.seuil:.0%}")
+                sys.exit(1)
+
+    elif args.benchmark == 'enregistrer':
+        for chemin in enregistrer_fixtures(args.fixtures):
+            print(f"✅ {chemin}")
+
+    elif args.benchmark == 'parsing':
+        resultats = bench_parsing(args.lignes)
+        print(f"📊 Parsing d'un CSV DVF de {args.lignes:,} lignes ({resultats['csv_mo']} Mo)".replace(',', ' '))
+        for variante in ('avant', 'apres'):
+            r = resultats[variante]
+            print(f"   {variante:>6} : {r['duree_s']:.3f} s, pic RSS +{r['rss_pic_mo']} Mo, "
+                  f"{r['lignes']} transactions")
+
+    elif args.benchmark == 'demarrage':
+        resultats = bench_demarrage(args.repetitions)
+        table = resultats['estimation_table']
+        print(f"📊 import dvf_backend : {resultats['import_ms']} ms (médiane, min {resultats['import_min_ms']} ms, "
+              f"budget {args.budget:g} ms)")
+        print(f"   Estimation depuis la table : {table['total_ms']} ms import compris, "
+              f"pandas {'importé' if table['pandas_importe'] else 'non importé'}")
+        if resultats['import_ms'] > args.budget or table['pandas_importe']:
+            print("⚠️  Budget de démarrage dépassé")
+            sys.exit(1)
+
+    elif args.benchmark == 'parallele':
+        resultats = bench_parallele(args.lignes, args.workers_max, args.repetitions)
+        print(f"📊 Statistiques de {resultats['communes']:_} communes, {resultats['lignes']:_} transactions "
+              f"({resultats['coeurs']} cœur(s), accélération au plus x{resultats['acceleration_max']:g})"
+              .replace('_', ' '))
+        for cle, mesure in resultats['resultats'].items():
+            suite = ''
+            if 'workers' in mesure:
+                suite = f"  x{mesure['acceleration']:.2f}  efficacité {mesure['efficacite']:.0%}"
+            print(f"   {cle:<12} {mesure['median_s'] * 1000:>10.2f} ms  pic {mesure['pic_mo']:>8.2f} Mo{suite}")
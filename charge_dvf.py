@@ -0,0 +1,225 @@
+"""
+Estimateur Immobilier - Test de charge du service HTTP d'estimation
+Démarre le serveur DVF local de substitution et `dvf_service.py` (sauf --url),
+envoie des estimations concurrentes et affiche le débit, les percentiles de
+latence et le nombre de requêtes parvenues à la source DVF (effet du
+regroupement des demandes identiques). Avec --archive, le service rejoue une
+archive de réponses enregistrées (dvf_rejeu.py) au lieu du serveur local.
+
+Usage :
+    python charge_dvf.py --requetes 2000 --concurrence 32 --communes 20 --workers 2
+    python charge_dvf.py --url http://127.0.0.1:8000 --lot 100
+    python charge_dvf.py --archive ./archive_dvf --codes 33063,75056 --taux-erreur 0.2 --latence 0.05
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+
+REPERTOIRE = os.path.dirname(os.path.abspath(__file__))
+STANDINGS = ["Standard", "À rénover", "Haut de gamme"]
+
+
+# ============================================================================
+# DÉMARRAGE DU SERVICE
+# ============================================================================
+
+def demarrer_service(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Lance `dvf_service.py` dans un sous-processus et attend qu'il réponde"""
+    processus = subprocess.Popen(
+        [sys.executable, os.path.join(REPERTOIRE, 'dvf_service.py'),
+         '--port', str(port), '--workers', str(workers)],
+        cwd=REPERTOIRE, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if processus.poll() is not None:
+            raise RuntimeError(f"Le service s'est arrêté (code {processus.returncode})")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/sante", timeout=1).ok:
+                return processus
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    processus.terminate()
+    raise RuntimeError("Le service n'a pas démarré en 30 s")
+
+
+def _port_libre() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# ============================================================================
+# CHARGE
+# ============================================================================
+
+def generer_biens(nb: int, communes: List[str], graine: int = 0) -> List[Dict]:
+    """Biens aléatoires répartis sur `communes`"""
+    rng = random.Random(graine)
+    return [
+        {
+            'code_insee': rng.choice(communes),
+            'surface': round(rng.uniform(20, 150), 1),
+            'pieces': rng.randint(1, 6),
+            'standing': rng.choice(STANDINGS),
+        }
+        for _ in range(nb)
+    ]
+
+
+def lancer_charge(url: str, nb_requetes: int, concurrence: int, communes: List[str],
+                  lot: int = 0) -> Dict:
+    """
+    Envoie `nb_requetes` requêtes avec `concurrence` clients simultanés
+
+    Args:
+        lot: 0 pour POST /estimation (un bien), sinon nombre de biens par POST /estimations
+    """
+    biens = generer_biens(nb_requetes * max(1, lot), communes)
+    local = threading.local()
+    latences: List[float] = []
+    erreurs: List[str] = []
+    verrou = threading.Lock()
+
+    def envoyer(i: int) -> None:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        if lot:
+            chemin, corps = '/estimations', {'biens': biens[i * lot:(i + 1) * lot]}
+        else:
+            chemin, corps = '/estimation', biens[i]
+
+        debut = time.perf_counter()
+        try:
+            reponse = session.post(url + chemin, json=corps, timeout=60)
+            erreur = None if reponse.ok else f"HTTP {reponse.status_code}"
+        except requests.RequestException as e:
+            erreur = type(e).__name__
+        duree = time.perf_counter() - debut
+
+        with verrou:
+            latences.append(duree)
+            if erreur:
+                erreurs.append(erreur)
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as executor:
+        list(executor.map(envoyer, range(nb_requetes)))
+    duree_totale = time.perf_counter() - debut
+
+    latences.sort()
+    return {
+        'requetes': nb_requetes,
+        'biens': nb_requetes * max(1, lot),
+        'erreurs': len(erreurs),
+        'duree_s': round(duree_totale, 3),
+        'debit_rps': round(nb_requetes / duree_totale, 1),
+        'p50_ms': round(_percentile(latences, 50) * 1000, 2),
+        'p90_ms': round(_percentile(latences, 90) * 1000, 2),
+        'p99_ms': round(_percentile(latences, 99) * 1000, 2),
+        'max_ms': round(latences[-1] * 1000, 2),
+        'moyenne_ms': round(statistics.fmean(latences) * 1000, 2),
+    }
+
+
+def _percentile(valeurs: List[float], rang: float) -> float:
+    """Percentile par rang le plus proche d'une liste triée"""
+    indice = max(0, min(len(valeurs) - 1, math.ceil(rang / 100 * len(valeurs)) - 1))
+    return valeurs[indice]
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du service d'estimation DVF")
+    parser.add_argument('--url', help="Service déjà démarré (sinon démarré avec un serveur DVF local)")
+    parser.add_argument('--requetes', type=int, default=1000)
+    parser.add_argument('--concurrence', type=int, default=32)
+    parser.add_argument('--communes', type=int, default=20, help="Communes distinctes demandées")
+    parser.add_argument('--lot', type=int, default=0, help="Biens par requête de lot (0 = /estimation)")
+    parser.add_argument('--workers', type=int, default=1, help="Processus du service démarré")
+    parser.add_argument('--latence', type=float, default=0.2, help="Latence du serveur DVF local ou du rejeu (s)")
+    parser.add_argument('--lignes', type=int, default=2000, help="Lignes des CSV générés")
+    parser.add_argument('--sans-cache', action='store_true', help="Désactive le cache disque du service")
+    parser.add_argument('--archive', help="Archive de réponses rejouée par le service (dvf_rejeu.py)")
+    parser.add_argument('--codes', help="Communes demandées, séparées par des virgules (défaut : 33001…)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="Part de réponses 429/503 injectées")
+    args = parser.parse_args()
+
+    if args.codes:
+        communes = [code.strip() for code in args.codes.split(',') if code.strip()]
+    else:
+        communes = [f"33{i:03d}" for i in range(1, args.communes + 1)]
+    serveur_dvf: Optional[object] = None
+    service: Optional[subprocess.Popen] = None
+
+    with tempfile.TemporaryDirectory() as cache:
+        url = args.url
+        try:
+            if url is None and args.archive:
+                port = _port_libre()
+                env = {
+                    'DVF_REJEU': os.path.abspath(args.archive),
+                    'DVF_REJEU_MODE': 'rejouer',
+                    'DVF_REJEU_LATENCE': str(args.latence),
+                    'DVF_REJEU_TAUX_ERREUR': str(args.taux_erreur),
+                    'DVF_CACHE_DIR': cache,
+                    'DVF_CACHE': '0' if args.sans_cache else '1',
+                }
+                print(f"🛰️  Démarrage du service ({args.workers} worker(s)) en rejeu de {args.archive}...")
+                service = demarrer_service(port, args.workers, env)
+                url = f"http://127.0.0.1:{port}"
+            elif url is None:
+                from dvf_serveur_local import ServeurDVFLocal
+
+                serveur_dvf = ServeurDVFLocal(nb_lignes=args.lignes, latence=args.latence,
+                                              taux_erreur=args.taux_erreur).demarrer()
+                port = _port_libre()
+                env = {
+                    'DVF_URL_DATAGOUV': serveur_dvf.url_datagouv,
+                    'DVF_URL_DVFPLUS': serveur_dvf.url_dvfplus,
+                    'DVF_CACHE_DIR': cache,
+                    'DVF_CACHE': '0' if args.sans_cache else '1',
+                    'DVF_ANNEES': '2023',
+                }
+                print(f"🛰️  Démarrage du service ({args.workers} worker(s)) et du serveur DVF local...")
+                service = demarrer_service(port, args.workers, env)
+                url = f"http://127.0.0.1:{port}"
+
+            mode = f"lots de {args.lot} biens" if args.lot else "biens unitaires"
+            print(f"🚀 {args.requetes} requêtes ({mode}), {args.concurrence} clients, "
+                  f"{len(communes)} communes")
+            resultat = lancer_charge(url, args.requetes, args.concurrence, communes, args.lot)
+        finally:
+            if service is not None:
+                service.terminate()
+                service.wait(10)
+            if serveur_dvf is not None:
+                serveur_dvf.arreter()
+
+    print(f"\n✅ {resultat['requetes']} requêtes / {resultat['biens']} biens en {resultat['duree_s']} s "
+          f"({resultat['erreurs']} erreur(s))")
+    print(f"   Débit     : {resultat['debit_rps']} requêtes/s")
+    print(f"   Latence   : p50 {resultat['p50_ms']} ms | p90 {resultat['p90_ms']} ms | "
+          f"p99 {resultat['p99_ms']} ms | max {resultat['max_ms']} ms")
+    if serveur_dvf is not None:
+        print(f"   Source DVF: {serveur_dvf.nb_requetes} requête(s) amont pour {len(communes)} communes")
@@ -1,16 +1,130 @@
 """
 Estimateur Immobilier - Backend Python
 Version robuste avec fallback pour toutes les communes de France
+
+pandas, numpy, asyncio et requests ne sont importés qu'au premier usage
+(voir dvf_differe) : une estimation depuis la table précalculée n'importe pas
+pandas.
 """
 
-import requests
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-from typing import Tuple, Optional, Dict
-from io import StringIO
+from __future__ import annotations
+
+import os
+import logging
+import time
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Tuple, Optional, Dict, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
+from dvf_differe import ModuleDiffere
+from dvf_cache import CacheDVF, CacheMemoire
+from dvf_store import StoreDVF
+from dvf_stats_communes import TableStatsCommunes
+from dvf_metriques import METRIQUES
+from dvf_comparables import IndexComparables, prix_comparables
+from dvf_hedonique import ModeleHedonique
+from dvf_marche import StatistiquesMarche
+from dvf_voisinage import IndexVoisinage
+from dvf_references import TableReferences
+from dvf_resultats import Estimation, EstimationsLot
+
+# Importés au premier usage
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+asyncio = ModuleDiffere('asyncio', __name__, 'asyncio')
+
+
+logger = logging.getLogger(__name__)
+
+
+# Millésimes geo-dvf chargés par défaut pour chaque commune (voir configurer_annees)
+ANNEES_DVF = tuple(range(2019, 2025))
+
+# Sources DVF (surchargeables, ex: serveur local de substitution)
+URL_DATAGOUV = os.environ.get(
+    'DVF_URL_DATAGOUV',
+    "https://files.data.gouv.fr/geo-dvf/latest/csv/{annee}/communes/{dept}/{code_insee}.csv"
+)
+URL_DVFPLUS = os.environ.get(
+    'DVF_URL_DVFPLUS',
+    "https://app.dvf.etalab.gouv.fr/api/v1/search?code_commune={code_insee}"
+)
+
+# Timeout des appels aux APIs (secondes)
+TIMEOUT_API = 10
+
+# Colonnes lues dans les CSV DVF (les ~40 autres sont ignorées dès le parsing)
+COLONNES_CSV_DVF = [
+    'nature_mutation', 'type_local', 'date_mutation',
+    'valeur_fonciere', 'surface_reelle_bati',
+    'nombre_pieces_principales', 'longitude', 'latitude',
+]
+
+# Attributs conservés s'ils sont présents (recherche de comparables), valeurs manquantes admises
+COLONNES_OPTIONNELLES = ('type_local', 'nombre_pieces_principales', 'longitude', 'latitude')
+
+# Types explicites : évite l'inférence et les colonnes 'object'
+DTYPES_CSV_DVF = {
+    'nature_mutation': 'category',
+    'type_local': 'category',
+    'date_mutation': str,
+    'valeur_fonciere': 'float64',
+    'surface_reelle_bati': 'float64',
+    'nombre_pieces_principales': 'float64',
+    'longitude': 'float64',
+    'latitude': 'float64',
+    'code_commune': str,
+}
+
+# Réponses signifiant « pas de données pour cette commune » : mises en cache
+# comme entrées négatives (DataFrame vide), contrairement aux erreurs passagères
+STATUTS_ABSENCE = (404, 410)
+
+# Lignes parsées puis filtrées à la fois lors de la lecture en flux
+TAILLE_CHUNK_CSV = 50_000
+
+MESSAGE_DONNEES_SIMULEES = "⚠️ Données simulées - APIs DVF temporairement indisponibles"
+
+# Prix de base approximatifs par département, à défaut de table des prix de
+# référence (voir configurer_table_references)
+PRIX_BASE_DEPARTEMENTS = {
+    75: 10000,  # Paris
+    92: 6000,   # Hauts-de-Seine
+    93: 4000,   # Seine-Saint-Denis
+    94: 4500,   # Val-de-Marne
+    78: 4000,   # Yvelines
+    91: 3500,   # Essonne
+    95: 3200,   # Val-d'Oise
+    77: 3000,   # Seine-et-Marne
+    13: 3500,   # Bouches-du-Rhône
+    6: 4500,    # Alpes-Maritimes
+    33: 3500,   # Gironde
+    31: 3200,   # Haute-Garonne
+    69: 3800,   # Rhône
+    59: 2500,   # Nord
+    44: 3000,   # Loire-Atlantique
+    34: 3200,   # Hérault
+    35: 3100,   # Ille-et-Vilaine
+    67: 3000,   # Bas-Rhin
+    38: 3300,   # Isère
+    74: 4000,   # Haute-Savoie
+    73: 3500,   # Savoie
+    29: 2200,   # Finistère
+    56: 2300,   # Morbihan
+    22: 2000,   # Côtes-d'Armor
+    17: 2500,   # Charente-Maritime
+    64: 2800,   # Pyrénées-Atlantiques
+    85: 2400,   # Vendée
+    14: 2600,   # Calvados
+    50: 2100,   # Manche
+    76: 2400,   # Seine-Maritime
+}
+# Prix moyen France, pour les départements absents
+PRIX_BASE_DEFAUT = 2200
+
 
 class Standing(Enum):
     A_RENOVER = "À rénover"
@@ -19,12 +133,365 @@ class Standing(Enum):
 
 
 class BienImmobilier:
-    def __init__(self, code_insee: str, ville: str, surface: float, pieces: int, standing: Standing):
+    __slots__ = ('code_insee', 'ville', 'surface_habitable', 'nombre_pieces', 'standing',
+                 'type_local', 'latitude', 'longitude')
+    
+    def __init__(self, code_insee: str, ville: str, surface: float, pieces: int, standing: Standing,
+                 type_local: Optional[str] = None, latitude: Optional[float] = None,
+                 longitude: Optional[float] = None):
         self.code_insee = code_insee
         self.ville = ville
         self.surface_habitable = surface
         self.nombre_pieces = pieces
         self.standing = standing
+        # Facultatifs : affinent la recherche de comparables ('Maison' / 'Appartement', WGS84)
+        self.type_local = type_local
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+# ============================================================================
+# JOURNALISATION
+# ============================================================================
+
+def configurer_logs(niveau: str = 'INFO') -> None:
+    """
+    Affiche les messages du backend sur la sortie d'erreur
+    
+    Sans appel à cette fonction (ni $DVF_LOG_LEVEL), les messages suivent la
+    configuration `logging` de l'application hôte.
+    
+    Args:
+        niveau: Niveau minimal affiché ('DEBUG', 'INFO', 'WARNING'...)
+    """
+    logger.setLevel(niveau.upper() if isinstance(niveau, str) else niveau)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+if os.environ.get('DVF_LOG_LEVEL'):
+    configurer_logs(os.environ['DVF_LOG_LEVEL'])
+
+
+# ============================================================================
+# CACHE DES DONNÉES DVF
+# ============================================================================
+
+_cache_dvf: Optional[CacheDVF] = None
+_cache_configure = False
+
+
+def configurer_cache(repertoire: Optional[str] = None, ttl: float = 7 * 24 * 3600,
+                     taille_max: int = 500 * 1024 * 1024, actif: bool = True) -> Optional[CacheDVF]:
+    """
+    Configure le cache disque des transactions filtrées
+    
+    Args:
+        repertoire: Répertoire du cache (défaut: $DVF_CACHE_DIR ou ~/.cache/estimateur_dvf)
+        ttl: Durée de validité d'une entrée en secondes (None = illimitée)
+        taille_max: Budget disque en octets au-delà duquel les entrées LRU sont évincées
+        actif: False pour désactiver complètement le cache
+    """
+    global _cache_dvf, _cache_configure
+    
+    if actif:
+        if repertoire is None:
+            repertoire = os.environ.get(
+                'DVF_CACHE_DIR',
+                os.path.join(os.path.expanduser('~'), '.cache', 'estimateur_dvf')
+            )
+        _cache_dvf = CacheDVF(repertoire, ttl=ttl, taille_max=taille_max)
+    else:
+        _cache_dvf = None
+    
+    _cache_configure = True
+    return _cache_dvf
+
+
+def obtenir_cache() -> Optional[CacheDVF]:
+    """Retourne le cache actif (créé avec la configuration par défaut au premier appel)"""
+    if not _cache_configure:
+        configurer_cache(actif=os.environ.get('DVF_CACHE', '1') != '0')
+    return _cache_dvf
+
+
+# ============================================================================
+# STORE LOCAL (INGESTION EN MASSE)
+# ============================================================================
+
+_store_dvf: Optional[StoreDVF] = None
+_store_configure = False
+
+
+def configurer_store(racine: Optional[str]) -> Optional[StoreDVF]:
+    """
+    Active la lecture depuis un store local produit par `dvf_store.py`
+    
+    Args:
+        racine: Répertoire racine du store (None pour désactiver)
+    """
+    global _store_dvf, _store_configure
+    if _store_dvf is not None:
+        _store_dvf.invalider()
+    _store_dvf = StoreDVF(racine) if racine else None
+    _store_configure = True
+    return _store_dvf
+
+
+def obtenir_store() -> Optional[StoreDVF]:
+    """Retourne le store local actif ($DVF_STORE_DIR par défaut)"""
+    if not _store_configure:
+        configurer_store(os.environ.get('DVF_STORE_DIR'))
+    return _store_dvf
+
+
+# ============================================================================
+# TABLE PRÉCALCULÉE DES STATISTIQUES PAR COMMUNE
+# ============================================================================
+
+_table_stats: Optional[TableStatsCommunes] = None
+_table_stats_configuree = False
+
+
+def configurer_table_stats(chemin: Optional[str]) -> Optional[TableStatsCommunes]:
+    """
+    Charge la table produite par `dvf_stats_communes.py`
+    
+    Les communes présentes dans la table sont estimées sans récupérer ni
+    analyser leurs transactions.
+    
+    Args:
+        chemin: Fichier .npz de la table (None pour désactiver)
+    """
+    global _table_stats, _table_stats_configuree
+    _table_stats = TableStatsCommunes(chemin) if chemin else None
+    _table_stats_configuree = True
+    return _table_stats
+
+
+def obtenir_table_stats() -> Optional[TableStatsCommunes]:
+    """Retourne la table active ($DVF_TABLE_STATS par défaut)"""
+    if not _table_stats_configuree:
+        configurer_table_stats(os.environ.get('DVF_TABLE_STATS'))
+    return _table_stats
+
+
+def _analyse_precalculee(code_insee: str) -> Optional[Dict]:
+    """Analyse de la commune lue dans la table précalculée, si disponible"""
+    table = obtenir_table_stats()
+    if table is None:
+        return None
+    analyse = table.analyse(code_insee)
+    _compter_cache('table_stats', analyse is not None)
+    if analyse is not None and _voisinage_requis(code_insee, analyse['stats']['nb_transactions']):
+        # Trop peu de ventes : les transactions seront complétées par les voisines
+        return None
+    return analyse
+
+
+# ============================================================================
+# MODÈLE HÉDONIQUE PAR DÉPARTEMENT
+# ============================================================================
+
+_modele_hedonique: Optional[ModeleHedonique] = None
+_modele_hedonique_configure = False
+
+
+def configurer_modele_hedonique(chemin: Optional[str]) -> Optional[ModeleHedonique]:
+    """
+    Charge la table de coefficients produite par `dvf_hedonique.py`
+    
+    Args:
+        chemin: Fichier .npz du modèle (None pour désactiver le mode 'hedonique')
+    """
+    global _modele_hedonique, _modele_hedonique_configure
+    _modele_hedonique = ModeleHedonique(chemin) if chemin else None
+    _modele_hedonique_configure = True
+    return _modele_hedonique
+
+
+def obtenir_modele_hedonique() -> Optional[ModeleHedonique]:
+    """Retourne le modèle actif ($DVF_MODELE_HEDONIQUE par défaut)"""
+    if not _modele_hedonique_configure:
+        configurer_modele_hedonique(os.environ.get('DVF_MODELE_HEDONIQUE'))
+    return _modele_hedonique
+
+
+# ============================================================================
+# STATISTIQUES DE MARCHÉ GLISSANTES
+# ============================================================================
+
+_statistiques_marche: Optional[StatistiquesMarche] = None
+_statistiques_marche_configurees = False
+
+
+def configurer_statistiques_marche(chemin: Optional[str]) -> Optional[StatistiquesMarche]:
+    """
+    Charge les histogrammes mensuels produits par `dvf_marche.py`
+    
+    Args:
+        chemin: Fichier .npz des histogrammes (None pour désactiver le mode 'recent')
+    """
+    global _statistiques_marche, _statistiques_marche_configurees
+    _statistiques_marche = StatistiquesMarche(chemin) if chemin else None
+    _statistiques_marche_configurees = True
+    return _statistiques_marche
+
+
+def obtenir_statistiques_marche() -> Optional[StatistiquesMarche]:
+    """Retourne les statistiques actives ($DVF_MARCHE par défaut)"""
+    if not _statistiques_marche_configurees:
+        configurer_statistiques_marche(os.environ.get('DVF_MARCHE'))
+    return _statistiques_marche
+
+
+# ============================================================================
+# VOISINAGE DES COMMUNES
+# ============================================================================
+
+# Transactions en deçà desquelles une commune est complétée par ses voisines
+NB_TRANSACTIONS_MIN_VOISINAGE = 30
+# Anneaux de voisines parcourus au plus (voisines, voisines des voisines...)
+NB_ANNEAUX_MAX = 3
+
+MESSAGE_VOISINAGE = "Peu de ventes dans la commune : données complétées par {nb} commune(s) voisine(s)"
+
+SOURCE_DVF = "API DVF officielle"
+SOURCE_VOISINAGE = "DVF (communes voisines)"
+SOURCE_SIMULEE = "Données simulées"
+
+
+def donnees_simulees(warning: Optional[str]) -> bool:
+    """Vrai si l'avertissement de récupération signale des données simulées"""
+    return warning == MESSAGE_DONNEES_SIMULEES
+
+
+def source_donnees(warning: Optional[str]) -> str:
+    """Origine des transactions d'après l'avertissement de récupération"""
+    if donnees_simulees(warning):
+        return SOURCE_SIMULEE
+    if warning is not None and warning.startswith(MESSAGE_VOISINAGE.split('{')[0]):
+        return SOURCE_VOISINAGE
+    return SOURCE_DVF
+
+_index_voisinage: Optional[IndexVoisinage] = None
+_index_voisinage_configure = False
+
+
+def configurer_voisinage(chemin: Optional[str]) -> Optional[IndexVoisinage]:
+    """
+    Charge l'index de voisinage produit par `dvf_voisinage.py`
+    
+    Args:
+        chemin: Fichier .npz de l'index (None pour désactiver le repli sur les voisines)
+    """
+    global _index_voisinage, _index_voisinage_configure
+    _index_voisinage = IndexVoisinage(chemin) if chemin else None
+    _index_voisinage_configure = True
+    return _index_voisinage
+
+
+def obtenir_voisinage() -> Optional[IndexVoisinage]:
+    """Retourne l'index actif ($DVF_VOISINAGE par défaut)"""
+    if not _index_voisinage_configure:
+        configurer_voisinage(os.environ.get('DVF_VOISINAGE'))
+    return _index_voisinage
+
+
+# ============================================================================
+# TABLE DES PRIX DE RÉFÉRENCE
+# ============================================================================
+
+_table_references: Optional[TableReferences] = None
+_table_references_configuree = False
+
+
+def configurer_table_references(chemin: Optional[str]) -> Optional[TableReferences]:
+    """
+    Ouvre la table des prix de référence produite par `dvf_references.py`
+    
+    Args:
+        chemin: Fichier de la table (None : prix par département de PRIX_BASE_DEPARTEMENTS)
+    """
+    global _table_references, _table_references_configuree
+    _table_references = TableReferences(chemin) if chemin else None
+    _table_references_configuree = True
+    return _table_references
+
+
+def obtenir_table_references() -> Optional[TableReferences]:
+    """Retourne la table active ($DVF_TABLE_REFERENCES par défaut)"""
+    if not _table_references_configuree:
+        configurer_table_references(os.environ.get('DVF_TABLE_REFERENCES'))
+    return _table_references
+
+
+# ============================================================================
+# FENÊTRE DE MILLÉSIMES
+# ============================================================================
+
+_annees_dvf: Optional[Tuple[int, ...]] = None
+
+
+def configurer_annees(annees: Iterable[int]) -> Tuple[int, ...]:
+    """
+    Définit les millésimes DVF chargés pour chaque commune (ex: range(2019, 2025))
+    
+    Les fichiers data.gouv.fr de chaque année sont récupérés en parallèle et
+    mis en cache séparément : une fois expirée, une année n'est retéléchargée
+    que si le fichier a changé (requête conditionnelle ETag / Last-Modified).
+    """
+    global _annees_dvf
+    _annees_dvf = tuple(sorted({int(a) for a in annees}))
+    if not _annees_dvf:
+        raise ValueError("La fenêtre de millésimes est vide")
+    return _annees_dvf
+
+
+def obtenir_annees() -> Tuple[int, ...]:
+    """Millésimes actifs ($DVF_ANNEES, ex: "2019-2024" ou "2022,2023", sinon ANNEES_DVF)"""
+    if _annees_dvf is None:
+        valeur = os.environ.get('DVF_ANNEES', '').strip()
+        if '-' in valeur:
+            debut, fin = valeur.split('-', 1)
+            configurer_annees(range(int(debut), int(fin) + 1))
+        elif valeur:
+            configurer_annees(int(a) for a in valeur.split(','))
+        else:
+            configurer_annees(ANNEES_DVF)
+    return _annees_dvf
+
+
+# ============================================================================
+# MODE HORS LIGNE
+# ============================================================================
+
+MESSAGE_HORS_LIGNE = "Mode hors ligne : source distante non interrogée"
+
+_hors_ligne: Optional[bool] = None
+
+
+def configurer_hors_ligne(actif: bool = True) -> bool:
+    """
+    Active le mode hors ligne : aucune requête HTTP
+    
+    Les transactions proviennent du store local, de la table précalculée ou
+    du cache disque (millésimes data.gouv.fr expirés compris, faute de
+    pouvoir les revalider) ; à défaut, des données simulées.
+    """
+    global _hors_ligne
+    _hors_ligne = bool(actif)
+    return _hors_ligne
+
+
+def obtenir_hors_ligne() -> bool:
+    """Mode hors ligne actif ($DVF_HORS_LIGNE=1 par défaut)"""
+    if _hors_ligne is None:
+        configurer_hors_ligne(os.environ.get('DVF_HORS_LIGNE', '0') == '1')
+    return _hors_ligne
 
 
 # ============================================================================
@@ -35,71 +502,530 @@ def recuperer_transactions_dvf(code_insee: str) -> Tuple[pd.DataFrame, Optional[
     """
     Récupère les transactions DVF avec système de fallback à 3 niveaux
     
+    Une commune comptant moins de NB_TRANSACTIONS_MIN_VOISINAGE transactions
+    (ou aucune) est complétée par ses voisines si un index de voisinage est
+    configuré, avant tout recours aux données simulées.
+    
     Retourne: (DataFrame des transactions, message d'erreur optionnel)
     """
-    print(f"🔄 Récupération des données pour {code_insee}...")
+    logger.info("🔄 Récupération des données pour %s...", code_insee)
+    
+    # NIVEAU 0 : Store local (si configuré)
+    df, error = _tentative_store_local(code_insee)
+    if not df.empty:
+        logger.info("✅ %d transactions récupérées (store local)", len(df))
+        METRIQUES.compter('dvf_fallback_total', niveau='store')
+        return _completer_par_voisinage(code_insee, df)
     
     # NIVEAU 1 : API data.gouv.fr (officielle)
     df, error = _tentative_api_datagouv(code_insee)
     if not df.empty:
-        print(f"✅ {len(df)} transactions récupérées (API data.gouv.fr)")
-        return df, None
+        logger.info("✅ %d transactions récupérées (API data.gouv.fr)", len(df))
+        METRIQUES.compter('dvf_fallback_total', niveau='datagouv')
+        return _completer_par_voisinage(code_insee, df)
     
-    print(f"⚠️  API data.gouv.fr indisponible")
+    logger.warning("⚠️  API data.gouv.fr indisponible")
+    logger.debug("API data.gouv.fr : %s", error)
     
     # NIVEAU 2 : API DVF+ (alternative)
     df, error = _tentative_api_dvfplus(code_insee)
     if not df.empty:
-        print(f"✅ {len(df)} transactions récupérées (API DVF+)")
-        return df, None
+        logger.info("✅ %d transactions récupérées (API DVF+)", len(df))
+        METRIQUES.compter('dvf_fallback_total', niveau='dvfplus')
+        return _completer_par_voisinage(code_insee, df)
     
-    print(f"⚠️  API DVF+ indisponible")
+    logger.warning("⚠️  API DVF+ indisponible")
+    logger.debug("API DVF+ : %s", error)
     
-    # NIVEAU 3 : Données simulées réalistes
-    print(f"🎭 Génération de données simulées réalistes")
+    # NIVEAU 3 : Communes voisines (index de voisinage configuré)
+    df, warning = _completer_par_voisinage(code_insee, pd.DataFrame())
+    if not df.empty:
+        METRIQUES.compter('dvf_fallback_total', niveau='voisinage')
+        return df, warning
+    
+    # NIVEAU 4 : Données simulées réalistes
+    logger.info("🎭 Génération de données simulées réalistes")
+    METRIQUES.compter('dvf_fallback_total', niveau='simulation')
     df = _generer_donnees_simulees(code_insee)
-    return df, "⚠️ Données simulées - APIs DVF temporairement indisponibles"
+    return df, MESSAGE_DONNEES_SIMULEES
+
+
+# Threads dédiés à la variante asynchrone : contrairement à l'exécuteur par
+# défaut de la boucle, asyncio.run() n'attend pas la fin des requêtes abandonnées
+_executeur_async = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dvf-async')
+
+
+async def recuperer_transactions_dvf_async(code_insee: str, delai_hedge: float = 1.0,
+                                           deadline: Optional[float] = None
+                                           ) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Variante asynchrone de `recuperer_transactions_dvf` avec requêtes couvertes (hedging)
+    
+    La source secondaire (DVF+) est lancée dès que la primaire (data.gouv.fr)
+    échoue, ou au bout de `delai_hedge` secondes si elle n'a pas encore répondu.
+    Le premier résultat non vide l'emporte et la requête perdante est annulée
+    (son résultat est ignoré : une requête HTTP en cours ne peut être interrompue).
+    
+    Args:
+        code_insee: Code INSEE de la commune
+        delai_hedge: Délai avant de lancer la source suivante (secondes)
+        deadline: Temps maximal avant de basculer sur les données simulées (None = sans limite)
+    
+    Retourne: (DataFrame des transactions, message d'erreur optionnel)
+    """
+    logger.info("🔄 Récupération des données pour %s...", code_insee)
+    
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + deadline if deadline is not None else None
+    
+    # NIVEAU 0 : Store local (lecture locale, sans attente réseau)
+    df, error = _tentative_store_local(code_insee)
+    if not df.empty:
+        logger.info("✅ %d transactions récupérées (store local)", len(df))
+        METRIQUES.compter('dvf_fallback_total', niveau='store')
+        return await _completer_par_voisinage_async(code_insee, df)
+    
+    sources = [('data.gouv.fr', 'datagouv', _tentative_api_datagouv),
+               ('DVF+', 'dvfplus', _tentative_api_dvfplus)]
+    taches: Dict[asyncio.Future, Tuple[str, str]] = {}
+    prochaine = 0
+    hedge_a = 0.0
+    
+    def lancer_suivante() -> None:
+        nonlocal prochaine, hedge_a
+        nom, niveau, tentative = sources[prochaine]
+        tache = loop.run_in_executor(_executeur_async, tentative, code_insee)
+        taches[tache] = (nom, niveau)
+        prochaine += 1
+        hedge_a = loop.time() + delai_hedge
+    
+    try:
+        while taches or prochaine < len(sources):
+            # Source précédente déjà en échec : inutile d'attendre le hedge
+            if not taches:
+                lancer_suivante()
+                continue
+            
+            timeout = None if limite is None else max(0.0, limite - loop.time())
+            if prochaine < len(sources):
+                attente_hedge = max(0.0, hedge_a - loop.time())
+                timeout = attente_hedge if timeout is None else min(timeout, attente_hedge)
+            
+            terminees, _ = await asyncio.wait(list(taches), timeout=timeout,
+                                              return_when=asyncio.FIRST_COMPLETED)
+            
+            for tache in terminees:
+                nom, niveau = taches.pop(tache)
+                df, error = tache.result()
+                if not df.empty:
+                    logger.info("✅ %d transactions récupérées (API %s)", len(df), nom)
+                    METRIQUES.compter('dvf_fallback_total', niveau=niveau)
+                    return await _completer_par_voisinage_async(code_insee, df)
+                logger.warning("⚠️  API %s indisponible", nom)
+                logger.debug("API %s : %s", nom, error)
+            
+            if limite is not None and loop.time() >= limite:
+                logger.warning("⏱️  Délai de %s s dépassé", deadline)
+                METRIQUES.compter('dvf_deadline_depassee_total')
+                break
+            
+            if prochaine < len(sources) and loop.time() >= hedge_a:
+                lancer_suivante()
+    finally:
+        for tache in taches:
+            tache.cancel()
+    
+    # NIVEAU 3 : Communes voisines (lecture locale)
+    df, warning = await _completer_par_voisinage_async(code_insee, pd.DataFrame())
+    if not df.empty:
+        METRIQUES.compter('dvf_fallback_total', niveau='voisinage')
+        return df, warning
+    
+    # NIVEAU 4 : Données simulées réalistes
+    logger.info("🎭 Génération de données simulées réalistes")
+    METRIQUES.compter('dvf_fallback_total', niveau='simulation')
+    df = _generer_donnees_simulees(code_insee)
+    return df, MESSAGE_DONNEES_SIMULEES
+
+
+def recuperer_transactions_communes(codes_insee: Iterable[str], workers: int = 8
+                                   ) -> Dict[str, Tuple[pd.DataFrame, Optional[str]]]:
+    """
+    Récupère les transactions de plusieurs communes en parallèle
+    
+    Chaque commune suit la chaîne de fallback de `recuperer_transactions_dvf`.
+    Les threads partagent la session HTTP poolée de `dvf_fetch` (keep-alive,
+    relances sur 429/5xx, débit limité par hôte).
+    
+    Args:
+        codes_insee: Codes INSEE (les doublons ne sont récupérés qu'une fois)
+        workers: Nombre maximal de récupérations simultanées
+    
+    Retourne: {code_insee: (DataFrame des transactions, message d'erreur optionnel)}
+    """
+    codes = list(dict.fromkeys(str(c) for c in codes_insee))
+    
+    if workers <= 1 or len(codes) <= 1:
+        return {code: recuperer_transactions_dvf(code) for code in codes}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(codes, executor.map(recuperer_transactions_dvf, codes)))
+
+
+# Lectures des communes voisines (distinctes des threads appelants)
+_executeur_voisinage = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dvf-voisins')
+
+
+def _voisinage_requis(code_insee: str, nb_transactions: int) -> bool:
+    """Commune à compléter par ses voisines (index configuré et trop peu de ventes)"""
+    index = obtenir_voisinage()
+    return index is not None and nb_transactions < NB_TRANSACTIONS_MIN_VOISINAGE and code_insee in index
+
+
+def _completer_par_voisinage(code_insee: str, df: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Complète les transactions d'une commune par celles de ses voisines
+    
+    Les anneaux de l'index de voisinage sont parcourus un à un (au plus
+    NB_ANNEAUX_MAX) ; les communes d'un anneau sont lues en parallèle, dans les
+    sources locales seulement (store, cache disque), et retenues par distance
+    croissante jusqu'à NB_TRANSACTIONS_MIN_VOISINAGE transactions : les
+    lectures restantes sont alors annulées.
+    
+    Retourne: (transactions, MESSAGE_VOISINAGE si des voisines ont été retenues)
+    """
+    if not _voisinage_requis(code_insee, len(df)):
+        return df, None
+    
+    morceaux = [df] if not df.empty else []
+    total, nb_voisines = len(df), 0
+    with METRIQUES.chronometre('dvf_etape_secondes', etape='voisinage'):
+        for anneau in obtenir_voisinage().anneaux(code_insee, NB_ANNEAUX_MAX):
+            futures = [_executeur_voisinage.submit(_transactions_locales, code) for code in anneau]
+            try:
+                for future in futures:
+                    voisine = future.result()
+                    if voisine.empty:
+                        continue
+                    morceaux.append(voisine)
+                    total += len(voisine)
+                    nb_voisines += 1
+                    if total >= NB_TRANSACTIONS_MIN_VOISINAGE:
+                        break
+            finally:
+                for future in futures:
+                    future.cancel()
+            if total >= NB_TRANSACTIONS_MIN_VOISINAGE:
+                break
+    
+    if not nb_voisines:
+        return df, None
+    logger.info("🏘️  %d transactions avec %d commune(s) voisine(s)", total, nb_voisines)
+    METRIQUES.compter('dvf_communes_voisines_total', nb_voisines)
+    return pd.concat(morceaux, ignore_index=True), MESSAGE_VOISINAGE.format(nb=nb_voisines)
+
+
+async def _completer_par_voisinage_async(code_insee: str, df: pd.DataFrame
+                                         ) -> Tuple[pd.DataFrame, Optional[str]]:
+    """`_completer_par_voisinage` hors de la boucle d'événements (lectures disque)"""
+    if not _voisinage_requis(code_insee, len(df)):
+        return df, None
+    return await asyncio.get_running_loop().run_in_executor(
+        _executeur_async, _completer_par_voisinage, code_insee, df
+    )
+
+
+def _transactions_locales(code_insee: str) -> pd.DataFrame:
+    """Transactions d'une commune sans requête HTTP : store local, sinon cache disque (même expiré)"""
+    df, _ = _tentative_store_local(code_insee)
+    cache = obtenir_cache()
+    if not df.empty or cache is None:
+        return df
+    
+    morceaux = []
+    for annee in obtenir_annees():
+        df, _, _ = cache.lire_revalidable('datagouv', annee, code_insee)
+        if df is not None and not df.empty:
+            morceaux.append(df)
+    if not morceaux:
+        df = cache.lire('dvfplus', None, code_insee)
+        return pd.DataFrame() if df is None else df
+    return morceaux[0] if len(morceaux) == 1 else pd.concat(morceaux, ignore_index=True)
+
+
+def _tentative_store_local(code_insee: str) -> Tuple[pd.DataFrame, Optional[str]]:
+    """Tentative de lecture depuis le store local en mémoire mappée"""
+    store = obtenir_store()
+    if store is None:
+        return pd.DataFrame(), "Store local non configuré"
+    
+    try:
+        with METRIQUES.chronometre('dvf_etape_secondes', etape='fetch', source='store'):
+            return store.lire_commune(code_insee, obtenir_annees()), None
+    except Exception as e:
+        return pd.DataFrame(), str(e)
+
+
+# Téléchargements des millésimes d'une commune (distincts des threads appelants)
+_executeur_annees = ThreadPoolExecutor(max_workers=16, thread_name_prefix='dvf-annees')
 
 
 def _tentative_api_datagouv(code_insee: str) -> Tuple[pd.DataFrame, Optional[str]]:
-    """Tentative de récupération depuis l'API data.gouv.fr"""
+    """
+    Tentative de récupération depuis l'API data.gouv.fr (un fichier par millésime)
+    
+    Sur plusieurs millésimes, la fenêtre assemblée est mise en cache en une
+    seule entrée : un cache chaud se lit alors en une lecture, sans
+    concaténation. Une fois cette entrée expirée, chaque millésime est relu
+    et revalidé séparément ; seuls les millésimes absents ou périmés
+    passent par le pool de téléchargement.
+    """
+    annees = obtenir_annees()
+    cache = obtenir_cache()
+    cle_fenetre = '-'.join(str(annee) for annee in annees)
+    
+    if cache is not None and len(annees) > 1:
+        df = cache.lire('datagouv_fenetre', cle_fenetre, code_insee)
+        if df is not None:
+            _compter_cache('disque', True)
+            return df, None
+    
+    # Entrées fraîches lues sur place ; le pool ne sert qu'aux manquantes
+    resultats = {}
+    entrees = {}
+    for annee in annees:
+        if cache is None:
+            break
+        df, validateurs, frais = cache.lire_revalidable('datagouv', annee, code_insee)
+        _compter_cache('disque', frais)
+        if frais:
+            resultats[annee] = (df, None)
+        else:
+            entrees[annee] = (df, validateurs)
+    
+    a_telecharger = [annee for annee in annees if annee not in resultats]
+    if len(a_telecharger) == 1:
+        annee = a_telecharger[0]
+        resultats[annee] = _recuperer_annee_datagouv(code_insee, annee, entrees.get(annee))
+    elif a_telecharger:
+        resultats.update(zip(a_telecharger, _executeur_annees.map(
+            lambda annee: _recuperer_annee_datagouv(code_insee, annee, entrees.get(annee)),
+            a_telecharger
+        )))
+    resultats = [resultats[annee] for annee in annees]
+    
+    morceaux = [df for df, _ in resultats if not df.empty]
+    if not morceaux:
+        erreurs = [f"{annee}: {error}" for annee, (_, error) in zip(annees, resultats) if error]
+        return pd.DataFrame(), "; ".join(erreurs) or "Aucune transaction"
+    
+    for annee, (_, error) in zip(annees, resultats):
+        if error:
+            logger.debug("Millésime %s indisponible pour %s : %s", annee, code_insee, error)
+    
+    if len(morceaux) == 1:
+        df = morceaux[0]
+    else:
+        df = pd.concat(morceaux, ignore_index=True)
+    
+    if cache is not None and len(annees) > 1:
+        # La fenêtre n'expire pas après le plus ancien de ses millésimes
+        dates = [cache.date_creation('datagouv', annee, code_insee) for annee in annees]
+        if None not in dates:
+            cache.ecrire('datagouv_fenetre', cle_fenetre, code_insee, df, cree_le=min(dates))
+    return df, None
+
+
+def _recuperer_annee_datagouv(code_insee: str, annee: int,
+                              entree: Optional[Tuple[Optional[pd.DataFrame], Dict[str, str]]] = None
+                              ) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Transactions d'un millésime data.gouv.fr, avec revalidation du cache
+    
+    Une entrée de cache expirée est revalidée par une requête conditionnelle :
+    sur 304 elle est conservée sans retéléchargement, et elle sert encore de
+    repli si la source est en erreur. Un millésime absent (404, ou CSV sans
+    transaction retenue) est mis en cache comme entrée négative, un DataFrame
+    vide soumis au même TTL. `entree` (DataFrame périmé ou None,
+    validateurs) évite de relire le cache quand l'appelant l'a déjà consulté.
+    """
+    cache = obtenir_cache()
+    perime, validateurs = None, {}
+    if entree is not None:
+        perime, validateurs = entree
+    elif cache is not None:
+        df, validateurs, frais = cache.lire_revalidable('datagouv', annee, code_insee)
+        _compter_cache('disque', frais)
+        if frais:
+            return df, None
+        perime = df
+    
+    if obtenir_hors_ligne():
+        return (pd.DataFrame(), MESSAGE_HORS_LIGNE) if perime is None else (perime, None)
+    
+    entetes = {}
+    if perime is not None:
+        if 'etag' in validateurs:
+            entetes['If-None-Match'] = validateurs['etag']
+        if 'last_modified' in validateurs:
+            entetes['If-Modified-Since'] = validateurs['last_modified']
+    
+    from dvf_fetch import obtenir_session
+    
     try:
         dept = code_insee[:2]
-        url = f"https://files.data.gouv.fr/geo-dvf/latest/csv/2023/communes/{dept}/{code_insee}.csv"
+        url = URL_DATAGOUV.format(annee=annee, dept=dept, code_insee=code_insee)
         
-        response = requests.get(url, timeout=10)
+        debut = time.perf_counter()
+        with obtenir_session().get(url, timeout=TIMEOUT_API, stream=True, headers=entetes) as response:
+            if response.status_code == 304 and perime is not None:
+                METRIQUES.compter('dvf_cache_total', cache='disque', resultat='revalide')
+                cache.ecrire('datagouv', annee, code_insee, perime, validateurs)
+                return perime, None
+            
+            if response.status_code != 200:
+                METRIQUES.compter('dvf_erreurs_http_total', source='datagouv', statut=str(response.status_code))
+                if response.status_code in STATUTS_ABSENCE and cache is not None:
+                    # Millésime absent de la source : entrée négative (vide) mise en cache
+                    cache.ecrire('datagouv', annee, code_insee, pd.DataFrame(), _validateurs_http(response))
+                    return pd.DataFrame(), None
+                if perime is not None:
+                    return perime, None
+                return pd.DataFrame(), f"HTTP {response.status_code}"
+            
+            response.raw.decode_content = True
+            df = lire_csv_dvf(response.raw, source_metriques='datagouv')
+            METRIQUES.compter('dvf_octets_total', response.raw.tell(), source='datagouv')
+            validateurs = _validateurs_http(response)
+        METRIQUES.observer('dvf_etape_secondes', time.perf_counter() - debut, etape='fetch', source='datagouv')
         
-        if response.status_code == 200:
-            df = pd.read_csv(StringIO(response.text))
-            return _filtrer_transactions(df), None
-        
-        return pd.DataFrame(), f"HTTP {response.status_code}"
+        if cache is not None:
+            cache.ecrire('datagouv', annee, code_insee, df, validateurs)
+        return df, None
         
     except Exception as e:
+        if perime is not None:
+            return perime, None
         return pd.DataFrame(), str(e)
 
 
+def _validateurs_http(response) -> Dict[str, str]:
+    """ETag et Last-Modified d'une réponse, pour les requêtes conditionnelles suivantes"""
+    validateurs = {}
+    if response.headers.get('ETag'):
+        validateurs['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        validateurs['last_modified'] = response.headers['Last-Modified']
+    return validateurs
+
+
 def _tentative_api_dvfplus(code_insee: str) -> Tuple[pd.DataFrame, Optional[str]]:
     """Tentative de récupération depuis l'API DVF+ (alternative)"""
+    cache = obtenir_cache()
+    if cache is not None:
+        df = cache.lire('dvfplus', None, code_insee)
+        _compter_cache('disque', df is not None)
+        if df is not None:
+            return df, None
+    
+    if obtenir_hors_ligne():
+        return pd.DataFrame(), MESSAGE_HORS_LIGNE
+    
+    from dvf_fetch import obtenir_session
+    
     try:
-        url = f"https://app.dvf.etalab.gouv.fr/api/v1/search?code_commune={code_insee}"
+        url = URL_DVFPLUS.format(code_insee=code_insee)
         
-        response = requests.get(url, timeout=10)
+        with METRIQUES.chronometre('dvf_etape_secondes', etape='fetch', source='dvfplus'):
+            response = obtenir_session().get(url, timeout=TIMEOUT_API)
+        METRIQUES.compter('dvf_octets_total', len(response.content), source='dvfplus')
         
         if response.status_code == 200:
             data = response.json()
+            df = pd.DataFrame()
             if 'results' in data and len(data['results']) > 0:
-                df = pd.DataFrame(data['results'])
-                return _filtrer_transactions(df), None
+                brut = pd.DataFrame(data['results'])
+                with METRIQUES.chronometre('dvf_etape_secondes', etape='filtre', source='dvfplus'):
+                    df = _filtrer_transactions(brut)
+                METRIQUES.compter('dvf_lignes_total', len(brut), source='dvfplus', etat='brutes')
+                METRIQUES.compter('dvf_lignes_total', len(df), source='dvfplus', etat='conservees')
+            if cache is not None:
+                cache.ecrire('dvfplus', None, code_insee, df)
+            return df, None
         
+        METRIQUES.compter('dvf_erreurs_http_total', source='dvfplus', statut=str(response.status_code))
+        if response.status_code in STATUTS_ABSENCE and cache is not None:
+            cache.ecrire('dvfplus', None, code_insee, pd.DataFrame())
         return pd.DataFrame(), f"HTTP {response.status_code}"
         
     except Exception as e:
         return pd.DataFrame(), str(e)
 
 
-def _filtrer_transactions(df: pd.DataFrame) -> pd.DataFrame:
-    """Filtre les transactions pour ne garder que les ventes de logements"""
+def _compter_cache(cache: str, hit: bool) -> None:
+    METRIQUES.compter('dvf_cache_total', cache=cache, resultat='hit' if hit else 'miss')
+
+
+def lire_csv_dvf(source, colonnes_supplementaires: Tuple[str, ...] = (),
+                 taille_chunk: int = TAILLE_CHUNK_CSV, source_metriques: str = 'fichier') -> pd.DataFrame:
+    """
+    Lit un CSV DVF en flux et le filtre bloc par bloc
+    
+    Seules les colonnes de COLONNES_CSV_DVF (et `colonnes_supplementaires`) sont
+    parsées, avec des types explicites ; chaque bloc est filtré avant d'être
+    conservé, de sorte que le CSV complet n'est jamais matérialisé en mémoire.
+    
+    Args:
+        source: Chemin, fichier ou flux binaire (ex: response.raw)
+        colonnes_supplementaires: Colonnes à conserver en plus (ex: 'code_commune')
+        taille_chunk: Nombre de lignes parsées par bloc
+        source_metriques: Label 'source' des durées de parsing et de filtrage
+    """
+    colonnes = set(COLONNES_CSV_DVF) | set(colonnes_supplementaires)
+    lecteur = pd.read_csv(
+        source,
+        usecols=lambda c: c in colonnes,
+        dtype=DTYPES_CSV_DVF,
+        chunksize=taille_chunk,
+    )
+    
+    morceaux = []
+    duree_parsing = duree_filtre = 0.0
+    lignes_brutes = 0
+    
+    # Le parsing a lieu à l'itération du lecteur : on mesure les deux étapes en alternance
+    debut = time.perf_counter()
+    for chunk in lecteur:
+        milieu = time.perf_counter()
+        df = _filtrer_transactions(chunk, colonnes_supplementaires)
+        if not df.empty:
+            morceaux.append(df)
+        lignes_brutes += len(chunk)
+        fin = time.perf_counter()
+        duree_parsing += milieu - debut
+        duree_filtre += fin - milieu
+        debut = fin
+    
+    if METRIQUES.actif:
+        METRIQUES.observer('dvf_etape_secondes', duree_parsing, etape='parsing', source=source_metriques)
+        METRIQUES.observer('dvf_etape_secondes', duree_filtre, etape='filtre', source=source_metriques)
+        METRIQUES.compter('dvf_lignes_total', lignes_brutes, source=source_metriques, etat='brutes')
+        METRIQUES.compter('dvf_lignes_total', sum(len(m) for m in morceaux),
+                          source=source_metriques, etat='conservees')
+    
+    if not morceaux:
+        return pd.DataFrame()
+    return pd.concat(morceaux, ignore_index=True)
+
+
+def _filtrer_transactions(df: pd.DataFrame, colonnes_supplementaires: Tuple[str, ...] = ()) -> pd.DataFrame:
+    """
+    Filtre les transactions pour ne garder que les ventes de logements
+    
+    Les colonnes de COLONNES_OPTIONNELLES et de `colonnes_supplementaires`
+    présentes dans `df` sont conservées telles quelles (ex: 'code_commune' pour
+    l'ingestion en masse).
+    """
     if df.empty:
         return df
     
@@ -118,116 +1044,290 @@ def _filtrer_transactions(df: pd.DataFrame) -> pd.DataFrame:
         if len(colonnes_presentes) < 3:
             return pd.DataFrame()
         
-        df = df[colonnes_presentes].copy()
+        supplementaires = [c for c in dict.fromkeys((*COLONNES_OPTIONNELLES, *colonnes_supplementaires))
+                           if c in df.columns]
+        df = df[colonnes_presentes + supplementaires].copy()
         
         # Conversion des types
-        df['date_mutation'] = pd.to_datetime(df['date_mutation'], errors='coerce')
+        df['date_mutation'] = pd.to_datetime(df['date_mutation'], format='ISO8601', errors='coerce')
         df['valeur_fonciere'] = pd.to_numeric(df['valeur_fonciere'], errors='coerce')
         df['surface_reelle_bati'] = pd.to_numeric(df['surface_reelle_bati'], errors='coerce')
         
         # Supprimer les valeurs nulles et aberrantes
-        df = df.dropna()
+        df = df.dropna(subset=colonnes)
         df = df[df['surface_reelle_bati'] > 0]
         df = df[df['valeur_fonciere'] > 0]
         
         return df
         
     except Exception as e:
-        print(f"Erreur lors du filtrage: {e}")
+        logger.warning("Erreur lors du filtrage : %s", e)
         return pd.DataFrame()
 
 
-def _generer_donnees_simulees(code_insee: str) -> pd.DataFrame:
-    """Génère des données simulées réalistes basées sur le département"""
+def _generer_donnees_simulees(code_insee: str, nb_transactions: int = 100) -> pd.DataFrame:
+    """
+    Génère des données simulées réalistes basées sur le département
     
-    dept = int(code_insee[:2]) if code_insee[:2].isdigit() else 75
-    prix_base = _get_prix_base_departement(dept)
+    Le tirage est vectorisé et utilise un générateur propre à l'appel, initialisé
+    à partir du code INSEE : le résultat est déterministe pour une commune et un
+    jour donnés, sans toucher à l'état global de NumPy (appel sûr depuis des threads).
+    
+    Args:
+        code_insee: Code INSEE de la commune
+        nb_transactions: Taille de l'échantillon (100 par défaut, jusqu'à des millions)
+    """
     
-    # Générer 100 transactions sur 3 ans
-    np.random.seed(int(code_insee) if code_insee.isdigit() else 42)
+    prix_base = prix_reference_commune(code_insee)
     
-    transactions = []
-    today = datetime.now()
+    graine = int(code_insee) if code_insee.isdigit() else zlib.crc32(code_insee.encode())
+    rng = np.random.default_rng(graine)
     
-    for _ in range(100):
-        # Date aléatoire sur 3 ans
-        jours_avant = np.random.randint(0, 1095)
-        date = today - timedelta(days=jours_avant)
-        
-        # Surface entre 30 et 150 m²
-        surface = 30 + np.random.random() * 120
-        
-        # Prix au m² avec variation ±20%
-        prix_m2 = prix_base * (0.8 + np.random.random() * 0.4)
-        
-        transactions.append({
-            'date_mutation': date,
-            'valeur_fonciere': prix_m2 * surface,
-            'surface_reelle_bati': surface
-        })
+    # Dates aléatoires sur 3 ans (à partir de minuit, pour un jeu stable dans la journée)
+    aujourd_hui = pd.Timestamp(datetime.now()).normalize()
+    jours_avant = rng.integers(0, 1095, size=nb_transactions)
+    dates = aujourd_hui - pd.to_timedelta(jours_avant, unit='D')
+    
+    # Surface entre 30 et 150 m²
+    surface = 30 + rng.random(nb_transactions) * 120
+    
+    # Prix au m² avec variation ±20%
+    prix_m2 = prix_base * (0.8 + rng.random(nb_transactions) * 0.4)
+    
+    return pd.DataFrame({
+        'date_mutation': dates,
+        'valeur_fonciere': prix_m2 * surface,
+        'surface_reelle_bati': surface
+    })
+
+
+def prix_reference_commune(code_insee: str, type_local: Optional[str] = None,
+                           annee: Optional[int] = None) -> float:
+    """
+    Prix de référence au m² de la commune (ordre de grandeur, sans réseau)
     
-    return pd.DataFrame(transactions)
+    Médiane de la commune ou de son département dans la table des prix de
+    référence (voir configurer_table_references), sinon prix de base du
+    département.
+    """
+    table = obtenir_table_references()
+    if table is not None:
+        prix = table.prix(code_insee, type_local, annee)
+        if prix is not None:
+            return prix
+    dept = int(code_insee[:2]) if code_insee[:2].isdigit() else 75
+    return _get_prix_base_departement(dept)
 
 
 def _get_prix_base_departement(dept: int) -> float:
     """Retourne le prix de base approximatif par département"""
-    prix_departements = {
-        75: 10000,  # Paris
-        92: 6000,   # Hauts-de-Seine
-        93: 4000,   # Seine-Saint-Denis
-        94: 4500,   # Val-de-Marne
-        78: 4000,   # Yvelines
-        91: 3500,   # Essonne
-        95: 3200,   # Val-d'Oise
-        77: 3000,   # Seine-et-Marne
-        13: 3500,   # Bouches-du-Rhône
-        6: 4500,    # Alpes-Maritimes
-        33: 3500,   # Gironde
-        31: 3200,   # Haute-Garonne
-        69: 3800,   # Rhône
-        59: 2500,   # Nord
-        44: 3000,   # Loire-Atlantique
-        34: 3200,   # Hérault
-        35: 3100,   # Ille-et-Vilaine
-        67: 3000,   # Bas-Rhin
-        38: 3300,   # Isère
-        74: 4000,   # Haute-Savoie
-        73: 3500,   # Savoie
-        29: 2200,   # Finistère
-        56: 2300,   # Morbihan
-        22: 2000,   # Côtes-d'Armor
-        17: 2500,   # Charente-Maritime
-        64: 2800,   # Pyrénées-Atlantiques
-        85: 2400,   # Vendée
-        14: 2600,   # Calvados
-        50: 2100,   # Manche
-        76: 2400,   # Seine-Maritime
-    }
-    
-    return prix_departements.get(dept, 2200)  # Prix moyen France par défaut
+    return PRIX_BASE_DEPARTEMENTS.get(dept, PRIX_BASE_DEFAUT)
 
 
 # ============================================================================
 # ANALYSE DU MARCHÉ
 # ============================================================================
 
-def analyser_marche(df: pd.DataFrame) -> Dict:
-    """Analyse les transactions et calcule les statistiques du marché"""
+# Analyses mémorisées, indexées par (commune, empreinte des transactions, bootstrap)
+_cache_analyses = CacheMemoire(taille_max=256)
+
+# Rééchantillonnages bootstrap de l'intervalle de confiance du prix moyen au m²
+NB_BOOTSTRAP = 300
+NIVEAU_CONFIANCE = 0.95
+# Éléments de la matrice (B × n) d'indices tirés à la fois (mémoire bornée)
+TAILLE_BLOC_BOOTSTRAP = 1 << 18
+# Taille maximale d'un rééchantillon : au-delà, tirage de m valeurs parmi n et
+# écarts à la moyenne remis à l'échelle de n (le coût ne croît plus avec n)
+TAILLE_MAX_REECHANTILLON = 10_000
+# Fourchette appliquée sans échantillon de prix (table précalculée)
+FOURCHETTE_FIXE = 0.05
+
+_bootstrap: Optional[Tuple[int, float]] = None
+
+
+def configurer_bootstrap(nb_reechantillons: int = NB_BOOTSTRAP,
+                         niveau: float = NIVEAU_CONFIANCE) -> Tuple[int, float]:
+    """
+    Paramètre l'intervalle de confiance bootstrap des analyses de marché
+    
+    Args:
+        nb_reechantillons: Nombre B de rééchantillonnages (0 = fourchette fixe ±5%)
+        niveau: Niveau de confiance de l'intervalle (ex: 0.95)
+    """
+    global _bootstrap
+    if nb_reechantillons < 0 or not 0 < niveau < 1:
+        raise ValueError("nb_reechantillons doit être positif et niveau compris entre 0 et 1")
+    _bootstrap = (int(nb_reechantillons), float(niveau))
+    return _bootstrap
+
+
+def obtenir_bootstrap() -> Tuple[int, float]:
+    """(B, niveau) actifs ($DVF_BOOTSTRAP pour B, sinon NB_BOOTSTRAP)"""
+    if _bootstrap is None:
+        configurer_bootstrap(int(os.environ.get('DVF_BOOTSTRAP', NB_BOOTSTRAP)))
+    return _bootstrap
+
+
+def intervalle_bootstrap(prix_m2: np.ndarray, nb_reechantillons: int = NB_BOOTSTRAP,
+                         niveau: float = NIVEAU_CONFIANCE, graine: int = 0) -> Dict:
+    """
+    Intervalle de confiance du prix moyen au m² par bootstrap (méthode des percentiles)
+    
+    Les B échantillons sont tirés comme une matrice (B × n) d'indices, par blocs
+    de TAILLE_BLOC_BOOTSTRAP éléments : la mémoire reste bornée quel que soit n.
+    Au-delà de TAILLE_MAX_REECHANTILLON valeurs, chaque rééchantillon n'en
+    compte que m = TAILLE_MAX_REECHANTILLON et l'écart de sa moyenne est
+    multiplié par sqrt(m / n) (bootstrap « m parmi n » de la moyenne).
+    Le tirage est déterministe pour une graine donnée.
+    
+    Returns:
+        {'bas', 'haut'} en €/m², avec 'niveau' et 'nb_reechantillons'
+    """
+    valeurs = np.asarray(prix_m2, dtype=np.float64)
+    n = len(valeurs)
+    m = min(n, TAILLE_MAX_REECHANTILLON)
+    rng = np.random.default_rng(graine)
+    moyennes = np.empty(nb_reechantillons)
+    
+    # Tampons d'un bloc réutilisés : ni allocation ni défaut de page par bloc
+    lignes_par_bloc = min(nb_reechantillons, max(1, TAILLE_BLOC_BOOTSTRAP // max(m, 1)))
+    tirages = np.empty((lignes_par_bloc, m), dtype=np.float32)
+    indices = np.empty((lignes_par_bloc, m), dtype=np.intp)
+    echantillons = np.empty((lignes_par_bloc, m))
+    
+    for debut in range(0, nb_reechantillons, lignes_par_bloc):
+        nb = min(lignes_par_bloc, nb_reechantillons - debut)
+        # Indices uniformes sur [0, n[ : tirage float32 (plus rapide que integers) mis à l'échelle
+        rng.random(out=tirages[:nb], dtype=np.float32)
+        np.multiply(tirages[:nb], n, out=tirages[:nb])
+        np.copyto(indices[:nb], tirages[:nb], casting='unsafe')
+        np.minimum(indices[:nb], n - 1, out=indices[:nb])
+        np.take(valeurs, indices[:nb], out=echantillons[:nb])
+        moyennes[debut:debut + nb] = echantillons[:nb].mean(axis=1)
+    
+    if m < n:
+        moyenne = valeurs.mean()
+        moyennes = moyenne + (moyennes - moyenne) * np.sqrt(m / n)
+    
+    alpha = (1 - niveau) / 2
+    bas, haut = np.quantile(moyennes, [alpha, 1 - alpha])
+    return {'bas': float(bas), 'haut': float(haut), 'niveau': niveau, 'nb_reechantillons': nb_reechantillons}
+
+
+def bande_dispersion(prix_m2: np.ndarray, niveau: float = NIVEAU_CONFIANCE) -> Dict:
+    """
+    Bande de prédiction du prix au m² d'un bien de la commune
+    
+    Quantiles empiriques (1 - niveau) / 2 et (1 + niveau) / 2 des prix
+    retenus : contrairement à l'intervalle de confiance de la moyenne
+    (`intervalle_bootstrap`), qui se resserre quand le nombre de ventes
+    croît, elle mesure l'écart de prix d'un bien à l'autre. Elle sert de
+    fourchette aux estimations.
+    
+    Returns:
+        {'bas', 'haut'} en €/m², avec 'niveau'
+    """
+    alpha = (1 - niveau) / 2
+    bas, haut = np.quantile(np.asarray(prix_m2, dtype=np.float64), [alpha, 1 - alpha])
+    return {'bas': float(bas), 'haut': float(haut), 'niveau': niveau}
+
+
+def configurer_cache_analyses(taille_max: int = 256) -> CacheMemoire:
+    """Redimensionne (et vide) le cache mémoire des analyses de marché"""
+    global _cache_analyses
+    _cache_analyses = CacheMemoire(taille_max=taille_max)
+    return _cache_analyses
+
+
+def stats_cache_analyses() -> Dict:
+    """Efficacité du cache des analyses (hits, misses, evictions, taux_hit...)"""
+    return _cache_analyses.stats()
+
+
+# Colonnes lues par l'analyse de marché, et en plus par l'index de comparables
+COLONNES_EMPREINTE_ANALYSE = ('date_mutation', 'valeur_fonciere', 'surface_reelle_bati')
+COLONNES_EMPREINTE_COMPARABLES = COLONNES_EMPREINTE_ANALYSE + (
+    'nombre_pieces_principales', 'type_local', 'latitude', 'longitude'
+)
+
+
+def empreinte_transactions(df: pd.DataFrame,
+                           colonnes: Sequence[str] = COLONNES_EMPREINTE_ANALYSE) -> str:
+    """
+    Empreinte du contenu d'un jeu de transactions (indépendante de l'index)
+    
+    Seules `colonnes` sont hachées : elles doivent couvrir tout ce que lit
+    le calcul mis en cache sous cette empreinte.
+    """
+    hachage = hashlib.blake2b(digest_size=16)
+    for colonne in colonnes:
+        if colonne not in df.columns:
+            continue
+        hachage.update(colonne.encode())
+        serie = df[colonne]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            hachage.update('|'.join(str(c) for c in serie.cat.categories).encode())
+            serie = serie.cat.codes
+        valeurs = np.ascontiguousarray(serie.to_numpy())
+        hachage.update(str(valeurs.dtype).encode())
+        if valeurs.dtype == object:
+            hachage.update('\x00'.join(map(str, valeurs)).encode())
+        else:
+            hachage.update(valeurs.view(np.uint8).data)
+    return hachage.hexdigest()
+
+
+def analyser_marche(df: pd.DataFrame, code_insee: Optional[str] = None) -> Dict:
+    """
+    Analyse les transactions et calcule les statistiques du marché
+    
+    Le résultat est mémorisé par (code_insee, empreinte des transactions,
+    paramètres du bootstrap) : une nouvelle analyse du même jeu de données ne
+    coûte qu'un hachage. Le DataFrame d'entrée n'est pas modifié.
+    
+    'intervalle' donne l'intervalle de confiance bootstrap du prix moyen au m²
+    (voir `configurer_bootstrap`), None si le bootstrap est désactivé.
+    'dispersion' donne la bande de prédiction du prix au m² d'un bien (voir
+    `bande_dispersion`), dont les estimations tirent leur fourchette.
+    """
     
     if df.empty:
         return {
             'prix_moyen_m2': 0,
             'stats': {'min': 0, 'max': 0, 'moyen': 0, 'mediane': 0, 'nb_transactions': 0},
-            'evolution': pd.DataFrame()
+            'evolution': pd.DataFrame(),
+            'intervalle': None,
+            'dispersion': None
         }
     
+    bootstrap = obtenir_bootstrap()
+    cle = (code_insee, empreinte_transactions(df), bootstrap)
+    analyse = _cache_analyses.lire(cle)
+    _compter_cache('analyses', analyse is not None)
+    if analyse is None:
+        with METRIQUES.chronometre('dvf_etape_secondes', etape='analyse'):
+            analyse = _analyser_marche(df, *bootstrap)
+        _cache_analyses.ecrire(cle, analyse)
+    
+    # Copie superficielle : l'appelant peut remplacer des clés sans altérer le cache
+    return dict(analyse)
+
+
+def _analyser_marche(df: pd.DataFrame, nb_reechantillons: int = NB_BOOTSTRAP,
+                     niveau: float = NIVEAU_CONFIANCE) -> Dict:
+    """Calcul effectif de l'analyse du marché (sans cache)"""
+    
     # Calculer le prix au m²
-    df['prix_m2'] = df['valeur_fonciere'] / df['surface_reelle_bati']
+    prix_m2 = df['valeur_fonciere'] / df['surface_reelle_bati']
     
     # Supprimer les outliers (5% et 95% percentile)
-    q5 = df['prix_m2'].quantile(0.05)
-    q95 = df['prix_m2'].quantile(0.95)
-    df_clean = df[(df['prix_m2'] >= q5) & (df['prix_m2'] <= q95)].copy()
+    q5 = prix_m2.quantile(0.05)
+    q95 = prix_m2.quantile(0.95)
+    masque = (prix_m2 >= q5) & (prix_m2 <= q95)
+    df_clean = pd.DataFrame({
+        'annee': df.loc[masque, 'date_mutation'].dt.year,
+        'prix_m2': prix_m2[masque],
+    })
     
     # Statistiques
     stats = {
@@ -239,15 +1339,25 @@ def analyser_marche(df: pd.DataFrame) -> Dict:
     }
     
     # Évolution par année
-    df_clean['annee'] = df_clean['date_mutation'].dt.year
     evolution = df_clean.groupby('annee')['prix_m2'].mean().reset_index()
     evolution.columns = ['annee', 'prix_m2']
     evolution = evolution.sort_values('annee')
     
+    intervalle = None
+    dispersion = None
+    if len(df_clean) > 1:
+        dispersion = bande_dispersion(df_clean['prix_m2'].to_numpy(), niveau)
+        if nb_reechantillons > 0:
+            with METRIQUES.chronometre('dvf_etape_secondes', etape='bootstrap'):
+                intervalle = intervalle_bootstrap(df_clean['prix_m2'].to_numpy(), nb_reechantillons, niveau)
+    
     return {
         'prix_moyen_m2': stats['moyen'],
         'stats': stats,
-        'evolution': evolution
+        'evolution': evolution,
+        'tendance': _calculer_tendance(evolution),
+        'intervalle': intervalle,
+        'dispersion': dispersion
     }
 
 
@@ -255,22 +1365,73 @@ def analyser_marche(df: pd.DataFrame) -> Dict:
 # CALCUL DE L'ESTIMATION
 # ============================================================================
 
-def calculer_estimation(prix_moyen_m2: float, stats: Dict, evolution: pd.DataFrame, 
-                       bien: BienImmobilier) -> Dict:
-    """Calcule l'estimation finale avec ajustement standing"""
+# Coefficients d'ajustement selon le standing
+COEFFICIENTS_STANDING = {
+    Standing.A_RENOVER: 0.85,
+    Standing.STANDARD: 1.0,
+    Standing.HAUT_DE_GAMME: 1.20
+}
+
+
+def calculer_estimation(prix_moyen_m2: float, stats: Dict, evolution: pd.DataFrame,
+                        bien: BienImmobilier, intervalle: Optional[Dict] = None) -> Estimation:
+    """
+    Calcule l'estimation finale avec ajustement standing
     
-    # Coefficients d'ajustement
-    coefficients = {
-        Standing.A_RENOVER: 0.85,
-        Standing.STANDARD: 1.0,
-        Standing.HAUT_DE_GAMME: 1.20
+    Signature historique : l'analyse est reconstituée à partir de ses
+    éléments, voir `calculer_estimation_analyse`.
+    """
+    analyse = {
+        'prix_moyen_m2': prix_moyen_m2,
+        'stats': stats,
+        'evolution': evolution,
+        'intervalle': intervalle,
     }
+    return calculer_estimation_analyse(analyse, bien)
+
+
+def calculer_estimation_analyse(analyse: Dict, bien: BienImmobilier) -> Estimation:
+    """
+    Calcule l'estimation finale d'après une analyse de marché (`analyser_marche`)
+    
+    La fourchette reprend la bande de dispersion des prix au m² de la commune
+    (`dispersion` de l'analyse), ou ±FOURCHETTE_FIXE à défaut. L'estimation
+    référence `analyse` (statistiques, évolution) sans la recopier.
+    """
     
-    coefficient = coefficients[bien.standing]
+    prix_moyen_m2 = analyse['prix_moyen_m2']
+    coefficient = COEFFICIENTS_STANDING[bien.standing]
     prix_ajuste_m2 = prix_moyen_m2 * coefficient
     estimation_finale = prix_ajuste_m2 * bien.surface_habitable
+    ratio_bas, ratio_haut = _ratios_fourchette(prix_moyen_m2, analyse.get('dispersion'))
     
-    # Calculer la tendance
+    return Estimation(
+        valeur_estimee=int(estimation_finale),
+        fourchette_basse=int(estimation_finale * ratio_bas),
+        fourchette_haute=int(estimation_finale * ratio_haut),
+        prix_moyen_m2=int(prix_ajuste_m2),
+        coefficient=coefficient,
+        tendance=int(_tendance_analyse(analyse)),
+        mode='moyenne',
+        analyse=analyse
+    )
+
+
+def _ratios_fourchette(prix_moyen_m2: float, dispersion: Optional[Dict]) -> Tuple[float, float]:
+    """Bornes de la fourchette (bande de dispersion) relatives au prix moyen"""
+    if dispersion is None or not prix_moyen_m2:
+        return 1 - FOURCHETTE_FIXE, 1 + FOURCHETTE_FIXE
+    return dispersion['bas'] / prix_moyen_m2, dispersion['haut'] / prix_moyen_m2
+
+
+def _tendance_analyse(analyse: Dict) -> float:
+    """Tendance calculée avec l'analyse, ou déduite de son évolution (table précalculée)"""
+    tendance = analyse.get('tendance')
+    return _calculer_tendance(analyse['evolution']) if tendance is None else tendance
+
+
+def _calculer_tendance(evolution: pd.DataFrame) -> float:
+    """Pente moyenne du prix au m² entre la première et la dernière année (€/m²/an)"""
     tendance = 0
     if len(evolution) >= 2:
         premiere_annee = evolution.iloc[0]
@@ -278,17 +1439,149 @@ def calculer_estimation(prix_moyen_m2: float, stats: Dict, evolution: pd.DataFra
         nb_annees = derniere_annee['annee'] - premiere_annee['annee']
         if nb_annees > 0:
             tendance = (derniere_annee['prix_m2'] - premiere_annee['prix_m2']) / nb_annees
+    return tendance
+
+
+# ============================================================================
+# ESTIMATION PAR COMPARABLES
+# ============================================================================
+
+# Modes d'estimation : moyenne communale, ventes comparables les plus proches,
+# modèle hédonique du département ou prix récents pondérés dans le temps
+MODES_ESTIMATION = ('moyenne', 'comparables', 'hedonique', 'recent')
+
+# Nombre de ventes comparables retenues par estimation
+NB_COMPARABLES = 10
+
+MESSAGE_COMPARABLES_INSUFFISANTS = "Comparables insuffisants : estimation sur la moyenne communale"
+MESSAGE_MODELE_INDISPONIBLE = "Modèle hédonique indisponible pour ce département : estimation sur la moyenne communale"
+MESSAGE_TYPE_HORS_MODELE = "Type de local hors du modèle hédonique : estimation sur la moyenne communale"
+MESSAGE_MARCHE_INSUFFISANT = "Ventes récentes insuffisantes : estimation sur la moyenne communale"
+
+# Index de comparables mémorisés, indexés par (commune, empreinte des colonnes indexées)
+_cache_comparables = CacheMemoire(taille_max=64)
+
+
+def index_comparables(df: pd.DataFrame, code_insee: Optional[str] = None) -> IndexComparables:
+    """Index de recherche de comparables des transactions (construit une fois par jeu de données)"""
+    cle = (code_insee, empreinte_transactions(df, COLONNES_EMPREINTE_COMPARABLES))
+    index = _cache_comparables.lire(cle)
+    _compter_cache('comparables', index is not None)
+    if index is None:
+        with METRIQUES.chronometre('dvf_etape_secondes', etape='index_comparables'):
+            index = IndexComparables(df)
+        _cache_comparables.ecrire(cle, index)
+    return index
+
+
+def calculer_estimation_prix(prix: Dict, analyse: Dict, bien: BienImmobilier, mode: str) -> Estimation:
+    """
+    Estimation à partir d'un prix au m² et de sa fourchette (comparables, modèle)
     
-    return {
-        'valeur_estimee': int(estimation_finale),
-        'fourchette_basse': int(estimation_finale * 0.95),
-        'fourchette_haute': int(estimation_finale * 1.05),
-        'prix_moyen_m2': int(prix_ajuste_m2),
-        'coefficient': coefficient,
-        'stats': stats,
-        'evolution': evolution,
-        'tendance': int(tendance)
-    }
+    Même résultat que `calculer_estimation_analyse` : `prix` donne le prix au m²
+    central et ses bornes (prix_m2, prix_m2_bas, prix_m2_haut), ajustés du
+    standing ; les statistiques et l'évolution restent celles de la commune.
+    """
+    
+    coefficient = COEFFICIENTS_STANDING[bien.standing]
+    surface = bien.surface_habitable
+    
+    return Estimation(
+        valeur_estimee=int(prix['prix_m2'] * coefficient * surface),
+        fourchette_basse=int(prix['prix_m2_bas'] * coefficient * surface),
+        fourchette_haute=int(prix['prix_m2_haut'] * coefficient * surface),
+        prix_moyen_m2=int(prix['prix_m2'] * coefficient),
+        coefficient=coefficient,
+        tendance=int(_tendance_analyse(analyse)),
+        mode=mode,
+        analyse=analyse
+    )
+
+
+def estimer_par_comparables(bien: BienImmobilier, df_transactions: pd.DataFrame, analyse: Dict,
+                            warning: Optional[str] = None) -> Tuple[Estimation, Optional[str]]:
+    """
+    Estimation sur les NB_COMPARABLES ventes les plus semblables au bien
+    
+    Repli sur la moyenne communale (`estimer_depuis_analyse`) pour des données
+    simulées ou lorsque moins de NB_COMPARABLES_MIN comparables sont trouvés.
+    """
+    
+    if donnees_simulees(warning):
+        return estimer_depuis_analyse(bien, analyse, warning)
+    
+    index = index_comparables(df_transactions, bien.code_insee)
+    with METRIQUES.chronometre('dvf_etape_secondes', etape='comparables'):
+        comparables = index.rechercher(
+            bien.surface_habitable, bien.nombre_pieces, bien.type_local,
+            bien.latitude, bien.longitude, k=NB_COMPARABLES
+        )
+        prix = prix_comparables(comparables)
+    
+    if prix is None:
+        estimation, warning = estimer_depuis_analyse(bien, analyse, None)
+        return estimation, warning or MESSAGE_COMPARABLES_INSUFFISANTS
+    
+    estimation = calculer_estimation_prix(prix, analyse, bien, 'comparables')
+    estimation.comparables = pd.DataFrame(comparables)
+    return estimation, None
+
+
+def estimer_par_modele(bien: BienImmobilier, analyse: Dict,
+                       warning: Optional[str] = None) -> Tuple[Estimation, Optional[str]]:
+    """
+    Estimation par le modèle hédonique du département (voir `dvf_hedonique`)
+    
+    La fourchette correspond aux quartiles de la dispersion résiduelle du
+    modèle. Repli sur la moyenne communale si aucun modèle n'est configuré,
+    si le département n'y figure pas ou si le type de local n'est pas l'un de
+    ceux du modèle (TYPES_MODELE).
+    """
+    
+    modele = obtenir_modele_hedonique()
+    if modele is None or bien.code_insee not in modele:
+        estimation, warning = estimer_depuis_analyse(bien, analyse, warning)
+        return estimation, warning or MESSAGE_MODELE_INDISPONIBLE
+    
+    with METRIQUES.chronometre('dvf_etape_secondes', etape='hedonique'):
+        prediction = modele.predire_biens([bien])
+    prix = {cle: float(valeurs[0]) for cle, valeurs in prediction.items()}
+    if np.isnan(prix['prix_m2']):
+        estimation, warning = estimer_depuis_analyse(bien, analyse, warning)
+        return estimation, warning or MESSAGE_TYPE_HORS_MODELE
+    
+    return calculer_estimation_prix(prix, analyse, bien, 'hedonique'), warning
+
+
+def estimer_par_marche(bien: BienImmobilier, analyse: Dict,
+                       warning: Optional[str] = None) -> Tuple[Estimation, Optional[str]]:
+    """
+    Estimation sur les ventes récentes de la commune (voir `dvf_marche`)
+    
+    Médiane des prix au m² pondérée par l'ancienneté des ventes (demi-vie de
+    dvf_marche.DEMI_VIE_MOIS), fourchette aux quartiles pondérés ; la tendance est la
+    pente pondérée des médianes mensuelles. Repli sur la moyenne communale si
+    aucune statistique n'est configurée ou si les ventes récentes manquent.
+    """
+    
+    statistiques = obtenir_statistiques_marche()
+    prix = None
+    if statistiques is not None:
+        with METRIQUES.chronometre('dvf_etape_secondes', etape='marche'):
+            prix = statistiques.estimation_ponderee(bien.code_insee)
+    
+    if prix is None:
+        estimation, warning = estimer_depuis_analyse(bien, analyse, warning)
+        return estimation, warning or MESSAGE_MARCHE_INSUFFISANT
+    
+    estimation = calculer_estimation_prix(prix, analyse, bien, 'recent')
+    estimation.tendance = int(prix['tendance'])
+    return estimation, warning
+
+
+def _verifier_mode(mode: str) -> None:
+    if mode not in MODES_ESTIMATION:
+        raise ValueError(f"Mode d'estimation inconnu : {mode} (attendu : {', '.join(MODES_ESTIMATION)})")
 
 
 # ============================================================================
@@ -296,7 +1589,9 @@ def calculer_estimation(prix_moyen_m2: float, stats: Dict, evolution: pd.DataFra
 # ============================================================================
 
 def estimer_bien(ville: str, code_insee: str, surface: float, pieces: int, 
-                standing: Standing) -> Tuple[Dict, Optional[str]]:
+                standing: Standing, mode: str = 'moyenne', type_local: Optional[str] = None,
+                latitude: Optional[float] = None, longitude: Optional[float] = None
+                ) -> Tuple[Estimation, Optional[str]]:
     """
     Fonction principale pour estimer un bien immobilier
     
@@ -306,42 +1601,299 @@ def estimer_bien(ville: str, code_insee: str, surface: float, pieces: int,
         surface: Surface habitable en m²
         pieces: Nombre de pièces
         standing: Standing du bien (enum)
+        mode: 'moyenne' (prix moyen communal), 'comparables' (ventes les plus
+              semblables), 'hedonique' (modèle du département, voir configurer_modele_hedonique)
+              ou 'recent' (ventes récentes pondérées, voir configurer_statistiques_marche)
+        type_local, latitude, longitude: Facultatifs, affinent le mode 'comparables'
     
     Returns:
-        (dictionnaire avec l'estimation, message d'avertissement optionnel)
+        (estimation, lisible aussi comme un dictionnaire, message d'avertissement optionnel)
     """
     
+    _verifier_mode(mode)
+    
     # Créer le bien
-    bien = BienImmobilier(code_insee, ville, surface, pieces, standing)
+    bien = BienImmobilier(code_insee, ville, surface, pieces, standing,
+                          type_local=type_local, latitude=latitude, longitude=longitude)
+    
+    # Statistiques précalculées (sans accès aux transactions)
+    if mode != 'comparables':
+        analyse = _analyse_precalculee(code_insee)
+        if analyse is not None:
+            return _estimer_depuis_analyse_mode(bien, analyse, None, mode)
     
     # Récupérer les transactions
     df_transactions, warning = recuperer_transactions_dvf(code_insee)
     
+    return _estimer_depuis_transactions(bien, df_transactions, warning, mode)
+
+
+async def estimer_bien_async(ville: str, code_insee: str, surface: float, pieces: int,
+                             standing: Standing, delai_hedge: float = 1.0,
+                             deadline: Optional[float] = None, mode: str = 'moyenne',
+                             type_local: Optional[str] = None, latitude: Optional[float] = None,
+                             longitude: Optional[float] = None) -> Tuple[Estimation, Optional[str]]:
+    """
+    Variante asynchrone de `estimer_bien` dont la latence est bornée par `deadline`
+    
+    Voir `recuperer_transactions_dvf_async` pour `delai_hedge` et `deadline`.
+    """
+    
+    _verifier_mode(mode)
+    bien = BienImmobilier(code_insee, ville, surface, pieces, standing,
+                          type_local=type_local, latitude=latitude, longitude=longitude)
+    
+    if mode == 'comparables':
+        df_transactions, warning = await recuperer_transactions_dvf_async(
+            code_insee, delai_hedge=delai_hedge, deadline=deadline
+        )
+        return _estimer_depuis_transactions(bien, df_transactions, warning, mode)
+    
+    analyse, warning = await analyser_commune_async(code_insee, delai_hedge=delai_hedge, deadline=deadline)
+    if analyse is None:
+        return None, warning
+    
+    return _estimer_depuis_analyse_mode(bien, analyse, warning, mode)
+
+
+async def analyser_commune_async(code_insee: str, delai_hedge: float = 1.0,
+                                 deadline: Optional[float] = None) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Analyse du marché d'une commune, indépendante du bien à estimer
+    
+    Table précalculée si disponible, sinon transactions récupérées (voir
+    `recuperer_transactions_dvf_async`) puis `analyser_marche`. L'estimation
+    d'un bien s'en déduit sans nouvel accès aux données (`estimer_depuis_analyse`).
+    
+    Retourne: (analyse ou None, message d'avertissement ou d'erreur optionnel)
+    """
+    
+    analyse = _analyse_precalculee(code_insee)
+    if analyse is not None:
+        return analyse, None
+    
+    df_transactions, warning = await recuperer_transactions_dvf_async(
+        code_insee, delai_hedge=delai_hedge, deadline=deadline
+    )
+    
+    if df_transactions.empty:
+        return None, "Impossible de récupérer les données pour cette commune"
+    
+    return analyser_marche(df_transactions, code_insee), warning
+
+
+def _estimer_depuis_transactions(bien: BienImmobilier, df_transactions: pd.DataFrame,
+                                 warning: Optional[str], mode: str = 'moyenne') -> Tuple[Estimation, Optional[str]]:
+    """Analyse du marché puis estimation à partir des transactions récupérées"""
+    
     if df_transactions.empty:
         return None, "Impossible de récupérer les données pour cette commune"
     
     # Analyser le marché
-    analyse = analyser_marche(df_transactions)
+    analyse = analyser_marche(df_transactions, bien.code_insee)
+    
+    if mode == 'comparables' and analyse['prix_moyen_m2'] != 0:
+        return estimer_par_comparables(bien, df_transactions, analyse, warning)
+    return _estimer_depuis_analyse_mode(bien, analyse, warning, mode)
+
+
+def _estimer_depuis_analyse_mode(bien: BienImmobilier, analyse: Dict, warning: Optional[str],
+                                 mode: str) -> Tuple[Estimation, Optional[str]]:
+    if mode == 'hedonique' and analyse['prix_moyen_m2'] != 0:
+        return estimer_par_modele(bien, analyse, warning)
+    if mode == 'recent' and analyse['prix_moyen_m2'] != 0:
+        return estimer_par_marche(bien, analyse, warning)
+    return estimer_depuis_analyse(bien, analyse, warning)
+
+
+def estimer_depuis_analyse(bien: BienImmobilier, analyse: Dict,
+                           warning: Optional[str] = None) -> Tuple[Estimation, Optional[str]]:
+    """Estimation à partir d'une analyse de marché (calculée ou précalculée)"""
     
     if analyse['prix_moyen_m2'] == 0:
         return None, "Données insuffisantes pour cette commune"
     
     # Calculer l'estimation
-    estimation = calculer_estimation(
-        analyse['prix_moyen_m2'],
-        analyse['stats'],
-        analyse['evolution'],
-        bien
-    )
+    with METRIQUES.chronometre('dvf_etape_secondes', etape='estimation'):
+        estimation = calculer_estimation_analyse(analyse, bien)
     
     return estimation, warning
 
 
+# ============================================================================
+# ESTIMATION EN LOT
+# ============================================================================
+
+def estimer_biens(biens: pd.DataFrame, workers: int = 1,
+                  analyses_connues: Optional[Dict[str, Tuple[Optional[Dict], Optional[str]]]] = None
+                  ) -> pd.DataFrame:
+    """
+    Estime un portefeuille de biens en une seule passe
+    
+    Chaque commune distincte est récupérée et analysée une seule fois, puis
+    toutes les estimations sont calculées de façon vectorisée avec NumPy.
+    
+    Args:
+        biens: DataFrame avec les colonnes code_insee, surface, pieces, standing
+               (standing: enum Standing, libellé "Standard"... ou nom "STANDARD")
+        workers: Nombre de communes récupérées en parallèle
+        analyses_connues: Analyses déjà obtenues, {code_insee: (analyse ou None, avertissement)}
+                          (voir `analyser_commune_async`) ; seules les autres communes sont récupérées
+    
+    Returns:
+        DataFrame aligné sur l'index de `biens` avec valeur_estimee,
+        fourchette_basse, fourchette_haute, prix_moyen_m2, coefficient,
+        tendance, nb_transactions et avertissement (None si données réelles de
+        la commune ; voir `source_donnees`)
+    """
+    
+    return estimer_lot(biens, workers, analyses_connues).vers_dataframe()
+
+
+def estimer_lot(biens: pd.DataFrame, workers: int = 1,
+                analyses_connues: Optional[Dict[str, Tuple[Optional[Dict], Optional[str]]]] = None
+                ) -> EstimationsLot:
+    """
+    Variante de `estimer_biens` qui retourne les colonnes NumPy des résultats
+    
+    Aucun objet Python par bien : adapté aux lots de plusieurs centaines de
+    milliers de biens et à l'export Arrow/Parquet (`EstimationsLot.ecrire_parquet`).
+    """
+    
+    codes, communes = pd.factorize(biens['code_insee'].astype(str))
+    
+    # Une récupération + une analyse par commune
+    nb_communes = len(communes)
+    prix_communes = np.zeros(nb_communes)
+    tendances_communes = np.zeros(nb_communes)
+    nb_transactions_communes = np.zeros(nb_communes, dtype=np.int64)
+    ratios_bas_communes = np.full(nb_communes, 1 - FOURCHETTE_FIXE)
+    ratios_haut_communes = np.full(nb_communes, 1 + FOURCHETTE_FIXE)
+    avertissements_communes = np.empty(nb_communes, dtype=object)
+    
+    analyses = analyser_communes(communes, workers, analyses_connues)
+    
+    for i, code_insee in enumerate(communes):
+        analyse, warning = analyses[code_insee]
+        
+        if analyse is None:
+            avertissements_communes[i] = warning
+            continue
+        
+        if analyse['prix_moyen_m2'] == 0:
+            avertissements_communes[i] = "Données insuffisantes pour cette commune"
+            continue
+        
+        prix_communes[i] = analyse['prix_moyen_m2']
+        tendances_communes[i] = _tendance_analyse(analyse)
+        nb_transactions_communes[i] = analyse['stats']['nb_transactions']
+        ratios_bas_communes[i], ratios_haut_communes[i] = _ratios_fourchette(
+            analyse['prix_moyen_m2'], analyse.get('dispersion')
+        )
+        avertissements_communes[i] = warning
+    
+    debut = time.perf_counter()
+    
+    # Coefficients de standing par recherche dans un tableau
+    coefficients = np.array([COEFFICIENTS_STANDING[s] for s in Standing] + [np.nan])
+    indices_standing = _indices_standing(biens['standing'])
+    coefficient = coefficients[indices_standing]
+    
+    surface = biens['surface'].to_numpy(dtype=float)
+    prix_ajuste_m2 = prix_communes[codes] * coefficient
+    estimation_finale = prix_ajuste_m2 * surface
+    
+    standing_inconnu = indices_standing == len(Standing)
+    surface_invalide = ~(surface > 0)
+    valide = (prix_communes[codes] > 0) & ~standing_inconnu & ~surface_invalide
+    
+    def _entiers(valeurs: np.ndarray) -> np.ndarray:
+        # Troncature identique à int() ; 0 pour les biens non estimés
+        return np.where(valide, np.trunc(valeurs), 0).astype(np.int64)
+    
+    # Avertissements encodés par dictionnaire : un message par commune au plus
+    codes_communes, messages = pd.factorize(avertissements_communes)
+    messages = list(messages) + ["Standing inconnu", "Surface invalide"]
+    codes_avertissement = codes_communes.astype(np.int32)[codes]
+    codes_avertissement[standing_inconnu] = len(messages) - 2
+    codes_avertissement[surface_invalide] = len(messages) - 1
+    
+    resultats = EstimationsLot(
+        valeur_estimee=_entiers(estimation_finale),
+        fourchette_basse=_entiers(estimation_finale * ratios_bas_communes[codes]),
+        fourchette_haute=_entiers(estimation_finale * ratios_haut_communes[codes]),
+        prix_moyen_m2=_entiers(prix_ajuste_m2),
+        coefficient=coefficient,
+        tendance=_entiers(tendances_communes[codes]),
+        nb_transactions=nb_transactions_communes[codes],
+        valide=valide,
+        codes_avertissement=codes_avertissement,
+        avertissements=messages,
+        index=biens.index
+    )
+    
+    METRIQUES.observer('dvf_etape_secondes', time.perf_counter() - debut, etape='estimation_lot')
+    return resultats
+
+
+def analyser_communes(codes_insee: Iterable[str], workers: int = 1,
+                      analyses_connues: Optional[Dict[str, Tuple[Optional[Dict], Optional[str]]]] = None
+                      ) -> Dict[str, Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Analyse du marché de plusieurs communes, une fois chacune
+    
+    Analyses fournies, puis table précalculée ; les autres communes sont
+    récupérées en parallèle (`workers` threads) puis analysées.
+    
+    Retourne: {code_insee: (analyse ou None, avertissement)}, avertissement
+              toujours renseigné lorsque l'analyse manque
+    """
+    connues = analyses_connues or {}
+    analyses = {
+        code: connues[code] if code in connues else (_analyse_precalculee(code), None)
+        for code in dict.fromkeys(str(c) for c in codes_insee)
+    }
+    transactions = recuperer_transactions_communes(
+        [code for code, (analyse, _) in analyses.items() if analyse is None and code not in connues],
+        workers=workers
+    )
+    
+    for code_insee, (analyse, warning) in analyses.items():
+        if analyse is None and code_insee in transactions:
+            df_transactions, warning = transactions[code_insee]
+            if not df_transactions.empty:
+                analyse = analyser_marche(df_transactions, code_insee)
+        if analyse is None:
+            warning = warning or "Impossible de récupérer les données pour cette commune"
+        analyses[code_insee] = (analyse, warning)
+    
+    return analyses
+
+
+def _indices_standing(standings: pd.Series) -> np.ndarray:
+    """Position de chaque standing dans l'enum (len(Standing) si inconnu)"""
+    membres = list(Standing)
+    indices = pd.Categorical(standings, categories=membres).codes.astype(np.int64)
+    
+    # Libellés ("Standard") puis noms ("STANDARD") pour les valeurs non reconnues
+    for cles in ([s.value for s in membres], [s.name for s in membres]):
+        inconnus = indices < 0
+        if not inconnus.any():
+            break
+        codes = pd.Categorical(standings[inconnus].astype(str), categories=cles).codes
+        indices[inconnus] = codes
+    
+    indices[indices < 0] = len(membres)
+    return indices
+
+
 # ============================================================================
 # TESTS
 # ============================================================================
 
 if __name__ == "__main__":
+    configurer_logs(os.environ.get('DVF_LOG_LEVEL', 'INFO'))
+    
     print("="*60)
     print("🧪 TESTS DU BACKEND PYTHON DVF")
     print("="*60)
@@ -0,0 +1,311 @@
+"""
+Estimateur Immobilier - Caches des données DVF
+- CacheDVF : cache disque des transactions, stockage colonnaire compact
+  (NumPy .npz) avec TTL, éviction LRU et compteurs
+- CacheMemoire : cache LRU borné en mémoire (analyses de marché...)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Clé réservée dans l'archive .npz pour les métadonnées de l'entrée
+_CLE_META = "__meta__"
+
+
+class CacheDVF:
+    """
+    Cache disque des transactions déjà filtrées, indexé par (source, année, code INSEE)
+
+    Chaque entrée est un fichier .npz contenant une colonne par tableau NumPy.
+    L'heure de modification du fichier sert d'horodatage LRU : elle est mise à
+    jour à chaque lecture, et les entrées les moins récemment lues sont évincées
+    dès que la taille totale dépasse `taille_max` octets.
+    """
+
+    def __init__(self, repertoire: str, ttl: float = 7 * 24 * 3600,
+                 taille_max: int = 500 * 1024 * 1024):
+        self.repertoire = repertoire
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self._verrou = threading.Lock()
+        self._compteurs = {
+            'hits': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+            'ecritures': 0,
+        }
+        os.makedirs(repertoire, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+
+    def lire(self, source: str, annee, code_insee: str) -> Optional[pd.DataFrame]:
+        """Retourne le DataFrame en cache, ou None si absent ou expiré"""
+        df, _, frais = self._lire(source, annee, code_insee, garder_perimee=False)
+        return df if frais else None
+
+    def lire_revalidable(self, source: str, annee, code_insee: str
+                         ) -> Tuple[Optional[pd.DataFrame], Dict[str, str], bool]:
+        """
+        Comme `lire`, mais une entrée expirée portant des validateurs HTTP
+        (ETag, Last-Modified) est conservée et retournée afin d'être revalidée
+        par une requête conditionnelle
+
+        Returns:
+            (DataFrame ou None, validateurs HTTP, True si l'entrée est encore fraîche)
+        """
+        return self._lire(source, annee, code_insee, garder_perimee=True)
+
+    def _lire(self, source: str, annee, code_insee: str, garder_perimee: bool):
+        chemin = self._chemin(source, annee, code_insee)
+
+        try:
+            with np.load(chemin, allow_pickle=False) as archive:
+                meta = json.loads(str(archive[_CLE_META]))
+                validateurs = meta.get('validateurs') or {}
+                expire = self.ttl is not None and time.time() - meta['cree_le'] > self.ttl
+                garder = not expire or (garder_perimee and bool(validateurs))
+                df = _colonnes_vers_dataframe(archive, meta) if garder else None
+        except (OSError, ValueError, KeyError):
+            self._incrementer('misses')
+            return None, {}, False
+
+        if expire:
+            if df is None:
+                self._supprimer(chemin)
+            self._incrementer('expirations')
+            self._incrementer('misses')
+            return df, validateurs, False
+
+        # Horodatage LRU
+        try:
+            os.utime(chemin)
+        except OSError:
+            pass
+
+        self._incrementer('hits')
+        return df, validateurs, True
+
+    def ecrire(self, source: str, annee, code_insee: str, df: pd.DataFrame,
+               validateurs: Optional[Dict[str, str]] = None,
+               cree_le: Optional[float] = None) -> None:
+        """
+        Enregistre un DataFrame filtré puis applique le budget en octets
+
+        `validateurs` (ETag, Last-Modified de la réponse) permettent de
+        revalider l'entrée une fois expirée, voir `lire_revalidable`.
+        `cree_le` antidate l'entrée : une entrée dérivée d'autres entrées
+        hérite de la date de la plus ancienne et n'expire pas après elle.
+        """
+        chemin = self._chemin(source, annee, code_insee)
+        colonnes, meta = _dataframe_vers_colonnes(df)
+        if validateurs:
+            meta['validateurs'] = validateurs
+        if cree_le is not None:
+            meta['cree_le'] = cree_le
+        colonnes[_CLE_META] = np.array(json.dumps(meta))
+
+        # Écriture atomique : fichier temporaire puis renommage
+        temporaire = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporaire, 'wb') as f:
+                np.savez(f, **colonnes)
+            os.replace(temporaire, chemin)
+        except OSError:
+            self._supprimer(temporaire)
+            return
+
+        self._incrementer('ecritures')
+        self._appliquer_budget()
+
+    def date_creation(self, source: str, annee, code_insee: str) -> Optional[float]:
+        """Horodatage d'écriture d'une entrée (sans la charger), ou None si absente"""
+        try:
+            with np.load(self._chemin(source, annee, code_insee), allow_pickle=False) as archive:
+                return float(json.loads(str(archive[_CLE_META]))['cree_le'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def invalider(self, source: str, annee, code_insee: str) -> None:
+        """Supprime une entrée du cache"""
+        self._supprimer(self._chemin(source, annee, code_insee))
+
+    def vider(self) -> None:
+        """Supprime toutes les entrées du cache"""
+        for entree in self._entrees():
+            self._supprimer(entree.path)
+
+    def stats(self) -> Dict:
+        """Compteurs d'utilisation et occupation disque du cache"""
+        entrees = self._entrees()
+        with self._verrou:
+            stats = dict(self._compteurs)
+        total = stats['hits'] + stats['misses']
+        stats['taux_hit'] = stats['hits'] / total if total else 0.0
+        stats['entrees'] = len(entrees)
+        stats['octets'] = sum(e.stat().st_size for e in entrees)
+        stats['taille_max'] = self.taille_max
+        return stats
+
+    # ------------------------------------------------------------------
+    # Interne
+    # ------------------------------------------------------------------
+
+    def _chemin(self, source: str, annee, code_insee: str) -> str:
+        cle = f"{source}_{annee if annee is not None else 'latest'}_{code_insee}"
+        cle = re.sub(r'[^0-9A-Za-z_.-]', '_', cle)
+        return os.path.join(self.repertoire, f"{cle}.npz")
+
+    def _entrees(self):
+        try:
+            return [e for e in os.scandir(self.repertoire)
+                    if e.is_file() and e.name.endswith('.npz')]
+        except OSError:
+            return []
+
+    def _appliquer_budget(self) -> None:
+        if self.taille_max is None:
+            return
+
+        entrees = []
+        for e in self._entrees():
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entrees.append((st.st_mtime, st.st_size, e.path))
+
+        total = sum(taille for _, taille, _ in entrees)
+        if total <= self.taille_max:
+            return
+
+        # Évincer les entrées les moins récemment utilisées
+        for _, taille, chemin in sorted(entrees):
+            if total <= self.taille_max:
+                break
+            if self._supprimer(chemin):
+                total -= taille
+                self._incrementer('evictions')
+
+    def _supprimer(self, chemin: str) -> bool:
+        try:
+            os.remove(chemin)
+            return True
+        except OSError:
+            return False
+
+    def _incrementer(self, compteur: str) -> None:
+        with self._verrou:
+            self._compteurs[compteur] += 1
+
+
+class CacheMemoire:
+    """Cache LRU en mémoire, borné en nombre d'entrées, utilisable depuis plusieurs threads"""
+
+    def __init__(self, taille_max: int = 256):
+        self.taille_max = taille_max
+        self._entrees: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._verrou = threading.Lock()
+        self._compteurs = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def lire(self, cle: Hashable) -> Optional[Any]:
+        """Retourne la valeur associée à `cle`, ou None si absente"""
+        with self._verrou:
+            if cle not in self._entrees:
+                self._compteurs['misses'] += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self._compteurs['hits'] += 1
+            return self._entrees[cle]
+
+    def ecrire(self, cle: Hashable, valeur: Any) -> None:
+        """Enregistre une valeur en évinçant les entrées les moins récemment utilisées"""
+        with self._verrou:
+            self._entrees[cle] = valeur
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+                self._compteurs['evictions'] += 1
+
+    def vider(self) -> None:
+        """Supprime toutes les entrées du cache"""
+        with self._verrou:
+            self._entrees.clear()
+
+    def stats(self) -> Dict:
+        """Compteurs d'utilisation du cache"""
+        with self._verrou:
+            stats = dict(self._compteurs)
+            stats['entrees'] = len(self._entrees)
+        total = stats['hits'] + stats['misses']
+        stats['taux_hit'] = stats['hits'] / total if total else 0.0
+        stats['taille_max'] = self.taille_max
+        return stats
+
+
+# ============================================================================
+# SÉRIALISATION COLONNAIRE
+# ============================================================================
+
+def _dataframe_vers_colonnes(df: pd.DataFrame):
+    """Convertit un DataFrame en tableaux NumPy sans objets Python (pas de pickle)"""
+    colonnes = {}
+    types = {}
+
+    for i, nom in enumerate(df.columns):
+        serie = df[nom]
+        cle = f"c{i}"
+
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            colonnes[cle] = serie.cat.codes.to_numpy()
+            colonnes[f"{cle}_categories"] = serie.cat.categories.to_numpy(dtype=str)
+            types[nom] = 'category'
+        elif pd.api.types.is_numeric_dtype(serie.dtype) or pd.api.types.is_datetime64_dtype(serie.dtype):
+            colonnes[cle] = serie.to_numpy()
+            types[nom] = 'natif'
+        else:
+            colonnes[cle] = serie.to_numpy(dtype=str)
+            types[nom] = 'texte'
+
+    meta = {
+        'colonnes': [str(c) for c in df.columns],
+        'types': {str(k): v for k, v in types.items()},
+        'cree_le': time.time(),
+    }
+    return colonnes, meta
+
+
+def _colonnes_vers_dataframe(archive, meta: Dict) -> pd.DataFrame:
+    """Reconstruit le DataFrame à partir d'une archive .npz ouverte"""
+    donnees = {}
+
+    for i, nom in enumerate(meta['colonnes']):
+        cle = f"c{i}"
+        genre = meta['types'][nom]
+
+        if genre == 'category':
+            donnees[nom] = pd.Categorical.from_codes(
+                archive[cle], categories=archive[f"{cle}_categories"]
+            )
+        elif genre == 'texte':
+            donnees[nom] = archive[cle].astype(object)
+        else:
+            donnees[nom] = archive[cle]
+
+    return pd.DataFrame(donnees, columns=meta['colonnes'])
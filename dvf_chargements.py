@@ -0,0 +1,82 @@
+"""
+Estimateur Immobilier - Chargements partagés des analyses de marché
+Analyses par commune chargées en arrière-plan, dédoublonnées (single-flight)
+et conservées avec un TTL ; utilisées par l'interface Streamlit et le service HTTP.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from dvf_backend import analyser_commune_async, donnees_simulees
+
+
+class ChargementsAnalyses:
+    """
+    Analyses de marché chargées en arrière-plan, partagées par tous les appelants
+
+    Les demandes simultanées d'une même commune partagent un seul chargement.
+    Une analyse issue de données réelles, y compris complétées par les
+    communes voisines, est conservée `ttl` secondes par code INSEE ; une
+    analyse dégradée (données simulées, échec) est relancée à la demande
+    suivante.
+    """
+
+    def __init__(self, workers: int = 4, ttl: float = 3600,
+                 delai_hedge: float = 1.0, deadline: Optional[float] = None):
+        self.ttl = ttl
+        self.delai_hedge = delai_hedge
+        self.deadline = deadline
+        self._executeur = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dvf-chargements')
+        self._verrou = threading.Lock()
+        self._chargements: Dict[str, Tuple[float, Future]] = {}
+        self._compteurs = {'lances': 0, 'partages': 0}
+
+    def lancer(self, code_insee: str) -> Future:
+        """Future de (analyse ou None, avertissement) pour la commune"""
+        maintenant = time.monotonic()
+        with self._verrou:
+            entree = self._chargements.get(code_insee)
+            if entree is not None:
+                lance_le, chargement = entree
+                if not chargement.done() or (maintenant - lance_le < self.ttl and _reutilisable(chargement)):
+                    self._compteurs['partages'] += 1
+                    return chargement
+
+            # Purge des chargements expirés avant d'en ajouter un
+            for code, (lance_le, chargement) in list(self._chargements.items()):
+                if chargement.done() and maintenant - lance_le >= self.ttl:
+                    del self._chargements[code]
+
+            chargement = self._executeur.submit(self._charger, code_insee)
+            self._chargements[code_insee] = (maintenant, chargement)
+            self._compteurs['lances'] += 1
+            return chargement
+
+    async def obtenir(self, code_insee: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Variante asynchrone de `lancer` : attend le résultat sans bloquer la boucle"""
+        return await asyncio.wrap_future(self.lancer(code_insee))
+
+    def stats(self) -> Dict:
+        """Chargements lancés, demandes servies par un chargement existant, entrées conservées"""
+        with self._verrou:
+            stats = dict(self._compteurs)
+            stats['entrees'] = len(self._chargements)
+        return stats
+
+    def _charger(self, code_insee: str) -> Tuple[Optional[Dict], Optional[str]]:
+        return asyncio.run(analyser_commune_async(
+            code_insee,
+            delai_hedge=self.delai_hedge,
+            deadline=self.deadline
+        ))
+
+
+def _reutilisable(chargement: Future) -> bool:
+    """Seules les analyses de données réelles (commune ou voisines) sont servies sans nouveau chargement"""
+    if chargement.exception() is not None:
+        return False
+    analyse, warning = chargement.result()
+    return analyse is not None and not donnees_simulees(warning)
@@ -0,0 +1,288 @@
+"""
+Estimateur Immobilier - Moteur de comparables (k plus proches ventes)
+Index des transactions d'une commune par position (grille spatiale), type de
+local, surface, nombre de pièces et date : une estimation retient les k ventes
+récentes les plus semblables dans un rayon, en une fraction de milliseconde
+même pour les communes de plus de 100 000 transactions.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Côté d'une cellule de la grille spatiale (km)
+TAILLE_CELLULE_KM = 0.25
+# Nombre maximal de cellules par côté (la cellule grandit pour les communes étendues)
+CELLULES_MAX_PAR_COTE = 512
+# Rayon de recherche initial, doublé jusqu'à RAYON_MAX_KM faute de comparables (km)
+RAYON_INITIAL_KM = 0.5
+RAYON_MAX_KM = 8.0
+# Écart de surface toléré : rapport maximal entre surfaces comparées
+RAPPORT_SURFACE_MAX = 1.5
+# Ancienneté maximale d'un comparable par rapport à la vente la plus récente (jours)
+ANCIENNETE_MAX_JOURS = 3 * 365
+# Nombre minimal de comparables pour une estimation
+NB_COMPARABLES_MIN = 3
+
+# Échelles de l'écart de chaque critère dans le score de similarité
+_ECHELLE_SURFACE = 0.25   # écart de log(surface)
+_ECHELLE_PIECES = 1.0     # pièces
+_ECHELLE_AGE = 730.0      # jours
+
+# Rapports de surface successifs d'une recherche sans coordonnées
+_RAPPORTS_SURFACE = (1.05, 1.2, RAPPORT_SURFACE_MAX)
+
+_KM_PAR_DEGRE = 111.32
+
+
+class IndexComparables:
+    """
+    Index des transactions d'une commune pour la recherche de comparables
+
+    Les transactions géolocalisées sont rangées par cellule d'une grille
+    régulière (projection équirectangulaire autour du centre de la commune) :
+    les cellules d'une même ligne étant contiguës, une recherche dans un rayon
+    ne lit que quelques tranches de tableaux. Les biens sans coordonnées sont
+    recherchés par type de local et surface (tableaux triés, recherche
+    dichotomique).
+    """
+
+    def __init__(self, df: pd.DataFrame, taille_cellule_km: float = TAILLE_CELLULE_KM):
+        surface = df['surface_reelle_bati'].to_numpy(dtype=float)
+        prix_m2 = df['valeur_fonciere'].to_numpy(dtype=float) / surface
+        jours = df['date_mutation'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+        if 'nombre_pieces_principales' in df.columns:
+            pieces = pd.to_numeric(df['nombre_pieces_principales'], errors='coerce').to_numpy(dtype=float)
+        else:
+            pieces = np.full(len(df), np.nan)
+
+        # Type de local codé (-1 si inconnu)
+        if 'type_local' in df.columns:
+            types = pd.Categorical(df['type_local'])
+            self.types = [str(t) for t in types.categories]
+            code_type = types.codes.astype(np.int8)
+        else:
+            self.types = []
+            code_type = np.full(len(df), -1, dtype=np.int8)
+
+        self.nb_transactions = len(df)
+        self.jour_reference = int(jours.max()) if len(jours) else 0
+
+        # Index attributaire : tri par (type, surface)
+        ordre = np.lexsort((surface, code_type))
+        self._attributs = {
+            'surface': surface[ordre], 'pieces': pieces[ordre], 'type': code_type[ordre],
+            'jours': jours[ordre], 'prix_m2': prix_m2[ordre],
+        }
+
+        # Index spatial : grille sur les transactions géolocalisées
+        self.spatial = False
+        if {'latitude', 'longitude'} <= set(df.columns):
+            lat = pd.to_numeric(df['latitude'], errors='coerce').to_numpy(dtype=float)
+            lon = pd.to_numeric(df['longitude'], errors='coerce').to_numpy(dtype=float)
+            localise = np.isfinite(lat) & np.isfinite(lon)
+            if localise.any():
+                self._construire_grille(lat, lon, localise, surface, pieces, code_type,
+                                        jours, prix_m2, taille_cellule_km)
+
+    def _construire_grille(self, lat, lon, localise, surface, pieces, code_type,
+                           jours, prix_m2, taille_cellule_km) -> None:
+        self.lat0 = float(np.median(lat[localise]))
+        self.lon0 = float(np.median(lon[localise]))
+        self._km_par_degre_lon = _KM_PAR_DEGRE * math.cos(math.radians(self.lat0))
+
+        x, y = self._projeter(lat[localise], lon[localise])
+        self.x_min, self.y_min = float(x.min()), float(y.min())
+        etendue = max(float(x.max()) - self.x_min, float(y.max()) - self.y_min)
+        self.taille_cellule = max(taille_cellule_km, etendue / CELLULES_MAX_PAR_COTE)
+        self.nx = int(etendue / self.taille_cellule) + 1
+
+        ix = ((x - self.x_min) / self.taille_cellule).astype(np.int64)
+        iy = ((y - self.y_min) / self.taille_cellule).astype(np.int64)
+        cellule = iy * self.nx + ix
+        ordre = np.argsort(cellule, kind='stable')
+
+        # Début de chaque cellule dans les tableaux triés (format CSR)
+        self._debuts = np.searchsorted(cellule[ordre], np.arange(self.nx * self.nx + 1))
+        self._grille = {
+            'x': x[ordre], 'y': y[ordre],
+            'surface': surface[localise][ordre], 'pieces': pieces[localise][ordre],
+            'type': code_type[localise][ordre], 'jours': jours[localise][ordre],
+            'prix_m2': prix_m2[localise][ordre],
+        }
+        self.spatial = True
+
+    def _projeter(self, lat, lon):
+        """Coordonnées planes (km) autour du centre de la commune"""
+        return ((np.asarray(lon) - self.lon0) * self._km_par_degre_lon,
+                (np.asarray(lat) - self.lat0) * _KM_PAR_DEGRE)
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def rechercher(self, surface: float, pieces: Optional[int] = None,
+                   type_local: Optional[str] = None, latitude: Optional[float] = None,
+                   longitude: Optional[float] = None, k: int = 10,
+                   rayon_km: float = RAYON_INITIAL_KM,
+                   anciennete_max_jours: int = ANCIENNETE_MAX_JOURS) -> Dict[str, np.ndarray]:
+        """
+        Les k transactions les plus semblables au bien décrit
+
+        Avec des coordonnées (et un index spatial), la recherche se limite au
+        rayon `rayon_km`, doublé jusqu'à RAYON_MAX_KM tant que moins de k
+        comparables sont trouvés ; sans coordonnées, elle porte sur toute la
+        commune, en élargissant de même la plage de surface. Seuls les biens du
+        même type (si connu), de surface comparable (rapport <= RAPPORT_SURFACE_MAX)
+        et vendus depuis moins de `anciennete_max_jours` sont retenus.
+
+        Returns:
+            Colonnes NumPy triées par similarité (pd.DataFrame(...) pour un tableau) :
+            prix_m2, surface, pieces, type_local, date_mutation, distance_km
+            (NaN sans coordonnées) et score (0 = identique)
+        """
+        code_type = self.types.index(type_local) if type_local in self.types else -1
+
+        if self.spatial and latitude is not None and longitude is not None:
+            x, y = self._projeter(latitude, longitude)
+            rayon = rayon_km
+            while True:
+                candidats = self._candidats_rayon(float(x), float(y), rayon)
+                selection = self._selectionner(candidats, surface, pieces, code_type, k,
+                                               anciennete_max_jours, (float(x), float(y), rayon))
+                if len(selection['prix_m2']) >= k or rayon >= RAYON_MAX_KM:
+                    break
+                rayon = min(2 * rayon, RAYON_MAX_KM)
+        else:
+            for rapport in _RAPPORTS_SURFACE:
+                candidats = self._candidats_attributs(surface, code_type, rapport)
+                selection = self._selectionner(candidats, surface, pieces, code_type, k,
+                                               anciennete_max_jours, None)
+                if len(selection['prix_m2']) >= k:
+                    break
+
+        types = np.array(self.types + [None], dtype=object)
+        return {
+            'prix_m2': selection['prix_m2'],
+            'surface': selection['surface'],
+            'pieces': selection['pieces'],
+            'type_local': types[selection['type']],
+            'date_mutation': selection['jours'].astype('datetime64[D]'),
+            'distance_km': selection['distance_km'],
+            'score': selection['score'],
+        }
+
+    def _candidats_rayon(self, x: float, y: float, rayon: float) -> Dict[str, np.ndarray]:
+        """Transactions des cellules recouvrant le carré de côté 2 × rayon"""
+        ix0, ix1, iy0, iy1 = (
+            int((v - origine) // self.taille_cellule)
+            for v, origine in ((x - rayon, self.x_min), (x + rayon, self.x_min),
+                               (y - rayon, self.y_min), (y + rayon, self.y_min))
+        )
+        ix0, iy0 = max(ix0, 0), max(iy0, 0)
+        ix1, iy1 = min(ix1, self.nx - 1), min(iy1, self.nx - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return {nom: tableau[:0] for nom, tableau in self._grille.items()}
+
+        # Une tranche contiguë par ligne de cellules
+        lignes = np.arange(iy0, iy1 + 1) * self.nx
+        debuts = self._debuts[lignes + ix0]
+        fins = self._debuts[lignes + ix1 + 1]
+        if len(lignes) == 1:
+            indices = slice(int(debuts[0]), int(fins[0]))
+        else:
+            indices = np.concatenate([np.arange(d, f) for d, f in zip(debuts, fins)])
+        return {nom: tableau[indices] for nom, tableau in self._grille.items()}
+
+    def _candidats_attributs(self, surface: float, code_type: int, rapport: float) -> Dict[str, np.ndarray]:
+        """Transactions du type demandé (tous types si inconnu) de surface à un `rapport` près"""
+        attributs = self._attributs
+        codes = [code_type] if code_type >= 0 else range(-1, len(self.types))
+
+        # Une tranche (type, surface) contiguë par type de local
+        tranches = []
+        for code in codes:
+            debut, fin = np.searchsorted(attributs['type'], [code, code + 1])
+            surfaces = attributs['surface'][debut:fin]
+            bas = np.searchsorted(surfaces, surface / rapport, side='left')
+            haut = np.searchsorted(surfaces, surface * rapport, side='right')
+            tranches.append((debut + bas, debut + haut))
+
+        if len(tranches) == 1:
+            indices = slice(int(tranches[0][0]), int(tranches[0][1]))
+        else:
+            indices = np.concatenate([np.arange(d, f) for d, f in tranches])
+        return {nom: tableau[indices] for nom, tableau in attributs.items()}
+
+    def _selectionner(self, candidats: Dict[str, np.ndarray], surface: float, pieces: Optional[int],
+                      code_type: int, k: int, anciennete_max_jours: int, cercle) -> Dict[str, np.ndarray]:
+        """Filtre les candidats puis retient les k meilleurs scores (sans tri complet)"""
+        ecart_surface = np.log(candidats['surface'] / surface)
+        garder = ((np.abs(ecart_surface) <= math.log(RAPPORT_SURFACE_MAX))
+                  & (candidats['jours'] >= self.jour_reference - anciennete_max_jours))
+        if code_type >= 0:
+            garder &= candidats['type'] == code_type
+        if cercle is not None:
+            x, y, rayon = cercle
+            distance = np.hypot(candidats['x'] - x, candidats['y'] - y)
+            garder &= distance <= rayon
+
+        # Score calculé sur les seuls candidats retenus
+        indices = np.flatnonzero(garder)
+        age = self.jour_reference - candidats['jours'][indices]
+        score = (ecart_surface[indices] / _ECHELLE_SURFACE) ** 2 + (age / _ECHELLE_AGE) ** 2
+        if pieces is not None:
+            # Nombre de pièces inconnu : pénalité d'un écart d'une pièce
+            ecart_pieces = np.nan_to_num(candidats['pieces'][indices] - pieces, nan=_ECHELLE_PIECES)
+            score += (ecart_pieces / _ECHELLE_PIECES) ** 2
+        if cercle is not None:
+            distance = distance[indices]
+            score += (distance / rayon) ** 2
+        else:
+            distance = np.full(len(indices), np.nan)
+
+        if len(indices) > k:
+            meilleurs = np.argpartition(score, k - 1)[:k]
+            indices, score, distance = indices[meilleurs], score[meilleurs], distance[meilleurs]
+        ordre = np.argsort(score, kind='stable')
+        indices, score, distance = indices[ordre], score[ordre], distance[ordre]
+
+        selection = {nom: candidats[nom][indices] for nom in ('prix_m2', 'surface', 'pieces', 'type', 'jours')}
+        selection['distance_km'] = distance
+        selection['score'] = score
+        return selection
+
+
+# ============================================================================
+# ESTIMATION
+# ============================================================================
+
+def prix_comparables(comparables: Dict[str, np.ndarray]) -> Optional[Dict]:
+    """
+    Prix au m² déduit des comparables : médiane et quartiles pondérés par la similarité
+
+    Retourne None s'il y a moins de NB_COMPARABLES_MIN comparables.
+    """
+    prix = comparables['prix_m2']
+    if len(prix) < NB_COMPARABLES_MIN:
+        return None
+
+    poids = 1.0 / (1.0 + comparables['score'])
+    bas, mediane, haut = _quantiles_ponderes(prix, poids, (0.25, 0.5, 0.75))
+    return {'prix_m2': mediane, 'prix_m2_bas': bas, 'prix_m2_haut': haut}
+
+
+def _quantiles_ponderes(valeurs: np.ndarray, poids: np.ndarray, quantiles) -> np.ndarray:
+    ordre = np.argsort(valeurs)
+    cumul = np.cumsum(poids[ordre])
+    positions = np.searchsorted(cumul, np.asarray(quantiles) * cumul[-1])
+    return valeurs[ordre][np.minimum(positions, len(valeurs) - 1)]
@@ -0,0 +1,41 @@
+"""
+Estimateur Immobilier - Imports différés
+Les modules lourds (pandas, numpy...) ne sont importés qu'au premier attribut
+lu : `import dvf_backend` reste rapide pour les outils en ligne de commande et
+les processus de courte durée, et une estimation depuis la table précalculée
+n'importe jamais pandas.
+
+Usage, dans un module dont les annotations sont différées
+(`from __future__ import annotations`) :
+
+    pd = ModuleDiffere('pandas', __name__, 'pd')
+"""
+
+import importlib
+import sys
+
+
+class ModuleDiffere:
+    """
+    Mandataire d'un module importé au premier accès à l'un de ses attributs
+
+    Une fois le module importé, le mandataire est remplacé par le module dans
+    les globales du module appelant : les accès suivants sont directs.
+    """
+
+    __slots__ = ('_nom', '_appelant', '_alias')
+
+    def __init__(self, nom: str, appelant: str, alias: str):
+        self._nom = nom
+        self._appelant = appelant
+        self._alias = alias
+
+    def __getattr__(self, attribut: str):
+        module = importlib.import_module(self._nom)
+        globales = vars(sys.modules[self._appelant])
+        if globales.get(self._alias) is self:
+            globales[self._alias] = module
+        return getattr(module, attribut)
+
+    def __repr__(self) -> str:
+        return f"<module différé {self._nom!r}>"
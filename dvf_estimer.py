@@ -0,0 +1,263 @@
+"""
+Estimateur Immobilier - Estimation en lot en ligne de commande
+Lit des biens en CSV ou JSONL (fichier ou entrée standard) par blocs de taille
+bornée, les estime avec `estimer_lot` et écrit les résultats au fil de l'eau,
+dans l'ordre d'entrée. L'analyse de chaque commune est conservée d'un bloc à
+l'autre ; avec --workers N, les communes sont réparties entre N processus
+(toujours le même pour une commune), qui ne l'analysent donc qu'une fois.
+
+Colonnes attendues : code_insee, surface, et facultativement pieces et
+standing ("Standard" par défaut). Les colonnes d'entrée sont recopiées,
+suivies de valeur_estimee, fourchette_basse, fourchette_haute, prix_moyen_m2,
+coefficient, tendance, nb_transactions et avertissement.
+
+Usage :
+    python dvf_estimer.py biens.csv --sortie estimations.csv
+    cat biens.jsonl | python dvf_estimer.py - --format jsonl > estimations.jsonl
+    python dvf_estimer.py biens.csv --workers 4 --hors-ligne --store ./store_dvf
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+
+import dvf_backend as backend
+
+
+# Biens lus, estimés et écrits à la fois
+TAILLE_BLOC = 50_000
+# Récupérations de communes simultanées dans chaque processus
+THREADS_RECUPERATION = 8
+# Blocs en cours de traitement par processus (borne la mémoire)
+BLOCS_EN_VOL_PAR_WORKER = 2
+
+COLONNES_OBLIGATOIRES = ('code_insee', 'surface')
+FORMATS = ('csv', 'jsonl')
+
+
+# ============================================================================
+# ESTIMATION D'UN BLOC (PROCESSUS WORKER)
+# ============================================================================
+
+# Analyses des communes déjà rencontrées par ce processus, réduites aux champs
+# utiles à `estimer_lot` : {code_insee: (analyse ou None, avertissement)}
+_analyses: Dict[str, Tuple[Optional[Dict], Optional[str]]] = {}
+_threads = THREADS_RECUPERATION
+
+
+def initialiser_worker(options: Dict) -> None:
+    """Configuration du backend dans un processus worker (voir `configurer_backend`)"""
+    configurer_backend(**options)
+
+
+def configurer_backend(store: Optional[str] = None, table: Optional[str] = None,
+                       hors_ligne: bool = False, threads: int = THREADS_RECUPERATION) -> None:
+    """Store local, table précalculée, mode hors ligne et threads de récupération"""
+    global _threads
+    if store:
+        backend.configurer_store(store)
+    if table:
+        backend.configurer_table_stats(table)
+    if hors_ligne:
+        backend.configurer_hors_ligne(True)
+    _threads = threads
+
+
+def estimer_bloc(biens: pd.DataFrame) -> pd.DataFrame:
+    """Estime un bloc ; seules les communes jamais rencontrées sont analysées"""
+    nouvelles = [code for code in biens['code_insee'].unique() if code not in _analyses]
+    if nouvelles:
+        for code, (analyse, warning) in backend.analyser_communes(nouvelles, _threads).items():
+            _analyses[code] = (None if analyse is None else _resumer(analyse), warning)
+
+    codes = biens['code_insee'].unique()
+    return backend.estimer_lot(
+        biens, analyses_connues={code: _analyses[code] for code in codes}
+    ).vers_dataframe()
+
+
+def _resumer(analyse: Dict) -> Dict:
+    """Champs de l'analyse lus par `estimer_lot` (ni évolution ni DataFrame conservés)"""
+    return {
+        'prix_moyen_m2': analyse['prix_moyen_m2'],
+        'stats': {'nb_transactions': analyse['stats']['nb_transactions']},
+        'tendance': backend._tendance_analyse(analyse),
+        'intervalle': analyse.get('intervalle'),
+        'dispersion': analyse.get('dispersion'),
+    }
+
+
+# ============================================================================
+# LECTURE ET ÉCRITURE EN FLUX
+# ============================================================================
+
+def lire_blocs(entree: TextIO, format_entree: str, taille_bloc: int) -> Iterator[pd.DataFrame]:
+    """Blocs de `taille_bloc` biens au plus, code_insee normalisé sur 5 caractères"""
+    if format_entree == 'jsonl':
+        lecteur = pd.read_json(entree, lines=True, chunksize=taille_bloc, dtype={'code_insee': str})
+    else:
+        lecteur = pd.read_csv(entree, chunksize=taille_bloc, dtype={'code_insee': str})
+
+    with lecteur:
+        for bloc in lecteur:
+            manquantes = [c for c in COLONNES_OBLIGATOIRES if c not in bloc.columns]
+            if manquantes:
+                raise ValueError(f"Colonnes manquantes : {', '.join(manquantes)}")
+            if 'standing' not in bloc.columns:
+                bloc['standing'] = backend.Standing.STANDARD.value
+            if 'pieces' not in bloc.columns:
+                bloc['pieces'] = 1
+            bloc['code_insee'] = bloc['code_insee'].astype(str).str.strip().str.zfill(5)
+            bloc['surface'] = pd.to_numeric(bloc['surface'], errors='coerce')
+            yield bloc
+
+
+def ecrire_bloc(sortie: TextIO, bloc: pd.DataFrame, format_sortie: str, premier: bool) -> None:
+    if format_sortie == 'jsonl':
+        texte = bloc.to_json(orient='records', lines=True, force_ascii=False)
+        sortie.write(texte if texte.endswith('\n') else texte + '\n')
+    else:
+        bloc.to_csv(sortie, index=False, header=premier)
+    sortie.flush()
+
+
+# ============================================================================
+# ORCHESTRATION
+# ============================================================================
+
+def estimer_flux(entree: TextIO, sortie: TextIO, format_entree: str = 'csv',
+                 format_sortie: Optional[str] = None, taille_bloc: int = TAILLE_BLOC,
+                 workers: int = 1, options: Optional[Dict] = None) -> Dict:
+    """
+    Estime tous les biens de `entree` et écrit les résultats dans `sortie`
+
+    Au plus workers × BLOCS_EN_VOL_PAR_WORKER blocs sont en mémoire : la
+    lecture du bloc suivant recouvre l'estimation des précédents.
+
+    Returns:
+        Résumé : biens, biens estimés, communes, blocs, durée et débit
+    """
+    format_sortie = format_sortie or format_entree
+    options = options or {}
+    debut = time.perf_counter()
+    resume = {'biens': 0, 'estimes': 0, 'communes': 0, 'blocs': 0}
+    communes = set()
+
+    executeurs: List[ProcessPoolExecutor] = []
+    if workers > 1:
+        # Un processus par partition de communes : chacune n'est analysée qu'une fois
+        executeurs = [
+            ProcessPoolExecutor(max_workers=1, initializer=initialiser_worker, initargs=(options,))
+            for _ in range(workers)
+        ]
+    else:
+        configurer_backend(**options)
+
+    en_vol = deque()
+    limite_en_vol = workers * BLOCS_EN_VOL_PAR_WORKER if executeurs else 1
+
+    def terminer_plus_ancien() -> None:
+        bloc, futures = en_vol.popleft()
+        if futures is None:
+            resultats = estimer_bloc(bloc)
+        else:
+            resultats = pd.concat([future.result() for future in futures]).loc[bloc.index]
+        ecrire_bloc(sortie, pd.concat([bloc, resultats], axis=1), format_sortie, resume['blocs'] == 0)
+        resume['blocs'] += 1
+        resume['biens'] += len(bloc)
+        resume['estimes'] += int(resultats['valeur_estimee'].notna().sum())
+
+    try:
+        for bloc in lire_blocs(entree, format_entree, taille_bloc):
+            communes.update(bloc['code_insee'].unique())
+            if executeurs:
+                parties = _partitionner(bloc, workers)
+                futures = [executeurs[i].submit(estimer_bloc, partie) for i, partie in parties]
+                en_vol.append((bloc, futures))
+            else:
+                en_vol.append((bloc, None))
+
+            while len(en_vol) >= limite_en_vol:
+                terminer_plus_ancien()
+
+        while en_vol:
+            terminer_plus_ancien()
+    finally:
+        for executeur in executeurs:
+            executeur.shutdown(cancel_futures=True)
+
+    duree = time.perf_counter() - debut
+    resume.update(
+        communes=len(communes),
+        duree_s=round(duree, 3),
+        biens_par_s=round(resume['biens'] / duree, 1) if duree > 0 else 0.0,
+    )
+    return resume
+
+
+def _partitionner(bloc: pd.DataFrame, nb_parties: int) -> List[Tuple[int, pd.DataFrame]]:
+    """Parties non vides du bloc par hachage stable du code INSEE : [(partie, biens)]"""
+    codes, communes = pd.factorize(bloc['code_insee'])
+    parties_communes = np.array([zlib.crc32(c.encode()) % nb_parties for c in communes], dtype=np.int64)
+    parties = parties_communes[codes]
+    return [(i, bloc[parties == i]) for i in range(nb_parties) if (parties == i).any()]
+
+
+def _format(chemin: str, format_explicite: Optional[str]) -> str:
+    if format_explicite:
+        return format_explicite
+    return 'jsonl' if chemin.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimation en lot de biens immobiliers (CSV / JSONL)")
+    parser.add_argument('entree', nargs='?', default='-', help="Fichier de biens ('-' : entrée standard)")
+    parser.add_argument('--sortie', default='-', help="Fichier de résultats ('-' : sortie standard)")
+    parser.add_argument('--format', choices=FORMATS, help="Format d'entrée (défaut : extension, sinon csv)")
+    parser.add_argument('--format-sortie', choices=FORMATS, help="Format de sortie (défaut : celui d'entrée)")
+    parser.add_argument('--bloc', type=int, default=TAILLE_BLOC, help="Biens lus et estimés à la fois")
+    parser.add_argument('--workers', type=int, default=1, help="Processus d'estimation")
+    parser.add_argument('--threads', type=int, default=THREADS_RECUPERATION,
+                        help="Récupérations simultanées par processus")
+    parser.add_argument('--hors-ligne', '--offline', action='store_true',
+                        help="Aucune requête HTTP (store local, table, cache disque)")
+    parser.add_argument('--store', help="Store local produit par dvf_store.py")
+    parser.add_argument('--table', help="Table précalculée produite par dvf_stats_communes.py")
+    args = parser.parse_args()
+
+    backend.configurer_logs(os.environ.get('DVF_LOG_LEVEL', 'ERROR'))
+    format_entree = _format(args.entree, args.format)
+    format_sortie = args.format_sortie or (format_entree if args.sortie == '-' else _format(args.sortie, None))
+    options = {'store': args.store, 'table': args.table, 'hors_ligne': args.hors_ligne,
+               'threads': args.threads}
+
+    entree = sys.stdin if args.entree == '-' else open(args.entree, encoding='utf-8', newline='')
+    sortie = sys.stdout if args.sortie == '-' else open(args.sortie, 'w', encoding='utf-8', newline='')
+    try:
+        resume = estimer_flux(entree, sortie, format_entree, format_sortie, args.bloc,
+                              args.workers, options)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        if entree is not sys.stdin:
+            entree.close()
+        if sortie is not sys.stdout:
+            sortie.close()
+
+    # Résumé sur la sortie d'erreur : la sortie standard peut porter les résultats
+    print(f"✅ {resume['biens']:_} biens ({resume['estimes']:_} estimés), {resume['communes']:_} communes, "
+          f"{resume['blocs']} bloc(s) en {resume['duree_s']} s : {resume['biens_par_s']:_.0f} biens/s"
+          .replace('_', ' '), file=sys.stderr)
@@ -0,0 +1,225 @@
+"""
+Estimateur Immobilier - Couche HTTP partagée
+Session poolée (keep-alive), relances avec backoff sur 429/5xx et limitation
+de débit par hôte, utilisables depuis plusieurs threads. La session peut
+enregistrer ou rejouer les réponses des sources (voir dvf_rejeu).
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+
+# Codes HTTP donnant lieu à une nouvelle tentative
+STATUTS_A_RELANCER = (429, 500, 502, 503, 504)
+
+# Débit maximal par hôte ($DVF_REQUETES_PAR_SECONDE, 0 = illimité). Il est
+# partagé par tous les millésimes et toutes les communes récupérés en
+# parallèle : pour une récupération en masse (workers > 1), le relever ou
+# le lever selon ce que la source tolère.
+REQUETES_PAR_SECONDE = 10.0
+
+
+class EchecNonRelancable(requests.exceptions.ConnectionError):
+    """Échec d'envoi qu'une nouvelle tentative ne corrigerait pas (réponse absente d'une archive)"""
+
+
+class LimiteurDebit:
+    """Seau à jetons par hôte : au plus `requetes_par_seconde` en régime établi"""
+
+    def __init__(self, requetes_par_seconde: float, rafale: Optional[int] = None):
+        self.requetes_par_seconde = requetes_par_seconde
+        self.rafale = rafale if rafale is not None else max(1, int(requetes_par_seconde))
+        self._seaux: Dict[str, list] = {}
+        self._verrou = threading.Lock()
+
+    def attendre(self, hote: str) -> None:
+        """Bloque jusqu'à ce qu'un jeton soit disponible pour `hote`"""
+        while True:
+            with self._verrou:
+                maintenant = time.monotonic()
+                jetons, dernier = self._seaux.get(hote, (self.rafale, maintenant))
+                jetons = min(self.rafale, jetons + (maintenant - dernier) * self.requetes_par_seconde)
+                if jetons >= 1:
+                    self._seaux[hote] = [jetons - 1, maintenant]
+                    return
+                self._seaux[hote] = [jetons, maintenant]
+                attente = (1 - jetons) / self.requetes_par_seconde
+            time.sleep(attente)
+
+
+class _AdaptateurLimite(HTTPAdapter):
+    """
+    Adaptateur HTTP qui consulte le limiteur de débit avant chaque tentative
+
+    Les relances (`max_retries` : erreurs réseau, 429, 5xx) sont faites ici
+    et non dans urllib3, afin que chaque nouvelle tentative prenne elle aussi
+    un jeton du limiteur.
+    """
+
+    def __init__(self, limiteur: Optional[LimiteurDebit] = None, max_retries=0, **kwargs):
+        self.limiteur = limiteur
+        super().__init__(max_retries=0, **kwargs)
+        self.relances = Retry.from_int(max_retries)
+
+    def send(self, request, **kwargs):
+        relances = self.relances
+        while True:
+            if self.limiteur is not None:
+                self.limiteur.attendre(urlsplit(request.url).netloc)
+            try:
+                reponse = self._tentative(request, **kwargs)
+            except EchecNonRelancable:
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as erreur:
+                if not relances._is_method_retryable(request.method):
+                    raise
+                try:
+                    relances = relances.increment(request.method, request.url, error=erreur)
+                except MaxRetryError:
+                    raise erreur
+                relances.sleep()
+                continue
+
+            if not relances.is_retry(request.method, reponse.status_code, 'Retry-After' in reponse.headers):
+                return reponse
+            try:
+                relances = relances.increment(request.method, request.url, response=reponse.raw)
+            except MaxRetryError:
+                if relances.raise_on_status:
+                    raise requests.exceptions.RetryError(f"Relances épuisées : {request.url}", request=request)
+                return reponse
+            relances.sleep(reponse.raw)
+            reponse.close()
+
+    def _tentative(self, request, **kwargs) -> requests.Response:
+        """Un envoi, sans relance"""
+        return super().send(request, **kwargs)
+
+
+# ============================================================================
+# SESSION PARTAGÉE
+# ============================================================================
+
+_session: Optional[requests.Session] = None
+_verrou_session = threading.Lock()
+_parametres_session: Dict = {}
+
+
+def configurer_session(taille_pool: int = 16, requetes_par_seconde: Optional[float] = REQUETES_PAR_SECONDE,
+                       relances: int = 3, backoff: float = 0.5) -> requests.Session:
+    """
+    (Re)crée la session HTTP partagée par toutes les récupérations
+
+    Args:
+        taille_pool: Connexions conservées par hôte (au moins le nombre de workers)
+        requetes_par_seconde: Débit maximal par hôte, relances comprises (None = illimité),
+            partagé par tous les threads
+        relances: Nombre de nouvelles tentatives sur erreur réseau, 429 et 5xx
+        backoff: Facteur de backoff exponentiel entre tentatives (secondes)
+
+    Si un mode d'enregistrement ou de rejeu est actif (`configurer_rejeu`),
+    la session passe par l'archive de réponses correspondante.
+    """
+    global _session, _parametres_session
+    _parametres_session = {'taille_pool': taille_pool, 'requetes_par_seconde': requetes_par_seconde,
+                           'relances': relances, 'backoff': backoff}
+
+    retry = Retry(
+        total=relances,
+        backoff_factor=backoff,
+        status_forcelist=STATUTS_A_RELANCER,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    limiteur = LimiteurDebit(requetes_par_seconde) if requetes_par_seconde else None
+    options = {'pool_connections': taille_pool, 'pool_maxsize': taille_pool, 'max_retries': retry}
+    rejeu = obtenir_rejeu()
+    if rejeu is None:
+        adaptateur = _AdaptateurLimite(limiteur, **options)
+    else:
+        from dvf_rejeu import creer_adaptateur
+        adaptateur = creer_adaptateur(rejeu, limiteur, **options)
+
+    session = requests.Session()
+    session.mount('http://', adaptateur)
+    session.mount('https://', adaptateur)
+
+    # L'ancienne session n'est pas fermée : des requêtes peuvent encore l'utiliser
+    with _verrou_session:
+        _session = session
+    return session
+
+
+def obtenir_session() -> requests.Session:
+    """
+    Retourne la session partagée, créée au premier appel avec la
+    configuration par défaut ($DVF_REQUETES_PAR_SECONDE pour le débit)
+    """
+    session = _session
+    if session is None:
+        with _verrou_session:
+            session = _session
+        if session is None:
+            debit = float(os.environ.get('DVF_REQUETES_PAR_SECONDE', REQUETES_PAR_SECONDE))
+            session = configurer_session(requetes_par_seconde=debit or None)
+    return session
+
+
+# ============================================================================
+# ENREGISTREMENT ET REJEU DES RÉPONSES
+# ============================================================================
+
+MODES_REJEU = ('enregistrer', 'rejouer')
+
+_rejeu: Optional[Dict] = None
+_rejeu_configure = False
+
+
+def configurer_rejeu(archive: Optional[str], mode: str = 'rejouer', latence: float = 0.0,
+                     taux_erreur: float = 0.0, graine: int = 0) -> Optional[Dict]:
+    """
+    Enregistre ou rejoue les réponses HTTP des sources DVF (voir dvf_rejeu)
+
+    La session partagée est recréée (mêmes paramètres) avec le transport choisi.
+
+    Args:
+        archive: Répertoire de l'archive de réponses (None pour revenir au réseau)
+        mode: 'enregistrer' (réseau, réponses archivées) ou 'rejouer' (archive seule)
+        latence: Latence injectée par tentative en rejeu (secondes)
+        taux_erreur: Part des tentatives rejouées répondant 429/503
+        graine: Graine du tirage des erreurs injectées
+    """
+    _definir_rejeu(archive, mode, latence, taux_erreur, graine)
+    configurer_session(**_parametres_session)
+    return _rejeu
+
+
+def obtenir_rejeu() -> Optional[Dict]:
+    """Mode actif ($DVF_REJEU, $DVF_REJEU_MODE, $DVF_REJEU_LATENCE, $DVF_REJEU_TAUX_ERREUR), None sinon"""
+    if not _rejeu_configure:
+        _definir_rejeu(os.environ.get('DVF_REJEU'), os.environ.get('DVF_REJEU_MODE', 'rejouer'),
+                       float(os.environ.get('DVF_REJEU_LATENCE', 0)),
+                       float(os.environ.get('DVF_REJEU_TAUX_ERREUR', 0)))
+    return _rejeu
+
+
+def _definir_rejeu(archive: Optional[str], mode: str, latence: float, taux_erreur: float,
+                   graine: int = 0) -> None:
+    global _rejeu, _rejeu_configure
+    if mode not in MODES_REJEU:
+        raise ValueError(f"Mode de rejeu inconnu : {mode} (attendu : {', '.join(MODES_REJEU)})")
+    if not 0 <= taux_erreur <= 1:
+        raise ValueError(f"Taux d'erreur hors de [0, 1] : {taux_erreur}")
+    _rejeu = None if not archive else {
+        'archive': archive, 'mode': mode, 'latence': latence, 'taux_erreur': taux_erreur, 'graine': graine,
+    }
+    _rejeu_configure = True
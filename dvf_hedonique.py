@@ -0,0 +1,386 @@
+"""
+Estimateur Immobilier - Modèle hédonique par département
+Régression de log(prix au m²) sur la surface, le nombre de pièces, le type de
+local, l'année de vente et un effet fixe par commune, ajustée séparément pour
+chaque département par moindres carrés en une seule passe sur les fichiers DVF
+(statistiques suffisantes accumulées bloc par bloc). Les coefficients sont
+enregistrés dans une table compacte ; la prédiction d'un lot de biens se fait
+en une multiplication matricielle.
+
+Usage :
+    python dvf_hedonique.py --sortie modele_hedonique.npz full_2022.csv.gz full_2023.csv.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Version du format de la table des coefficients
+VERSION_MODELE = 1
+
+# Années couvertes par les effets fixes annuels (DVF commence en 2014)
+ANNEES_MODELE = tuple(range(2014, 2031))
+
+# Types de local distingués (le premier sert de référence)
+TYPES_MODELE = ('Appartement', 'Maison')
+
+# Bornes de plausibilité appliquées avant l'ajustement (les quantiles par
+# commune ne sont pas calculables en une passe)
+PRIX_M2_MIN, PRIX_M2_MAX = 300.0, 30_000.0
+SURFACE_MIN, SURFACE_MAX = 9.0, 1_000.0
+
+# Transactions minimales pour ajuster un département
+NB_MIN_DEPARTEMENT = 50
+
+# Variables explicatives (hors effet fixe commune), dans l'ordre des coefficients
+VARIABLES = (
+    'log_surface', 'pieces', 'pieces_inconnues',
+    *(f"type_{t}" for t in TYPES_MODELE[1:]),
+    *(f"annee_{a}" for a in ANNEES_MODELE),
+)
+
+# Fractile 75% de la loi normale (fourchette interquartile)
+_Z_QUARTILE = 0.6744897501960817
+
+
+def matrice_variables(surface: np.ndarray, pieces: np.ndarray, type_local: Sequence,
+                      annees: np.ndarray) -> np.ndarray:
+    """
+    Matrice des variables explicatives (n × len(VARIABLES)), en float64
+
+    Un nombre de pièces manquant (NaN) vaut 0 avec l'indicateur `pieces_inconnues` ;
+    un type non renseigné et les années hors ANNEES_MODELE n'activent aucune
+    colonne (type de référence). Les types renseignés hors TYPES_MODELE sont
+    à écarter au préalable, voir `types_inconnus`.
+    """
+    n = len(surface)
+    pieces = np.asarray(pieces, dtype=float)
+    inconnues = np.isnan(pieces)
+
+    x = np.zeros((n, len(VARIABLES)))
+    x[:, 0] = np.log(np.asarray(surface, dtype=float))
+    x[:, 1] = np.where(inconnues, 0.0, pieces)
+    x[:, 2] = inconnues
+
+    # Position de chaque libellé dans TYPES_MODELE (-1 : hors modèle ou non renseigné)
+    libelles = pd.Categorical(type_local)
+    types = np.append(pd.Index(TYPES_MODELE).get_indexer(libelles.categories), -1)[libelles.codes]
+    for i in range(1, len(TYPES_MODELE)):
+        x[:, 2 + i] = types == i
+
+    colonne_annee = np.asarray(annees, dtype=np.int64) - ANNEES_MODELE[0]
+    valide = (colonne_annee >= 0) & (colonne_annee < len(ANNEES_MODELE))
+    lignes = np.flatnonzero(valide)
+    x[lignes, 2 + len(TYPES_MODELE) + colonne_annee[valide]] = 1.0
+    return x
+
+
+def types_inconnus(type_local: Sequence) -> np.ndarray:
+    """Masque des types de local renseignés mais absents de TYPES_MODELE"""
+    types = pd.Categorical(type_local)
+    # Code -1 (non renseigné) : dernier élément ajouté, jamais inconnu
+    inconnues = np.append(~np.isin(np.asarray(types.categories, dtype=object), TYPES_MODELE), False)
+    return inconnues[types.codes]
+
+
+# ============================================================================
+# ENTRAÎNEMENT
+# ============================================================================
+
+class _Accumulateur:
+    """Statistiques suffisantes des moindres carrés d'un département"""
+
+    def __init__(self):
+        k = len(VARIABLES)
+        self.communes: Dict[str, int] = {}
+        self.n_c = np.zeros(0)              # transactions par commune
+        self.xc = np.zeros((0, k))          # somme des variables par commune
+        self.yc = np.zeros(0)               # somme de y par commune
+        self.xx = np.zeros((k, k))          # X'X (variables)
+        self.xy = np.zeros(k)               # X'y
+        self.yy = 0.0
+        self.n = 0
+
+    def ajouter(self, communes: Sequence[str], indices: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        """Ajoute des lignes : commune de chaque ligne = communes[indices]"""
+        positions = np.array([self._position(c) for c in communes], dtype=np.int64)
+        nb = len(self.communes)
+        if nb > len(self.n_c):
+            self.n_c = np.concatenate([self.n_c, np.zeros(nb - len(self.n_c))])
+            self.yc = np.concatenate([self.yc, np.zeros(nb - len(self.yc))])
+            self.xc = np.vstack([self.xc, np.zeros((nb - len(self.xc), x.shape[1]))])
+
+        c = positions[indices]
+        self.n_c += np.bincount(c, minlength=nb)
+        self.yc += np.bincount(c, weights=y, minlength=nb)
+        for j in range(x.shape[1]):
+            self.xc[:, j] += np.bincount(c, weights=x[:, j], minlength=nb)
+        self.xx += x.T @ x
+        self.xy += x.T @ y
+        self.yy += float(y @ y)
+        self.n += len(y)
+
+    def _position(self, code: str) -> int:
+        return self.communes.setdefault(code, len(self.communes))
+
+    def ajuster(self) -> Dict:
+        """
+        Coefficients par élimination des effets fixes communes (complément de Schur)
+
+        Le bloc communes de X'X étant diagonal, le système se réduit à
+        len(VARIABLES) inconnues ; l'année de référence (première présente) et
+        les variables sans variation sont exclues pour lever la colinéarité.
+        """
+        actives = np.flatnonzero(np.diag(self.xx) > 0)
+        colonnes_annees = 2 + len(TYPES_MODELE) + np.arange(len(ANNEES_MODELE))
+        presentes = np.intersect1d(actives, colonnes_annees)
+        if len(presentes):
+            actives = np.setdiff1d(actives, presentes[:1])
+
+        inv_n = 1.0 / self.n_c
+        xc = self.xc[:, actives]
+        a = self.xx[np.ix_(actives, actives)] - xc.T @ (xc * inv_n[:, None])
+        b = self.xy[actives] - xc.T @ (self.yc * inv_n)
+        beta_actifs = np.linalg.lstsq(a, b, rcond=None)[0]
+
+        beta = np.zeros(len(VARIABLES))
+        beta[actives] = beta_actifs
+        effets = (self.yc - self.xc @ beta) * inv_n
+
+        # Somme des carrés des résidus : y'y - θ'X'y à l'optimum
+        sce = self.yy - beta @ self.xy - effets @ self.yc
+        ddl = max(1, self.n - len(effets) - len(actives))
+        annees_presentes = presentes - colonnes_annees[0] + ANNEES_MODELE[0]
+
+        return {
+            'beta': beta,
+            'communes': list(self.communes),
+            'effets': effets,
+            'nb_communes': self.n_c.astype(np.int64),
+            'sigma': float(np.sqrt(max(sce, 0.0) / ddl)),
+            'annee_max': int(annees_presentes.max()) if len(presentes) else ANNEES_MODELE[-1],
+            'n': self.n,
+        }
+
+
+class EntraineurHedonique:
+    """
+    Ajustement du modèle hédonique par blocs de transactions
+
+    `ajouter` peut être appelé sur des blocs successifs (millions de lignes) :
+    seules les statistiques suffisantes de chaque département sont conservées,
+    en mémoire proportionnelle au nombre de communes.
+    """
+
+    def __init__(self):
+        self._departements: Dict[str, _Accumulateur] = {}
+        self.nb_transactions = 0
+
+    def ajouter(self, df: pd.DataFrame) -> None:
+        """Ajoute des transactions filtrées (code_commune, date_mutation, valeur, surface...)"""
+        from dvf_store import departement_commune
+
+        df = df.dropna(subset=['code_commune'])
+        surface = df['surface_reelle_bati'].to_numpy(dtype=float)
+        prix_m2 = df['valeur_fonciere'].to_numpy(dtype=float) / surface
+        garder = ((prix_m2 >= PRIX_M2_MIN) & (prix_m2 <= PRIX_M2_MAX)
+                  & (surface >= SURFACE_MIN) & (surface <= SURFACE_MAX))
+        if 'type_local' in df.columns:
+            garder &= ~types_inconnus(df['type_local'])
+        if not garder.any():
+            return
+
+        df = df[garder]
+        pieces = (pd.to_numeric(df['nombre_pieces_principales'], errors='coerce').to_numpy(dtype=float)
+                  if 'nombre_pieces_principales' in df.columns else np.full(len(df), np.nan))
+        type_local = df['type_local'] if 'type_local' in df.columns else np.full(len(df), None)
+        x = matrice_variables(surface[garder], pieces, type_local, df['date_mutation'].dt.year.to_numpy())
+        y = np.log(prix_m2[garder])
+
+        # Département de chaque ligne via sa commune (une conversion par commune distincte)
+        indices, communes = pd.factorize(df['code_commune'].astype(str))
+        departements, dept_communes = np.unique([departement_commune(c) for c in communes],
+                                                return_inverse=True)
+        dept_lignes = dept_communes[indices]
+
+        ordre = np.argsort(dept_lignes, kind='stable')
+        bornes = np.searchsorted(dept_lignes[ordre], np.arange(len(departements) + 1))
+        for i, dept in enumerate(departements):
+            lignes = ordre[bornes[i]:bornes[i + 1]]
+            locales, indices_locaux = np.unique(indices[lignes], return_inverse=True)
+            self._departements.setdefault(dept, _Accumulateur()).ajouter(
+                communes[locales], indices_locaux, x[lignes], y[lignes]
+            )
+        self.nb_transactions += len(y)
+
+    def ajuster(self) -> Dict[str, np.ndarray]:
+        """
+        Table des coefficients de tous les départements d'au moins NB_MIN_DEPARTEMENT ventes
+
+        Returns:
+            Tableaux de la table : departements, coefficients (dép. × VARIABLES),
+            sigma, annee_max, nb_transactions, et les effets communes au format
+            CSR (communes_debut, communes, effets_communes, nb_communes)
+        """
+        modeles = [(dept, acc.ajuster()) for dept, acc in sorted(self._departements.items())
+                   if acc.n >= NB_MIN_DEPARTEMENT]
+        if not modeles:
+            raise ValueError("Aucun département avec assez de transactions pour l'ajustement")
+
+        debuts = np.cumsum([0] + [len(m['communes']) for _, m in modeles])
+        return {
+            'version': np.array(VERSION_MODELE),
+            'variables': np.asarray(VARIABLES, dtype=str),
+            'departements': np.asarray([d for d, _ in modeles], dtype=str),
+            'coefficients': np.vstack([m['beta'] for _, m in modeles]).astype(np.float32),
+            'sigma': np.array([m['sigma'] for _, m in modeles], dtype=np.float32),
+            'annee_max': np.array([m['annee_max'] for _, m in modeles], dtype=np.int16),
+            'nb_transactions': np.array([m['n'] for _, m in modeles], dtype=np.int64),
+            'communes_debut': debuts.astype(np.int32),
+            'communes': np.asarray([c for _, m in modeles for c in m['communes']], dtype=str),
+            'effets_communes': np.concatenate([m['effets'] for _, m in modeles]).astype(np.float32),
+            'nb_communes': np.concatenate([m['nb_communes'] for _, m in modeles]).astype(np.int32),
+        }
+
+
+def entrainer_modele(fichiers: Iterable[str], sortie: str, taille_chunk: int = 500_000) -> Dict:
+    """
+    Lit des fichiers DVF en masse (CSV, éventuellement gzippés) en une passe et écrit la table
+
+    Returns:
+        Résumé (départements, communes, transactions, durée)
+    """
+    from dvf_backend import COLONNES_CSV_DVF, DTYPES_CSV_DVF, _filtrer_transactions
+
+    debut = time.perf_counter()
+    entraineur = EntraineurHedonique()
+    colonnes = set(COLONNES_CSV_DVF) | {'code_commune'}
+
+    for fichier in fichiers:
+        lecteur = pd.read_csv(fichier, usecols=lambda c: c in colonnes,
+                              dtype=DTYPES_CSV_DVF, chunksize=taille_chunk)
+        for chunk in lecteur:
+            df = _filtrer_transactions(chunk, colonnes_supplementaires=('code_commune',))
+            if not df.empty and 'code_commune' in df.columns:
+                entraineur.ajouter(df)
+
+    table = entraineur.ajuster()
+    np.savez(sortie, **table)
+
+    return {
+        'departements': len(table['departements']),
+        'communes': len(table['communes']),
+        'transactions': entraineur.nb_transactions,
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+# ============================================================================
+# PRÉDICTION
+# ============================================================================
+
+class ModeleHedonique:
+    """Table des coefficients hédoniques, chargée une fois en mémoire"""
+
+    def __init__(self, chemin: str):
+        with np.load(chemin, allow_pickle=False) as archive:
+            t = {cle: archive[cle] for cle in archive.files}
+        if int(t['version']) != VERSION_MODELE or tuple(t['variables']) != VARIABLES:
+            raise ValueError(f"Table hédonique incompatible (version {int(t['version'])}) : réentraîner le modèle")
+
+        self.coefficients = t['coefficients'].astype(np.float64)
+        self.sigma = t['sigma'].astype(np.float64)
+        self.annee_max = t['annee_max'].astype(np.int64)
+        self.nb_transactions = t['nb_transactions']
+        self._departements = pd.Index(t['departements'].tolist())
+        self._communes = pd.Index(t['communes'].tolist())
+        self._effets = t['effets_communes'].astype(np.float64)
+
+        # Effet moyen pondéré de chaque département (communes absentes de l'entraînement)
+        debuts = t['communes_debut']
+        poids = t['nb_communes'].astype(np.float64)
+        self._effet_departement = (np.add.reduceat(self._effets * poids, debuts[:-1])
+                                   / np.add.reduceat(poids, debuts[:-1]))
+
+    def __contains__(self, code_insee: str) -> bool:
+        from dvf_store import departement_commune
+        return departement_commune(str(code_insee)) in self._departements
+
+    def predire(self, codes_insee: Sequence[str], surface: np.ndarray, pieces: np.ndarray,
+                type_local: Sequence, annees: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Prix au m² prédits pour un lot de biens
+
+        Args:
+            annees: Année de valeur de chaque bien (défaut et maximum : dernière
+                    année d'entraînement de son département)
+
+        Returns:
+            prix_m2 (médiane prédite), prix_m2_bas / prix_m2_haut (quartiles de la
+            dispersion résiduelle), NaN pour les départements absents du modèle
+            et pour les types de local hors TYPES_MODELE (non extrapolés) ;
+            un type non renseigné est estimé au type de référence
+        """
+        codes = pd.Series(codes_insee, dtype=str)
+        # Département : 3 caractères pour l'outre-mer (voir dvf_store.departement_commune)
+        departements = codes.str[:2].where(~codes.str.startswith('97'), codes.str[:3])
+        dept = self._departements.get_indexer(departements)
+        connu = dept >= 0
+        d = np.where(connu, dept, 0)
+
+        # Années postérieures à l'entraînement : effet de la dernière année connue
+        annees = self.annee_max[d] if annees is None else np.minimum(annees, self.annee_max[d])
+        type_local = pd.Categorical(type_local)  # une seule factorisation des libellés
+        x = matrice_variables(surface, pieces, type_local, annees)
+
+        # Une multiplication pour tout le lot, limitée aux départements présents
+        presents, colonne = np.unique(d, return_inverse=True)
+        scores = x @ self.coefficients[presents].T
+        log_prix = scores[np.arange(len(codes)), colonne]
+
+        commune = self._communes.get_indexer(codes)
+        log_prix += np.where(commune >= 0, self._effets[commune], self._effet_departement[d])
+
+        ecart = _Z_QUARTILE * self.sigma[d]
+        log_prix[~connu | types_inconnus(type_local)] = np.nan
+        return {
+            'prix_m2': np.exp(log_prix),
+            'prix_m2_bas': np.exp(log_prix - ecart),
+            'prix_m2_haut': np.exp(log_prix + ecart),
+        }
+
+    def predire_biens(self, biens: List, annees: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """`predire` pour une liste de BienImmobilier"""
+        return self.predire(
+            [b.code_insee for b in biens],
+            np.array([b.surface_habitable for b in biens], dtype=float),
+            np.array([np.nan if b.nombre_pieces is None else b.nombre_pieces for b in biens], dtype=float),
+            [getattr(b, 'type_local', None) for b in biens],
+            annees,
+        )
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modèle hédonique des prix par département")
+    parser.add_argument('fichiers', nargs='+', help="Fichiers DVF CSV (.csv ou .csv.gz)")
+    parser.add_argument('--sortie', required=True, help="Fichier .npz de sortie")
+    parser.add_argument('--chunk', type=int, default=500_000, help="Lignes lues par bloc")
+    args = parser.parse_args()
+
+    print(f"📈 Ajustement du modèle hédonique sur {len(args.fichiers)} fichier(s)...")
+    resume = entrainer_modele(args.fichiers, args.sortie, taille_chunk=args.chunk)
+    print(f"✅ {resume['departements']} départements, {resume['communes']:_} communes et "
+          f"{resume['transactions']:_} transactions en {resume['duree_s']} s".replace('_', ' '))
@@ -0,0 +1,441 @@
+"""
+Estimateur Immobilier - Statistiques de marché glissantes par commune
+Maintient, pour chaque commune et chaque mois, l'histogramme des prix au m²
+(classes logarithmiques de ~1,8%, nombre de ventes et somme des prix par
+classe). Médianes, quartiles, moyennes tronquées et volumes mensuels,
+trimestriels ou sur fenêtre glissante s'en déduisent sans relire les
+transactions ; un nouveau lot de mutations est agrégé puis fusionné dans les
+histogrammes existants (ajout seul, l'historique n'est jamais relu).
+
+Seules les cases (commune, mois, classe) non vides sont stockées, triées par
+clé : 20 octets par case, soit au plus ~200 Mo pour dix ans de DVF national
+(bien moins en pratique, les ventes d'une grande commune partageant leurs
+classes).
+
+Usage :
+    python dvf_marche.py --sortie marche.npz full_2022.csv.gz full_2023.csv.gz
+    python dvf_marche.py --base marche.npz --sortie marche.npz mutations_nouvelles.csv
+    python dvf_marche.py --base marche.npz --commune 33063 --pas trimestre
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Version du format de la table des histogrammes
+VERSION_MARCHE = 1
+
+# Mois couverts : janvier ANNEE_ORIGINE à décembre ANNEE_ORIGINE + 29
+ANNEE_ORIGINE = 2010
+NB_MOIS = 30 * 12
+
+# Classes de prix au m², de largeur constante en log entre les bornes de
+# plausibilité (les ventes hors bornes sont écartées)
+PRIX_M2_MIN, PRIX_M2_MAX = 300.0, 30_000.0
+NB_CLASSES = 256
+
+# Part des ventes retirée de chaque côté pour la moyenne tronquée
+# (comme les 5% extrêmes de analyser_marche)
+FRACTION_TRONQUEE = 0.05
+
+# Fenêtre glissante par défaut (mois)
+FENETRE_MOIS = 12
+
+# Pondération temporelle : poids divisé par deux tous les DEMI_VIE_MOIS, ventes
+# de plus de HORIZON_MOIS ignorées, volume pondéré minimal pour estimer
+DEMI_VIE_MOIS = 12
+HORIZON_MOIS = 60
+VOLUME_EFFECTIF_MIN = 5.0
+
+PAS = ('mois', 'trimestre')
+
+_LOG_MIN = math.log(PRIX_M2_MIN)
+_LARGEUR_CLASSE = (math.log(PRIX_M2_MAX) - _LOG_MIN) / NB_CLASSES
+
+
+def indice_mois(date) -> int:
+    """Indice du mois d'une date (0 : janvier ANNEE_ORIGINE)"""
+    date = pd.Timestamp(date)
+    return (date.year - ANNEE_ORIGINE) * 12 + date.month - 1
+
+
+# ============================================================================
+# STATISTIQUES SUR HISTOGRAMMES
+# ============================================================================
+
+def quantiles_histogrammes(nombres: np.ndarray, q: float) -> np.ndarray:
+    """
+    Quantile q de chaque ligne d'histogrammes (lignes × NB_CLASSES)
+
+    Interpolé dans la classe atteinte en supposant les ventes réparties
+    uniformément en log (erreur inférieure à la demi-largeur d'une classe).
+    NaN pour une ligne vide.
+    """
+    cumul = np.cumsum(nombres, axis=1)
+    total = cumul[:, -1]
+    cible = q * total
+    lignes = np.arange(len(nombres))
+    classes = np.argmax(cumul >= cible[:, None], axis=1)
+
+    dans_classe = nombres[lignes, classes]
+    avant = cumul[lignes, classes] - dans_classe
+    fraction = np.divide(cible - avant, dans_classe, out=np.zeros(len(nombres)), where=dans_classe > 0)
+    valeurs = np.exp(_LOG_MIN + (classes + fraction) * _LARGEUR_CLASSE)
+    return np.where(total > 0, valeurs, np.nan)
+
+
+def moyennes_tronquees_histogrammes(nombres: np.ndarray, sommes: np.ndarray,
+                                    fraction: float = FRACTION_TRONQUEE) -> np.ndarray:
+    """
+    Moyenne de chaque ligne après retrait de `fraction` des ventes de chaque côté
+
+    Les classes entièrement conservées contribuent leur somme exacte ; une
+    classe coupée contribue sa part de ventes au prix moyen de la classe.
+    """
+    cumul = np.cumsum(nombres, axis=1)
+    total = cumul[:, -1:]
+    gardees = np.clip(np.minimum(cumul, (1 - fraction) * total)
+                      - np.maximum(cumul - nombres, fraction * total), 0, None)
+    prix_classes = np.divide(sommes, nombres, out=np.zeros(sommes.shape), where=nombres > 0)
+    poids = gardees.sum(axis=1)
+    return np.divide((gardees * prix_classes).sum(axis=1), poids,
+                     out=np.full(len(nombres), np.nan), where=poids > 0)
+
+
+# ============================================================================
+# HISTOGRAMMES PAR COMMUNE ET PAR MOIS
+# ============================================================================
+
+class StatistiquesMarche:
+    """
+    Histogrammes mensuels des prix au m² de toutes les communes
+
+    Cases non vides rangées dans trois tableaux triés par clé
+    ((commune × NB_MOIS + mois) × NB_CLASSES + classe) : les cases d'une
+    commune sont contiguës et se lisent par recherche dichotomique.
+    """
+
+    def __init__(self, chemin: Optional[str] = None):
+        self._codes: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._cles = np.empty(0, dtype=np.int64)
+        self._nombres = np.empty(0, dtype=np.uint32)
+        self._sommes = np.empty(0, dtype=np.float64)
+        # Dernier mois vu (référence de la pondération temporelle), -1 si vide
+        self.mois_max = -1
+        if chemin:
+            self._charger(chemin)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code_insee: str) -> bool:
+        return code_insee in self._positions
+
+    @property
+    def nb_ventes(self) -> int:
+        return int(self._nombres.sum())
+
+    @property
+    def nbytes(self) -> int:
+        """Mémoire occupée par les histogrammes (octets)"""
+        return self._cles.nbytes + self._nombres.nbytes + self._sommes.nbytes
+
+    # ------------------------------------------------------------------
+    # Ajout incrémental
+    # ------------------------------------------------------------------
+
+    def ajouter(self, df: pd.DataFrame) -> int:
+        """
+        Ajoute un lot de mutations (code_commune, date_mutation,
+        valeur_fonciere, surface_reelle_bati)
+
+        Le lot est agrégé par case puis fusionné : les cases existantes sont
+        incrémentées en place, les nouvelles insérées à leur rang. Un même lot
+        ajouté deux fois est compté deux fois.
+
+        Returns:
+            Nombre de ventes retenues (prix au m² et mois dans les bornes)
+        """
+        if df.empty:
+            return 0
+
+        prix_m2 = (df['valeur_fonciere'] / df['surface_reelle_bati']).to_numpy(dtype=np.float64)
+        dates = pd.to_datetime(df['date_mutation'], errors='coerce')
+        mois = ((dates.dt.year - ANNEE_ORIGINE) * 12 + dates.dt.month - 1).to_numpy(dtype=np.float64)
+        valide = ((prix_m2 >= PRIX_M2_MIN) & (prix_m2 < PRIX_M2_MAX)
+                  & (mois >= 0) & (mois < NB_MOIS) & df['code_commune'].notna().to_numpy())
+        if not valide.any():
+            return 0
+
+        prix_m2, mois = prix_m2[valide], mois[valide].astype(np.int64)
+        codes, communes = pd.factorize(df['code_commune'].to_numpy()[valide])
+        positions = np.array([self._position(str(c)) for c in communes], dtype=np.int64)
+        classes = np.minimum(((np.log(prix_m2) - _LOG_MIN) / _LARGEUR_CLASSE).astype(np.int64),
+                             NB_CLASSES - 1)
+        cles = (positions[codes] * NB_MOIS + mois) * NB_CLASSES + classes
+
+        cles_lot, inverse = np.unique(cles, return_inverse=True)
+        self._fusionner(cles_lot, np.bincount(inverse), np.bincount(inverse, weights=prix_m2))
+        self.mois_max = max(self.mois_max, int(mois.max()))
+        return len(prix_m2)
+
+    def _position(self, code: str) -> int:
+        position = self._positions.get(code)
+        if position is None:
+            position = self._positions[code] = len(self._codes)
+            self._codes.append(code)
+        return position
+
+    def _fusionner(self, cles: np.ndarray, nombres: np.ndarray, sommes: np.ndarray) -> None:
+        rangs = np.searchsorted(self._cles, cles)
+        existantes = rangs < len(self._cles)
+        existantes[existantes] = self._cles[rangs[existantes]] == cles[existantes]
+
+        self._nombres[rangs[existantes]] += nombres[existantes].astype(np.uint32)
+        self._sommes[rangs[existantes]] += sommes[existantes]
+
+        nouvelles = ~existantes
+        if nouvelles.any():
+            # np.insert interprète les rangs dans le tableau d'origine : une seule copie
+            rangs = rangs[nouvelles]
+            self._cles = np.insert(self._cles, rangs, cles[nouvelles])
+            self._nombres = np.insert(self._nombres, rangs, nombres[nouvelles].astype(np.uint32))
+            self._sommes = np.insert(self._sommes, rangs, sommes[nouvelles])
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def histogrammes(self, code_insee: str) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        (premier mois, nombres, sommes) de la commune, matrices denses
+        (mois × NB_CLASSES) du premier au dernier mois de vente ; None si absente
+        """
+        position = self._positions.get(code_insee)
+        if position is None:
+            return None
+        base = position * NB_MOIS * NB_CLASSES
+        debut, fin = np.searchsorted(self._cles, [base, base + NB_MOIS * NB_CLASSES])
+        if debut == fin:
+            return None
+
+        mois, classes = np.divmod(self._cles[debut:fin] - base, NB_CLASSES)
+        premier = int(mois[0])
+        nombres = np.zeros((int(mois[-1]) - premier + 1, NB_CLASSES))
+        sommes = np.zeros(nombres.shape)
+        nombres[mois - premier, classes] = self._nombres[debut:fin]
+        sommes[mois - premier, classes] = self._sommes[debut:fin]
+        return premier, nombres, sommes
+
+    def serie(self, code_insee: str, pas: str = 'mois', fenetre: int = FENETRE_MOIS) -> Optional[pd.DataFrame]:
+        """
+        Série glissante des prix au m² de la commune
+
+        Args:
+            pas: 'mois' ou 'trimestre' (une ligne par période)
+            fenetre: Mois couverts par les statistiques glissantes, terminés
+                     avec la période
+
+        Returns:
+            DataFrame periode, ventes (de la période), volume, mediane,
+            moyenne_tronquee (sur la fenêtre glissante) ; None si aucune vente
+        """
+        if pas not in PAS:
+            raise ValueError(f"Pas inconnu : {pas} (attendu : {', '.join(PAS)})")
+        histogrammes = self.histogrammes(code_insee)
+        if histogrammes is None:
+            return None
+        premier, nombres, sommes = histogrammes
+
+        # Cumuls par mois (ligne 0 nulle) : toute fenêtre est une différence
+        cumul_nombres = np.vstack([np.zeros((1, NB_CLASSES)), np.cumsum(nombres, axis=0)])
+        cumul_sommes = np.vstack([np.zeros((1, NB_CLASSES)), np.cumsum(sommes, axis=0)])
+
+        mois = premier + np.arange(len(nombres))
+        duree = 3 if pas == 'trimestre' else 1
+        fins = np.flatnonzero(((mois + 1) % duree == 0) | (mois == mois[-1])) + 1
+        debuts_periode = np.maximum(fins - ((mois[fins - 1] % duree) + 1), 0)
+        debuts_fenetre = np.maximum(fins - fenetre, 0)
+
+        fenetres = cumul_nombres[fins] - cumul_nombres[debuts_fenetre]
+        sommes_fenetres = cumul_sommes[fins] - cumul_sommes[debuts_fenetre]
+        ventes = (cumul_nombres[fins] - cumul_nombres[debuts_periode]).sum(axis=1)
+
+        periodes = pd.PeriodIndex(
+            [pd.Period(year=ANNEE_ORIGINE + int(m) // 12, month=int(m) % 12 + 1, freq='M')
+             for m in mois[fins - 1]]
+        )
+        if pas == 'trimestre':
+            periodes = periodes.asfreq('Q')
+
+        return pd.DataFrame({
+            'periode': periodes,
+            'ventes': ventes.astype(np.int64),
+            'volume': fenetres.sum(axis=1).astype(np.int64),
+            'mediane': quantiles_histogrammes(fenetres, 0.5),
+            'moyenne_tronquee': moyennes_tronquees_histogrammes(fenetres, sommes_fenetres),
+        })
+
+    def estimation_ponderee(self, code_insee: str, mois_reference: Optional[int] = None,
+                            demi_vie: float = DEMI_VIE_MOIS, horizon: int = HORIZON_MOIS) -> Optional[Dict]:
+        """
+        Prix au m² de la commune, ventes récentes pondérées davantage
+
+        Chaque mois pèse 0.5 ** (âge / demi_vie) par rapport à `mois_reference`
+        (défaut : dernier mois vu, toutes communes confondues).
+
+        Returns:
+            prix_m2 (médiane pondérée), prix_m2_bas / prix_m2_haut (quartiles
+            pondérés), moyenne_tronquee, volume (ventes dans l'horizon),
+            volume_effectif (somme des poids) et tendance (€/m²/an, pente des
+            médianes mensuelles pondérée par poids × ventes) ; None si le
+            volume effectif est inférieur à VOLUME_EFFECTIF_MIN
+        """
+        histogrammes = self.histogrammes(code_insee)
+        if histogrammes is None:
+            return None
+        premier, nombres, sommes = histogrammes
+
+        reference = self.mois_max if mois_reference is None else mois_reference
+        mois = premier + np.arange(len(nombres))
+        age = reference - mois
+        poids = np.where((age >= 0) & (age < horizon), 0.5 ** (age / demi_vie), 0.0)
+
+        pondere = poids @ nombres
+        volume_effectif = float(pondere.sum())
+        if volume_effectif < VOLUME_EFFECTIF_MIN:
+            return None
+
+        ligne = pondere[None, :]
+        bas, mediane, haut = (float(quantiles_histogrammes(ligne, q)[0]) for q in (0.25, 0.5, 0.75))
+        return {
+            'prix_m2': mediane,
+            'prix_m2_bas': bas,
+            'prix_m2_haut': haut,
+            'moyenne_tronquee': float(moyennes_tronquees_histogrammes(ligne, (poids @ sommes)[None, :])[0]),
+            'volume': int(nombres[poids > 0].sum()),
+            'volume_effectif': volume_effectif,
+            'tendance': _pente_annuelle(mois, quantiles_histogrammes(nombres, 0.5),
+                                        poids * nombres.sum(axis=1)),
+        }
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def enregistrer(self, chemin: str) -> None:
+        """Écrit la table (.npz) ; remplacement atomique d'un fichier existant"""
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(VERSION_MARCHE),
+                codes=np.asarray(self._codes, dtype=str),
+                cles=self._cles,
+                nombres=self._nombres,
+                sommes=self._sommes,
+                mois_max=np.array(self.mois_max),
+            )
+        os.replace(temporaire, chemin)
+
+    def _charger(self, chemin: str) -> None:
+        with np.load(chemin, allow_pickle=False) as archive:
+            version = int(archive['version'])
+            if version != VERSION_MARCHE:
+                raise ValueError(f"Version de table incompatible : {version} (attendue : {VERSION_MARCHE})")
+            self._codes = archive['codes'].tolist()
+            self._cles = archive['cles']
+            self._nombres = archive['nombres']
+            self._sommes = archive['sommes']
+            self.mois_max = int(archive['mois_max'])
+        self._positions = {code: i for i, code in enumerate(self._codes)}
+
+
+def _pente_annuelle(mois: np.ndarray, valeurs: np.ndarray, poids: np.ndarray) -> float:
+    """Pente (par an) des moindres carrés pondérés de `valeurs` sur `mois`"""
+    garde = (poids > 0) & ~np.isnan(valeurs)
+    if np.count_nonzero(garde) < 2:
+        return 0.0
+    x, y, w = mois[garde], valeurs[garde], poids[garde]
+    x_moyen = np.average(x, weights=w)
+    variance = np.sum(w * (x - x_moyen) ** 2)
+    if variance == 0:
+        return 0.0
+    return float(12 * np.sum(w * (x - x_moyen) * (y - np.average(y, weights=w))) / variance)
+
+
+# ============================================================================
+# CONSTRUCTION DEPUIS LES FICHIERS DVF
+# ============================================================================
+
+def ajouter_fichiers(statistiques: StatistiquesMarche, fichiers: Iterable[str],
+                     taille_chunk: int = 500_000) -> Dict:
+    """
+    Ajoute des fichiers DVF en masse (CSV, éventuellement gzippés), un lot par fichier
+
+    Returns:
+        Résumé (ventes ajoutées, communes, taille en Mo, durée)
+    """
+    from dvf_backend import lire_csv_dvf
+
+    debut = time.perf_counter()
+    ventes = 0
+    for fichier in fichiers:
+        df = lire_csv_dvf(fichier, colonnes_supplementaires=('code_commune',), taille_chunk=taille_chunk)
+        ventes += statistiques.ajouter(df)
+
+    return {
+        'ventes': ventes,
+        'communes': len(statistiques),
+        'taille_mo': round(statistiques.nbytes / 1e6, 1),
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statistiques de marché glissantes par commune")
+    parser.add_argument('fichiers', nargs='*', help="Fichiers DVF CSV à ajouter (.csv ou .csv.gz)")
+    parser.add_argument('--base', help="Table existante (.npz) à compléter")
+    parser.add_argument('--sortie', help="Fichier .npz de sortie")
+    parser.add_argument('--chunk', type=int, default=500_000, help="Lignes lues par bloc")
+    parser.add_argument('--commune', help="Affiche la série glissante d'une commune")
+    parser.add_argument('--pas', choices=PAS, default='mois')
+    parser.add_argument('--fenetre', type=int, default=FENETRE_MOIS, help="Fenêtre glissante (mois)")
+    args = parser.parse_args()
+
+    statistiques = StatistiquesMarche(args.base)
+    if args.fichiers:
+        print(f"📊 Ajout de {len(args.fichiers)} fichier(s) à {len(statistiques):,} communes...".replace(',', ' '))
+        resume = ajouter_fichiers(statistiques, args.fichiers, taille_chunk=args.chunk)
+        print(f"✅ {resume['ventes']:,} ventes ajoutées, {resume['communes']:,} communes, "
+              f"{resume['taille_mo']} Mo en {resume['duree_s']} s".replace(',', ' '))
+    if args.sortie:
+        statistiques.enregistrer(args.sortie)
+
+    if args.commune:
+        serie = statistiques.serie(args.commune, args.pas, args.fenetre)
+        if serie is None:
+            print(f"❌ Aucune vente pour la commune {args.commune}")
+        else:
+            print(serie.to_string(index=False, float_format='{:.0f}'.format))
+            estimation = statistiques.estimation_ponderee(args.commune)
+            if estimation is not None:
+                print(f"⚖️  Prix pondéré : {estimation['prix_m2']:.0f} €/m² "
+                      f"[{estimation['prix_m2_bas']:.0f} ; {estimation['prix_m2_haut']:.0f}], "
+                      f"tendance {estimation['tendance']:+.0f} €/m²/an")
@@ -0,0 +1,187 @@
+"""
+Estimateur Immobilier - Métriques du pipeline DVF
+Compteurs et chronomètres par étape, hooks enfichables et export au format
+texte Prometheus ou JSON. Une fois désactivées, les métriques se réduisent à
+un test booléen par appel.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+# Signature d'un hook : (type 'compteur' | 'observation', nom, valeur, labels)
+Hook = Callable[[str, str, float, Dict[str, str]], None]
+
+_Cle = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _ChronometreNul:
+    """Chronomètre sans effet utilisé lorsque les métriques sont désactivées"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_CHRONOMETRE_NUL = _ChronometreNul()
+
+
+class _Chronometre:
+    """Mesure la durée d'un bloc `with` et l'enregistre comme observation"""
+
+    __slots__ = ('_metriques', '_nom', '_labels', '_debut')
+
+    def __init__(self, metriques: 'Metriques', nom: str, labels: Dict[str, str]):
+        self._metriques = metriques
+        self._nom = nom
+        self._labels = labels
+
+    def __enter__(self):
+        self._debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metriques.observer(self._nom, time.perf_counter() - self._debut, **self._labels)
+        return False
+
+
+class Metriques:
+    """
+    Registre de métriques utilisable depuis plusieurs threads
+
+    - compteurs : valeurs cumulées (niveaux de fallback atteints, hits de cache, octets...)
+    - observations : nombre, somme, min et max d'une grandeur (durées d'étape...)
+    """
+
+    def __init__(self, actif: bool = True):
+        self.actif = actif
+        self._verrou = threading.Lock()
+        self._compteurs: Dict[_Cle, float] = {}
+        self._observations: Dict[_Cle, List[float]] = {}
+        self._hooks: List[Hook] = []
+
+    # ------------------------------------------------------------------
+    # Enregistrement
+    # ------------------------------------------------------------------
+
+    def compter(self, nom: str, valeur: float = 1, **labels: str) -> None:
+        """Incrémente un compteur"""
+        if not self.actif:
+            return
+        cle = (nom, tuple(sorted(labels.items())))
+        with self._verrou:
+            self._compteurs[cle] = self._compteurs.get(cle, 0) + valeur
+        for hook in self._hooks:
+            hook('compteur', nom, valeur, labels)
+
+    def observer(self, nom: str, valeur: float, **labels: str) -> None:
+        """Enregistre une observation (durée en secondes, taille...)"""
+        if not self.actif:
+            return
+        cle = (nom, tuple(sorted(labels.items())))
+        with self._verrou:
+            agregat = self._observations.get(cle)
+            if agregat is None:
+                self._observations[cle] = [1, valeur, valeur, valeur]
+            else:
+                agregat[0] += 1
+                agregat[1] += valeur
+                agregat[2] = min(agregat[2], valeur)
+                agregat[3] = max(agregat[3], valeur)
+        for hook in self._hooks:
+            hook('observation', nom, valeur, labels)
+
+    def chronometre(self, nom: str, **labels: str):
+        """Contexte `with` qui observe la durée du bloc (en secondes)"""
+        if not self.actif:
+            return _CHRONOMETRE_NUL
+        return _Chronometre(self, nom, labels)
+
+    # ------------------------------------------------------------------
+    # Hooks
+    # ------------------------------------------------------------------
+
+    def ajouter_hook(self, hook: Hook) -> None:
+        """Transmet chaque mesure à `hook` (StatsD, OpenTelemetry, journal...)"""
+        with self._verrou:
+            self._hooks = self._hooks + [hook]
+
+    def retirer_hook(self, hook: Hook) -> None:
+        with self._verrou:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def instantane(self) -> Dict:
+        """Copie de l'état courant des compteurs et observations"""
+        with self._verrou:
+            compteurs = [
+                {'nom': nom, 'labels': dict(labels), 'valeur': valeur}
+                for (nom, labels), valeur in sorted(self._compteurs.items())
+            ]
+            observations = [
+                {'nom': nom, 'labels': dict(labels), 'nombre': a[0], 'somme': a[1], 'min': a[2], 'max': a[3]}
+                for (nom, labels), a in sorted(self._observations.items())
+            ]
+        return {'compteurs': compteurs, 'observations': observations}
+
+    def exporter_json(self) -> str:
+        """Export JSON de l'instantané"""
+        return json.dumps(self.instantane(), ensure_ascii=False)
+
+    def exporter_prometheus(self) -> str:
+        """Export au format texte d'exposition Prometheus"""
+        etat = self.instantane()
+        lignes = []
+        types_emis = set()
+
+        def _type(nom: str, genre: str) -> None:
+            if nom not in types_emis:
+                lignes.append(f"# TYPE {nom} {genre}")
+                types_emis.add(nom)
+
+        for c in etat['compteurs']:
+            _type(c['nom'], 'counter')
+            lignes.append(f"{c['nom']}{_labels_prometheus(c['labels'])} {c['valeur']:g}")
+
+        for o in etat['observations']:
+            _type(o['nom'], 'summary')
+            labels = _labels_prometheus(o['labels'])
+            lignes.append(f"{o['nom']}_count{labels} {o['nombre']}")
+            lignes.append(f"{o['nom']}_sum{labels} {o['somme']:.6g}")
+
+        for o in etat['observations']:
+            _type(f"{o['nom']}_max", 'gauge')
+            lignes.append(f"{o['nom']}_max{_labels_prometheus(o['labels'])} {o['max']:.6g}")
+
+        return "\n".join(lignes) + "\n"
+
+    def reinitialiser(self) -> None:
+        """Remet tous les compteurs et observations à zéro"""
+        with self._verrou:
+            self._compteurs.clear()
+            self._observations.clear()
+
+
+def _labels_prometheus(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    paires = ','.join(f'{cle}="{_echapper(valeur)}"' for cle, valeur in labels.items())
+    return '{' + paires + '}'
+
+
+def _echapper(valeur) -> str:
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Registre partagé par tout le backend ($DVF_METRIQUES=0 pour le désactiver)
+METRIQUES = Metriques(actif=os.environ.get('DVF_METRIQUES', '1') != '0')
@@ -0,0 +1,237 @@
+"""
+Estimateur Immobilier - Table des prix de référence
+Prix médian au m² par département et par commune, par type de local et par
+année de vente, calculés à partir des fichiers DVF en masse. La table est un
+fichier binaire versionné (en-tête, codes triés, matrice de prix en uint16)
+ouvert en mémoire mappée : le chargement ne lit que l'en-tête et une
+consultation coûte une recherche dichotomique sur les codes.
+
+Sert d'ordre de grandeur sans réseau (données simulées, estimation
+provisoire) à la place de la table de prix codée en dur du backend.
+
+Usage :
+    python dvf_references.py --sortie references_prix.bin full_2022.csv.gz full_2023.csv.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, Iterable, Optional
+
+from dvf_differe import ModuleDiffere
+from dvf_store import departement_commune
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Format du fichier : signature et version
+SIGNATURE = b'DVFREF'
+VERSION_REFERENCES = 1
+
+# Types de local distingués ; indice 0 : tous types confondus
+TYPES_REFERENCE = ('Appartement', 'Maison')
+
+# Années distinguées ; la dernière colonne regroupe toutes les années
+ANNEES_REFERENCE = tuple(range(2014, 2031))
+
+# Ventes minimales pour publier une médiane (sinon 0 : absente)
+NB_VENTES_MIN = 5
+
+# Bornes de plausibilité appliquées avant le calcul des médianes
+PRIX_M2_MIN, PRIX_M2_MAX = 300.0, 30_000.0
+
+# Octets par code de zone (département sur 2 ou 3 caractères, commune sur 5)
+_LONGUEUR_CODE = 5
+
+
+def _dtype_entete():
+    return np.dtype([
+        ('signature', 'S8'), ('version', '<u2'), ('nb_types', '<u2'),
+        ('annee_min', '<u2'), ('nb_annees', '<u2'), ('nb_zones', '<u4'), ('reserve', '<u4'),
+    ])
+
+
+def _position_prix(nb_zones: int) -> int:
+    """Position de la matrice des prix : après l'en-tête et les codes, alignée sur 8 octets"""
+    fin_codes = _dtype_entete().itemsize + nb_zones * _LONGUEUR_CODE
+    return (fin_codes + 7) // 8 * 8
+
+
+# ============================================================================
+# CONSTRUCTION
+# ============================================================================
+
+def calculer_references(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Prix médians au m² de toutes les communes et de tous les départements
+
+    Args:
+        df: Transactions filtrées avec code_commune, type_local, date_mutation,
+            valeur_fonciere et surface_reelle_bati
+
+    Returns:
+        codes (zones triées, départements et communes) et prix (uint16,
+        zones × (1 + len(TYPES_REFERENCE)) × (len(ANNEES_REFERENCE) + 1),
+        0 si moins de NB_VENTES_MIN ventes)
+    """
+    prix_m2 = (df['valeur_fonciere'] / df['surface_reelle_bati']).to_numpy(dtype=np.float64)
+    garde = (prix_m2 >= PRIX_M2_MIN) & (prix_m2 < PRIX_M2_MAX) & df['code_commune'].notna().to_numpy()
+    df, prix_m2 = df[garde], prix_m2[garde]
+
+    communes = df['code_commune'].astype(str).str.zfill(_LONGUEUR_CODE)
+    departements = communes.map(departement_commune)
+    codes = np.unique(np.concatenate([communes.unique(), departements.unique()]).astype(str))
+
+    zones = (np.searchsorted(codes, communes.to_numpy(dtype=str)),
+             np.searchsorted(codes, departements.to_numpy(dtype=str)))
+    # Position de chaque libellé dans TYPES_REFERENCE (-1 : hors référence ou non renseigné)
+    libelles = pd.Categorical(df['type_local'])
+    types = np.append(pd.Index(TYPES_REFERENCE).get_indexer(libelles.categories), -1)[libelles.codes]
+    # Indice dans la matrice (0 : tous types) ; le décalage se fait après le test
+    # pour qu'un type hors référence reste à -1
+    types = np.where(types >= 0, types + 1, -1)
+    annees = df['date_mutation'].dt.year.to_numpy() - ANNEES_REFERENCE[0]
+    toutes_annees = len(ANNEES_REFERENCE)
+    annees = np.where((annees >= 0) & (annees < toutes_annees), annees, -1)
+
+    prix = np.zeros((len(codes), 1 + len(TYPES_REFERENCE), toutes_annees + 1), dtype=np.uint16)
+    for zone in zones:
+        for type_local in (types, np.zeros_like(types)):
+            for annee in (annees, np.full_like(annees, toutes_annees)):
+                # Type hors TYPES_REFERENCE ou année hors ANNEES_REFERENCE : seulement dans les agrégats
+                valide = (type_local >= 0) & (annee >= 0)
+                cellules = np.ravel_multi_index((zone[valide], type_local[valide], annee[valide]), prix.shape)
+                groupes = pd.Series(prix_m2[valide]).groupby(cellules).agg(['median', 'size'])
+                groupes = groupes[groupes['size'] >= NB_VENTES_MIN]
+                prix.flat[groupes.index.to_numpy()] = np.round(groupes['median'].to_numpy())
+
+    return {'codes': codes, 'prix': prix}
+
+
+def ecrire_references(chemin: str, codes: np.ndarray, prix: np.ndarray) -> None:
+    """Écrit la table au format mappable (voir TableReferences)"""
+    entete = np.zeros(1, dtype=_dtype_entete())
+    entete['signature'] = SIGNATURE
+    entete['version'] = VERSION_REFERENCES
+    entete['nb_types'] = prix.shape[1]
+    entete['annee_min'] = ANNEES_REFERENCE[0]
+    entete['nb_annees'] = prix.shape[2] - 1
+    entete['nb_zones'] = len(codes)
+
+    with open(chemin, 'wb') as f:
+        f.write(entete.tobytes())
+        f.write(np.asarray(codes, dtype=f'S{_LONGUEUR_CODE}').tobytes())
+        f.write(b'\x00' * (_position_prix(len(codes)) - f.tell()))
+        f.write(np.ascontiguousarray(prix, dtype='<u2').tobytes())
+
+
+def construire_references(fichiers: Iterable[str], sortie: str, taille_chunk: int = 500_000) -> Dict:
+    """
+    Lit des fichiers DVF en masse (CSV, éventuellement gzippés) et écrit la table
+
+    Returns:
+        Résumé (départements, communes, transactions, durée)
+    """
+    from dvf_backend import lire_csv_dvf
+
+    debut = time.perf_counter()
+    morceaux = [
+        lire_csv_dvf(fichier, colonnes_supplementaires=('code_commune',), taille_chunk=taille_chunk)
+        for fichier in fichiers
+    ]
+    morceaux = [m for m in morceaux if not m.empty]
+    if not morceaux:
+        raise ValueError("Aucune transaction exploitable dans les fichiers fournis")
+    df = pd.concat(morceaux, ignore_index=True)
+
+    table = calculer_references(df)
+    ecrire_references(sortie, **table)
+
+    longueurs = np.char.str_len(table['codes'])
+    return {
+        'departements': int((longueurs < _LONGUEUR_CODE).sum()),
+        'communes': int((longueurs == _LONGUEUR_CODE).sum()),
+        'transactions': len(df),
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+
+class TableReferences:
+    """Table des prix de référence en mémoire mappée"""
+
+    def __init__(self, chemin: str):
+        entete = np.fromfile(chemin, dtype=_dtype_entete(), count=1)
+        if len(entete) == 0 or entete['signature'][0] != SIGNATURE:
+            raise ValueError(f"{chemin} n'est pas une table de prix de référence")
+        version = int(entete['version'][0])
+        if version != VERSION_REFERENCES:
+            raise ValueError(f"Version de table incompatible : {version} (attendue : {VERSION_REFERENCES})")
+
+        nb_zones = int(entete['nb_zones'][0])
+        self.annee_min = int(entete['annee_min'][0])
+        self.nb_annees = int(entete['nb_annees'][0])
+        self._codes = np.memmap(chemin, dtype=f'S{_LONGUEUR_CODE}', mode='r',
+                                offset=_dtype_entete().itemsize, shape=(nb_zones,))
+        self._prix = np.memmap(chemin, dtype='<u2', mode='r', offset=_position_prix(nb_zones),
+                               shape=(nb_zones, int(entete['nb_types'][0]), self.nb_annees + 1))
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code: str) -> bool:
+        return self._ligne(code) is not None
+
+    def _ligne(self, code: str) -> Optional[int]:
+        cle = code.encode()
+        i = int(np.searchsorted(self._codes, cle))
+        return i if i < len(self._codes) and self._codes[i] == cle else None
+
+    def prix(self, code_insee: str, type_local: Optional[str] = None,
+             annee: Optional[int] = None) -> Optional[float]:
+        """
+        Prix médian au m² de la commune, sinon de son département
+
+        Faute de médiane pour le type et l'année demandés, on se replie sur
+        toutes les années, puis sur tous types confondus. None si ni la
+        commune ni le département ne figurent dans la table.
+        """
+        type_demande = TYPES_REFERENCE.index(type_local) + 1 if type_local in TYPES_REFERENCE else 0
+        annee_demandee = self.nb_annees
+        if annee is not None and 0 <= annee - self.annee_min < self.nb_annees:
+            annee_demandee = annee - self.annee_min
+        cellules = dict.fromkeys([(type_demande, annee_demandee), (type_demande, self.nb_annees),
+                                  (0, annee_demandee), (0, self.nb_annees)])
+
+        for zone in (code_insee, departement_commune(code_insee)):
+            i = self._ligne(zone)
+            if i is None:
+                continue
+            for type_local_i, annee_i in cellules:
+                valeur = int(self._prix[i, type_local_i, annee_i])
+                if valeur:
+                    return float(valeur)
+        return None
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Table des prix de référence par département et commune")
+    parser.add_argument('fichiers', nargs='+', help="Fichiers DVF CSV (.csv ou .csv.gz)")
+    parser.add_argument('--sortie', required=True, help="Fichier de sortie (ex: references_prix.bin)")
+    parser.add_argument('--chunk', type=int, default=500_000, help="Lignes lues par bloc")
+    args = parser.parse_args()
+
+    print(f"🏷️  Calcul des prix de référence à partir de {len(args.fichiers)} fichier(s)...")
+    resume = construire_references(args.fichiers, args.sortie, taille_chunk=args.chunk)
+    print(f"✅ {resume['departements']} départements, {resume['communes']:,} communes et "
+          f"{resume['transactions']:,} transactions en {resume['duree_s']} s".replace(',', ' '))
@@ -0,0 +1,343 @@
+"""
+Estimateur Immobilier - Enregistrement et rejeu des réponses DVF
+Transport HTTP de la session partagée (voir dvf_fetch.configurer_rejeu) :
+
+- en mode 'enregistrer', chaque réponse des sources DVF (statut, en-têtes,
+  corps compressé) est conservée dans une archive adressée par contenu ;
+- en mode 'rejouer', les réponses sont servies depuis l'archive sans aucun
+  accès réseau, avec latence et taux d'erreur (429/503) injectables.
+
+Le rejeu reproduit le comportement d'un serveur : relances et Retry-After de
+la session, requêtes conditionnelles (304 si l'ETag ou la date correspond),
+délai d'attente dépassé si la latence excède le timeout. Les erreurs sont
+tirées de façon déterministe par URL et par tentative (`graine`).
+
+Archive : index/{clé}.json (requête -> réponse) et objets/{sha256}.gz (corps
+gzip, partagés entre requêtes de même contenu).
+
+Usage :
+    python dvf_rejeu.py enregistrer --archive ./archive_dvf 33063 75056 --annees 2022-2023
+    python dvf_rejeu.py stats --archive ./archive_dvf
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from urllib3 import HTTPResponse
+
+from dvf_fetch import STATUTS_A_RELANCER, EchecNonRelancable, _AdaptateurLimite
+
+# Statuts d'erreur injectés en rejeu
+STATUTS_INJECTES = (429, 503)
+
+# En-têtes propres à la connexion ou à l'encodage, non archivés
+_ENTETES_IGNORES = frozenset({
+    'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+    'content-length', 'date', 'set-cookie',
+})
+
+
+# ============================================================================
+# ARCHIVE ADRESSÉE PAR CONTENU
+# ============================================================================
+
+class ArchiveReponses:
+    """
+    Réponses HTTP indexées par (méthode, URL normalisée)
+
+    Les corps sont stockés une seule fois, compressés, sous le SHA-256 du
+    contenu décodé ; une entrée d'index ne référence que cette empreinte.
+    Les écritures sont atomiques (fichier temporaire puis renommage).
+    """
+
+    def __init__(self, repertoire: str):
+        self.repertoire = repertoire
+        os.makedirs(os.path.join(repertoire, 'index'), exist_ok=True)
+        os.makedirs(os.path.join(repertoire, 'objets'), exist_ok=True)
+
+    @staticmethod
+    def cle(methode: str, url: str) -> str:
+        """Empreinte de la requête : paramètres de l'URL triés"""
+        parties = urlsplit(url)
+        requete = urlencode(sorted(parse_qsl(parties.query, keep_blank_values=True)))
+        normalisee = urlunsplit((parties.scheme, parties.netloc.lower(), parties.path, requete, ''))
+        return hashlib.sha256(f"{methode.upper()} {normalisee}".encode()).hexdigest()
+
+    def lire(self, methode: str, url: str) -> Optional[Dict]:
+        """Entrée d'index (statut, en-têtes, empreinte du corps), None si absente"""
+        try:
+            with open(self._chemin_index(self.cle(methode, url)), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def corps_compresse(self, entree: Dict) -> bytes:
+        """Corps gzip d'une entrée (vide si la réponse n'en avait pas)"""
+        if not entree['corps']:
+            return b''
+        with open(self._chemin_objet(entree['corps']), 'rb') as f:
+            return f.read()
+
+    def enregistrer(self, methode: str, url: str, statut: int, entetes: Dict[str, str],
+                    corps: bytes) -> Tuple[Dict, bytes]:
+        """
+        Archive une réponse (corps décodé) et retourne (entrée, corps compressé)
+
+        Un corps déjà présent dans l'archive n'est pas réécrit.
+        """
+        empreinte, compresse = '', b''
+        if corps:
+            empreinte = hashlib.sha256(corps).hexdigest()
+            chemin = self._chemin_objet(empreinte)
+            if os.path.exists(chemin):
+                with open(chemin, 'rb') as f:
+                    compresse = f.read()
+            else:
+                # mtime=0 : même contenu, même fichier
+                compresse = gzip.compress(corps, mtime=0)
+                self._ecrire(chemin, compresse)
+
+        entree = {
+            'methode': methode.upper(),
+            'url': url,
+            'statut': statut,
+            'entetes': {nom: valeur for nom, valeur in entetes.items() if nom.lower() not in _ENTETES_IGNORES},
+            'corps': empreinte,
+            'taille': len(corps),
+            'enregistre_le': time.time(),
+        }
+        self._ecrire(self._chemin_index(self.cle(methode, url)),
+                     json.dumps(entree, ensure_ascii=False, indent=1).encode('utf-8'))
+        return entree, compresse
+
+    def stats(self) -> Dict:
+        """Nombre de réponses et d'objets, octets compressés et décodés"""
+        reponses = decodes = 0
+        for racine, _, fichiers in os.walk(os.path.join(self.repertoire, 'index')):
+            for fichier in fichiers:
+                if fichier.endswith('.json'):
+                    reponses += 1
+        objets = compresses = 0
+        for racine, _, fichiers in os.walk(os.path.join(self.repertoire, 'objets')):
+            for fichier in fichiers:
+                if fichier.endswith('.gz'):
+                    objets += 1
+                    chemin = os.path.join(racine, fichier)
+                    compresses += os.path.getsize(chemin)
+                    with open(chemin, 'rb') as f:
+                        # Taille décodée : 4 derniers octets du gzip (modulo 2^32)
+                        f.seek(-4, os.SEEK_END)
+                        decodes += int.from_bytes(f.read(4), 'little')
+        return {'reponses': reponses, 'objets': objets, 'octets': compresses, 'octets_decodes': decodes}
+
+    def _chemin_index(self, cle: str) -> str:
+        return os.path.join(self.repertoire, 'index', cle[:2], f"{cle}.json")
+
+    def _chemin_objet(self, empreinte: str) -> str:
+        return os.path.join(self.repertoire, 'objets', empreinte[:2], f"{empreinte}.gz")
+
+    @staticmethod
+    def _ecrire(chemin: str, contenu: bytes) -> None:
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporaire, 'wb') as f:
+                f.write(contenu)
+            os.replace(temporaire, chemin)
+        except OSError:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+            raise
+
+
+# ============================================================================
+# ADAPTATEURS HTTP
+# ============================================================================
+
+def _reponse_urllib3(request, statut: int, entetes: Dict[str, str], compresse: bytes) -> HTTPResponse:
+    """Réponse servie comme par un serveur : corps gzip décodé à la lecture"""
+    entetes = dict(entetes)
+    if compresse:
+        entetes['Content-Encoding'] = 'gzip'
+    entetes['Content-Length'] = str(len(compresse))
+    return HTTPResponse(body=BytesIO(compresse), headers=entetes, status=statut, preload_content=False,
+                        decode_content=True, request_method=request.method, request_url=request.url)
+
+
+class AdaptateurEnregistrement(_AdaptateurLimite):
+    """Envoie les requêtes au réseau et archive chaque réponse définitive"""
+
+    def __init__(self, archive: ArchiveReponses, limiteur=None, **kwargs):
+        self.archive = archive
+        super().__init__(limiteur, **kwargs)
+
+    def send(self, request, **kwargs):
+        reponse = super().send(request, **kwargs)
+        # 304 : pas de corps à archiver ; 429/5xx : erreur passagère, injectée au rejeu
+        if reponse.status_code == 304 or reponse.status_code in STATUTS_A_RELANCER:
+            return reponse
+
+        corps = reponse.content
+        entree, compresse = self.archive.enregistrer(request.method, request.url, reponse.status_code,
+                                                     dict(reponse.headers), corps)
+        # Le corps a été lu : la réponse est reconstruite pour rester lisible en flux
+        return self.build_response(request, _reponse_urllib3(request, entree['statut'],
+                                                             entree['entetes'], compresse))
+
+
+class AdaptateurRejeu(_AdaptateurLimite):
+    """
+    Sert les réponses archivées sans accès réseau
+
+    Chaque tentative attend `latence` secondes puis échoue en 429/503 avec la
+    probabilité `taux_erreur` ; les relances de la session (voir `_AdaptateurLimite`)
+    s'appliquent comme sur le réseau. Une requête absente de l'archive lève
+    ConnectionError (`EchecNonRelancable`), sans nouvelle tentative.
+    """
+
+    def __init__(self, archive: ArchiveReponses, limiteur=None, latence: float = 0.0,
+                 taux_erreur: float = 0.0, graine: int = 0, **kwargs):
+        self.archive = archive
+        self.latence = latence
+        self.taux_erreur = taux_erreur
+        self.graine = graine
+        self.nb_requetes = 0
+        self.nb_erreurs_injectees = 0
+        self._tentatives: Dict[str, int] = {}
+        self._verrou = threading.Lock()
+        super().__init__(limiteur, **kwargs)
+
+    def _tentative(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        return self.build_response(request, self._rejouer(request, timeout))
+
+    def _rejouer(self, request, timeout) -> HTTPResponse:
+        """Une tentative : latence, erreur éventuelle, puis réponse archivée"""
+        with self._verrou:
+            self.nb_requetes += 1
+            tentative = self._tentatives.get(request.url, 0)
+            self._tentatives[request.url] = tentative + 1
+
+        if self.latence:
+            delai_lecture = timeout[1] if isinstance(timeout, tuple) else timeout
+            if delai_lecture is not None and self.latence > delai_lecture:
+                time.sleep(delai_lecture)
+                raise requests.exceptions.ReadTimeout(f"Délai dépassé (rejeu) : {request.url}", request=request)
+            time.sleep(self.latence)
+
+        if self.taux_erreur and self._tirage(request.url, tentative) < self.taux_erreur:
+            with self._verrou:
+                self.nb_erreurs_injectees += 1
+            statut = STATUTS_INJECTES[tentative % len(STATUTS_INJECTES)]
+            return _reponse_urllib3(request, statut, {'Retry-After': '0'}, b'')
+
+        entree = self.archive.lire(request.method, request.url)
+        if entree is None:
+            raise EchecNonRelancable(f"Réponse absente de l'archive : {request.url}", request=request)
+        if _non_modifie(request.headers, entree['entetes']):
+            return _reponse_urllib3(request, 304, entree['entetes'], b'')
+        return _reponse_urllib3(request, entree['statut'], entree['entetes'], self.archive.corps_compresse(entree))
+
+    def _tirage(self, url: str, tentative: int) -> float:
+        """Nombre dans [0, 1) fixé par (graine, URL, tentative) : indépendant de l'ordre des threads"""
+        return zlib.crc32(f"{self.graine}:{tentative}:{url}".encode()) / 2 ** 32
+
+
+def _non_modifie(entetes_requete, entetes_reponse: Dict[str, str]) -> bool:
+    """Requête conditionnelle satisfaite par la réponse archivée (If-None-Match prime)"""
+    reponse = requests.structures.CaseInsensitiveDict(entetes_reponse)
+    if_none_match = entetes_requete.get('If-None-Match')
+    if if_none_match is not None:
+        return reponse.get('ETag') in (v.strip() for v in if_none_match.split(','))
+    if_modified_since = entetes_requete.get('If-Modified-Since')
+    if if_modified_since is not None and reponse.get('Last-Modified'):
+        try:
+            return parsedate_to_datetime(reponse['Last-Modified']) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def creer_adaptateur(rejeu: Dict, limiteur=None, **kwargs) -> _AdaptateurLimite:
+    """Adaptateur du mode configuré (voir dvf_fetch.configurer_rejeu)"""
+    archive = ArchiveReponses(rejeu['archive'])
+    if rejeu['mode'] == 'enregistrer':
+        return AdaptateurEnregistrement(archive, limiteur, **kwargs)
+    return AdaptateurRejeu(archive, limiteur, latence=rejeu['latence'], taux_erreur=rejeu['taux_erreur'],
+                           graine=rejeu['graine'], **kwargs)
+
+
+# ============================================================================
+# ENREGISTREMENT DE COMMUNES
+# ============================================================================
+
+def enregistrer_communes(archive: str, codes_insee: Iterable[str], workers: int = 8) -> Dict:
+    """
+    Interroge les deux sources pour chaque commune et archive leurs réponses
+
+    Le cache disque est désactivé pour que chaque millésime soit réellement
+    demandé ; DVF+ est interrogée même si data.gouv.fr répond, afin que le
+    repli puisse être rejoué.
+
+    Returns:
+        Résumé : communes, communes sans données, durée et contenu de l'archive
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import dvf_backend as backend
+    from dvf_fetch import configurer_rejeu
+
+    backend.configurer_cache(actif=False)
+    configurer_rejeu(archive, mode='enregistrer')
+
+    def enregistrer(code_insee: str) -> bool:
+        df_datagouv, _ = backend._tentative_api_datagouv(code_insee)
+        df_dvfplus, _ = backend._tentative_api_dvfplus(code_insee)
+        return not (df_datagouv.empty and df_dvfplus.empty)
+
+    codes = list(dict.fromkeys(codes_insee))
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executeur:
+        trouvees = list(executeur.map(enregistrer, codes))
+
+    return dict(ArchiveReponses(archive).stats(), communes=len(codes),
+                sans_donnees=trouvees.count(False), duree_s=round(time.perf_counter() - debut, 2))
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enregistrement et rejeu des réponses DVF")
+    sous_parsers = parser.add_subparsers(dest='commande', required=True)
+    p_enregistrer = sous_parsers.add_parser('enregistrer', help="Archive les réponses des sources DVF")
+    p_enregistrer.add_argument('codes', nargs='+', help="Codes INSEE des communes")
+    p_enregistrer.add_argument('--archive', required=True, help="Répertoire de l'archive")
+    p_enregistrer.add_argument('--annees', help="Millésimes (ex: 2022-2023 ou 2022,2023)")
+    p_enregistrer.add_argument('--workers', type=int, default=8, help="Communes interrogées simultanément")
+    p_stats = sous_parsers.add_parser('stats', help="Contenu de l'archive")
+    p_stats.add_argument('--archive', required=True, help="Répertoire de l'archive")
+    args = parser.parse_args()
+
+    if args.commande == 'enregistrer':
+        if args.annees:
+            os.environ['DVF_ANNEES'] = args.annees
+        resume = enregistrer_communes(args.archive, args.codes, args.workers)
+        print(f"✅ {resume['communes']} commune(s) ({resume['sans_donnees']} sans données) en "
+              f"{resume['duree_s']} s : {resume['reponses']} réponses, {resume['objets']} objets, "
+              f"{resume['octets'] / 1e6:.1f} Mo")
+    else:
+        resume = ArchiveReponses(args.archive).stats()
+        print(f"📦 {resume['reponses']} réponses, {resume['objets']} objets, {resume['octets'] / 1e6:.1f} Mo "
+              f"compressés ({resume['octets_decodes'] / 1e6:.1f} Mo décodés)")
@@ -0,0 +1,195 @@
+"""
+Estimateur Immobilier - Résultats d'estimation compacts
+`Estimation` : résultat d'un bien, sans dictionnaire par instance, qui
+référence l'analyse de marché de sa commune au lieu d'en recopier les
+statistiques et l'évolution. `EstimationsLot` : résultats d'un lot rangés en
+colonnes NumPy (une par champ), convertis en DataFrame, table Arrow ou
+fichier Parquet sans objet Python par bien.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# ============================================================================
+# ESTIMATION D'UN BIEN
+# ============================================================================
+
+class Estimation:
+    """
+    Estimation d'un bien
+
+    Se lit aussi comme l'ancien dictionnaire (`estimation['valeur_estimee']`,
+    `estimation['stats']`...) ; `stats`, `evolution`, `intervalle` et `dispersion` sont lus
+    dans `analyse`, partagée par toutes les estimations de la commune.
+    """
+
+    __slots__ = ('valeur_estimee', 'fourchette_basse', 'fourchette_haute', 'prix_moyen_m2',
+                 'coefficient', 'tendance', 'mode', 'analyse', 'comparables')
+
+    # Clés de l'ancien dictionnaire, dans son ordre ('comparables' si renseigné)
+    CLES = ('valeur_estimee', 'fourchette_basse', 'fourchette_haute', 'prix_moyen_m2',
+            'coefficient', 'stats', 'evolution', 'tendance', 'mode', 'comparables')
+
+    def __init__(self, valeur_estimee: int, fourchette_basse: int, fourchette_haute: int,
+                 prix_moyen_m2: int, coefficient: float, tendance: int, mode: str,
+                 analyse: Dict, comparables: Optional[pd.DataFrame] = None):
+        self.valeur_estimee = valeur_estimee
+        self.fourchette_basse = fourchette_basse
+        self.fourchette_haute = fourchette_haute
+        self.prix_moyen_m2 = prix_moyen_m2
+        self.coefficient = coefficient
+        self.tendance = tendance
+        self.mode = mode
+        self.analyse = analyse
+        # Ventes retenues par le mode 'comparables'
+        self.comparables = comparables
+
+    @property
+    def stats(self) -> Dict:
+        return self.analyse['stats']
+
+    @property
+    def evolution(self) -> pd.DataFrame:
+        return self.analyse['evolution']
+
+    @property
+    def intervalle(self) -> Optional[Dict]:
+        return self.analyse.get('intervalle')
+
+    @property
+    def dispersion(self) -> Optional[Dict]:
+        return self.analyse.get('dispersion')
+
+    # ------------------------------------------------------------------
+    # Accès par clé (compatibilité avec le dictionnaire)
+    # ------------------------------------------------------------------
+
+    def keys(self) -> List[str]:
+        return [cle for cle in self.CLES if cle != 'comparables' or self.comparables is not None]
+
+    def __getitem__(self, cle: str):
+        if cle not in self.keys():
+            raise KeyError(cle)
+        return getattr(self, cle)
+
+    def __contains__(self, cle: str) -> bool:
+        return cle in self.keys()
+
+    def get(self, cle: str, defaut=None):
+        return getattr(self, cle) if cle in self.keys() else defaut
+
+    def vers_dict(self) -> Dict:
+        """Dictionnaire des champs (sérialisation JSON...)"""
+        return {cle: getattr(self, cle) for cle in self.keys()}
+
+    def __repr__(self) -> str:
+        return (f"Estimation(valeur_estimee={self.valeur_estimee}, fourchette=[{self.fourchette_basse}, "
+                f"{self.fourchette_haute}], prix_moyen_m2={self.prix_moyen_m2}, mode={self.mode!r})")
+
+
+# ============================================================================
+# ESTIMATIONS D'UN LOT (COLONNES)
+# ============================================================================
+
+class EstimationsLot:
+    """
+    Estimations d'un lot de biens, une colonne NumPy par champ
+
+    Les colonnes entières valent 0 pour les biens non estimés (`valide` à
+    False). Les avertissements sont encodés par dictionnaire :
+    `codes_avertissement` (int32, -1 sans avertissement) indexe `avertissements`.
+    """
+
+    __slots__ = ('valeur_estimee', 'fourchette_basse', 'fourchette_haute', 'prix_moyen_m2',
+                 'coefficient', 'tendance', 'nb_transactions', 'valide',
+                 'codes_avertissement', 'avertissements', 'index')
+
+    def __init__(self, valeur_estimee: np.ndarray, fourchette_basse: np.ndarray,
+                 fourchette_haute: np.ndarray, prix_moyen_m2: np.ndarray, coefficient: np.ndarray,
+                 tendance: np.ndarray, nb_transactions: np.ndarray, valide: np.ndarray,
+                 codes_avertissement: np.ndarray, avertissements: Sequence[str],
+                 index: Optional[pd.Index] = None):
+        self.valeur_estimee = valeur_estimee
+        self.fourchette_basse = fourchette_basse
+        self.fourchette_haute = fourchette_haute
+        self.prix_moyen_m2 = prix_moyen_m2
+        self.coefficient = coefficient
+        self.tendance = tendance
+        self.nb_transactions = nb_transactions
+        self.valide = valide
+        self.codes_avertissement = codes_avertissement
+        self.avertissements = list(avertissements)
+        # Index des biens d'origine (repris par vers_dataframe)
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.valide)
+
+    def avertissement(self, i: int) -> Optional[str]:
+        code = self.codes_avertissement[i]
+        return None if code < 0 else self.avertissements[code]
+
+    # ------------------------------------------------------------------
+    # Conversions
+    # ------------------------------------------------------------------
+
+    def vers_dataframe(self) -> pd.DataFrame:
+        """
+        DataFrame valeur_estimee, fourchette_basse, fourchette_haute,
+        prix_moyen_m2, coefficient, tendance, nb_transactions, avertissement
+        (entiers nullables, avertissement None si données réelles)
+        """
+        entiers = self._entiers
+        # Code -1 (sans avertissement) : dernier élément, None
+        messages = np.array(self.avertissements + [None], dtype=object)
+        colonnes = {
+            'valeur_estimee': entiers(self.valeur_estimee),
+            'fourchette_basse': entiers(self.fourchette_basse),
+            'fourchette_haute': entiers(self.fourchette_haute),
+            'prix_moyen_m2': entiers(self.prix_moyen_m2),
+            'coefficient': self.coefficient,
+            'tendance': entiers(self.tendance),
+            'nb_transactions': self.nb_transactions,
+            'avertissement': pd.Series(messages[self.codes_avertissement], index=self.index, dtype=object),
+        }
+        return pd.DataFrame(colonnes, index=self.index)
+
+    def vers_arrow(self):
+        """Table Arrow (pyarrow) ; avertissement en colonne dictionnaire"""
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow est requis pour l'export Arrow/Parquet (pip install pyarrow)")
+
+        manquants = ~self.valide
+        return pa.table({
+            'valeur_estimee': pa.array(self.valeur_estimee, mask=manquants),
+            'fourchette_basse': pa.array(self.fourchette_basse, mask=manquants),
+            'fourchette_haute': pa.array(self.fourchette_haute, mask=manquants),
+            'prix_moyen_m2': pa.array(self.prix_moyen_m2, mask=manquants),
+            'coefficient': pa.array(self.coefficient),
+            'tendance': pa.array(self.tendance, mask=manquants),
+            'nb_transactions': pa.array(self.nb_transactions),
+            'avertissement': pa.DictionaryArray.from_arrays(
+                pa.array(self.codes_avertissement, mask=self.codes_avertissement < 0),
+                pa.array(self.avertissements, type=pa.string())
+            ),
+        })
+
+    def ecrire_parquet(self, chemin: str, **options) -> None:
+        """Écrit les estimations dans un fichier Parquet (options de pyarrow.parquet.write_table)"""
+        table = self.vers_arrow()
+        import pyarrow.parquet as pq
+        pq.write_table(table, chemin, **options)
+
+    def _entiers(self, valeurs: np.ndarray) -> pd.arrays.IntegerArray:
+        # Entiers nullables sans copie : valeurs et masque des biens non estimés
+        return pd.arrays.IntegerArray(valeurs, ~self.valide)
@@ -0,0 +1,259 @@
+"""
+Estimateur Immobilier - Serveur DVF local de substitution
+Sert des CSV DVF (fichiers de fixtures ou générés) aux mêmes chemins que
+files.data.gouv.fr et app.dvf.etalab.gouv.fr, pour tester la récupération
+sans réseau. Latence et taux d'erreur (429/503) injectables ; les CSV portent
+ETag et Last-Modified et les requêtes conditionnelles reçoivent un 304.
+
+Usage :
+    python dvf_serveur_local.py --port 8765 --fixtures ./fixtures
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+
+# Colonnes d'un fichier geo-dvf communal, dans l'ordre officiel
+COLONNES_GEO_DVF = [
+    'id_mutation', 'date_mutation', 'numero_disposition', 'nature_mutation',
+    'valeur_fonciere', 'adresse_numero', 'adresse_suffixe', 'adresse_nom_voie',
+    'adresse_code_voie', 'code_postal', 'code_commune', 'nom_commune',
+    'code_departement', 'ancien_code_commune', 'ancien_nom_commune', 'id_parcelle',
+    'ancien_id_parcelle', 'numero_volume', 'lot1_numero', 'lot1_surface_carrez',
+    'lot2_numero', 'lot2_surface_carrez', 'lot3_numero', 'lot3_surface_carrez',
+    'lot4_numero', 'lot4_surface_carrez', 'lot5_numero', 'lot5_surface_carrez',
+    'nombre_lots', 'code_type_local', 'type_local', 'surface_reelle_bati',
+    'nombre_pieces_principales', 'code_nature_culture', 'nature_culture',
+    'code_nature_culture_speciale', 'nature_culture_speciale', 'surface_terrain',
+    'longitude', 'latitude',
+]
+
+_CHEMIN_DATAGOUV = re.compile(r'^/geo-dvf/latest/csv/(\d{4})/communes/([0-9AB]+)/([0-9AB]+)\.csv$')
+_CHEMIN_DVFPLUS = '/api/v1/search'
+
+
+def generer_dataframe_dvf(code_insee: str, annee: int, nb_lignes: int = 500,
+                          prix_m2: float = 3500.0) -> pd.DataFrame:
+    """
+    Génère un fichier geo-dvf réaliste (toutes colonnes) pour une commune
+
+    Le contenu est déterministe pour un couple (code INSEE, année) donné.
+    Environ 15% des lignes sont des mutations écartées par le filtrage
+    (dépendances, échanges, surfaces manquantes).
+    """
+    rng = np.random.default_rng(zlib.crc32(f"{code_insee}-{annee}".encode()))
+    n = nb_lignes
+
+    type_local = rng.choice(['Appartement', 'Maison', 'Dépendance', 'Local industriel. commercial ou assimilé'],
+                            size=n, p=[0.55, 0.33, 0.09, 0.03])
+    surface = np.round(np.where(type_local == 'Maison', rng.uniform(60, 200, n), rng.uniform(15, 120, n)))
+    pieces = np.clip(np.round(surface / 22), 1, 10).astype(int)
+    valeur = np.round(surface * prix_m2 * rng.lognormal(0, 0.25, n), -2)
+    dates = pd.Timestamp(f"{annee}-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+
+    df = pd.DataFrame({c: pd.Series([None] * n, dtype=object) for c in COLONNES_GEO_DVF})
+    df['id_mutation'] = [f"{annee}-{i + 1}" for i in range(n)]
+    df['date_mutation'] = dates.strftime('%Y-%m-%d')
+    df['numero_disposition'] = 1
+    df['nature_mutation'] = rng.choice(['Vente', "Vente en l'état futur d'achèvement", 'Echange'],
+                                       size=n, p=[0.92, 0.05, 0.03])
+    df['valeur_fonciere'] = valeur
+    df['adresse_nom_voie'] = 'RUE DE LA REPUBLIQUE'
+    df['code_commune'] = code_insee
+    df['nom_commune'] = f"Commune {code_insee}"
+    df['code_departement'] = code_insee[:3] if code_insee.startswith('97') else code_insee[:2]
+    df['type_local'] = type_local
+    df['surface_reelle_bati'] = np.where(rng.random(n) < 0.03, np.nan, surface)
+    df['nombre_pieces_principales'] = pieces
+    df['longitude'] = np.round(-0.57 + rng.normal(0, 0.02, n), 6)
+    df['latitude'] = np.round(44.84 + rng.normal(0, 0.015, n), 6)
+    return df
+
+
+def generer_csv_dvf(code_insee: str, annee: int, nb_lignes: int = 500, prix_m2: float = 3500.0) -> bytes:
+    """CSV geo-dvf généré (voir `generer_dataframe_dvf`)"""
+    tampon = StringIO()
+    generer_dataframe_dvf(code_insee, annee, nb_lignes, prix_m2).to_csv(tampon, index=False)
+    return tampon.getvalue().encode('utf-8')
+
+
+class ServeurDVFLocal:
+    """
+    Serveur HTTP local imitant les deux sources DVF
+
+    Les CSV sont lus dans `repertoire_fixtures` ({annee}/{code}.csv puis
+    {code}.csv) ; à défaut, ils sont générés si `generer` est vrai, sinon 404.
+    """
+
+    def __init__(self, repertoire_fixtures: Optional[str] = None, port: int = 0,
+                 generer: bool = True, nb_lignes: int = 500,
+                 latence: float = 0.0, taux_erreur: float = 0.0):
+        self.repertoire_fixtures = repertoire_fixtures
+        self.generer = generer
+        self.nb_lignes = nb_lignes
+        self.latence = latence
+        self.taux_erreur = taux_erreur
+        self.nb_requetes = 0
+        self.nb_non_modifies = 0
+        self._demarre_le = time.time()
+        self._verrou = threading.Lock()
+        self._serveur = ThreadingHTTPServer(('127.0.0.1', port), self._fabriquer_handler())
+        self._serveur.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._serveur.server_address[1]
+
+    @property
+    def url_datagouv(self) -> str:
+        """Gabarit d'URL à utiliser à la place de files.data.gouv.fr"""
+        return (f"http://127.0.0.1:{self.port}/geo-dvf/latest/csv/{{annee}}"
+                f"/communes/{{dept}}/{{code_insee}}.csv")
+
+    @property
+    def url_dvfplus(self) -> str:
+        """Gabarit d'URL à utiliser à la place de l'API DVF+"""
+        return f"http://127.0.0.1:{self.port}{_CHEMIN_DVFPLUS}?code_commune={{code_insee}}"
+
+    def demarrer(self) -> 'ServeurDVFLocal':
+        self._thread = threading.Thread(target=self._serveur.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def arreter(self) -> None:
+        self._serveur.shutdown()
+        self._serveur.server_close()
+
+    def __enter__(self) -> 'ServeurDVFLocal':
+        return self.demarrer()
+
+    def __exit__(self, *exc) -> None:
+        self.arreter()
+
+    def contenu_csv(self, code_insee: str, annee: int) -> Optional[bytes]:
+        """Corps CSV servi pour une commune et une année"""
+        version = self._version_csv(code_insee, annee)
+        return version[0] if version is not None else None
+
+    def _version_csv(self, code_insee: str, annee: int) -> Optional[Tuple[bytes, float]]:
+        """(corps CSV, date de modification) : celle du fichier, ou le démarrage pour un CSV généré"""
+        if self.repertoire_fixtures:
+            for chemin in (os.path.join(self.repertoire_fixtures, str(annee), f"{code_insee}.csv"),
+                           os.path.join(self.repertoire_fixtures, f"{code_insee}.csv")):
+                if os.path.exists(chemin):
+                    with open(chemin, 'rb') as f:
+                        return f.read(), os.path.getmtime(chemin)
+        if self.generer:
+            return generer_csv_dvf(code_insee, annee, self.nb_lignes), self._demarre_le
+        return None
+
+    def _fabriquer_handler(self):
+        serveur = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with serveur._verrou:
+                    serveur.nb_requetes += 1
+
+                if serveur.latence:
+                    time.sleep(serveur.latence)
+                if serveur.taux_erreur and random.random() < serveur.taux_erreur:
+                    statut = random.choice((429, 503))
+                    self._repondre(statut, b'', 'text/plain', {'Retry-After': '0'})
+                    return
+
+                url = urlsplit(self.path)
+                correspondance = _CHEMIN_DATAGOUV.match(url.path)
+                if correspondance:
+                    annee, _, code_insee = correspondance.groups()
+                    version = serveur._version_csv(code_insee, int(annee))
+                    if version is None:
+                        self._repondre(404, b'', 'text/plain')
+                        return
+                    corps, modifie_le = version
+                    entetes = {
+                        'ETag': f'"{zlib.crc32(corps):08x}-{len(corps):x}"',
+                        'Last-Modified': formatdate(modifie_le, usegmt=True),
+                    }
+                    if self._non_modifie(entetes['ETag'], modifie_le):
+                        with serveur._verrou:
+                            serveur.nb_non_modifies += 1
+                        self._repondre(304, b'', 'text/csv', entetes)
+                    else:
+                        self._repondre(200, corps, 'text/csv', entetes)
+                    return
+
+                if url.path == _CHEMIN_DVFPLUS:
+                    code_insee = parse_qs(url.query).get('code_commune', [''])[0]
+                    corps = serveur.contenu_csv(code_insee, 2023)
+                    resultats = [] if corps is None else json.loads(
+                        pd.read_csv(StringIO(corps.decode('utf-8'))).to_json(orient='records'))
+                    self._repondre(200, json.dumps({'results': resultats}).encode('utf-8'),
+                                   'application/json')
+                    return
+
+                self._repondre(404, b'', 'text/plain')
+
+            def _non_modifie(self, etag: str, modifie_le: float) -> bool:
+                # If-None-Match prime sur If-Modified-Since (RFC 9110)
+                if_none_match = self.headers.get('If-None-Match')
+                if if_none_match is not None:
+                    return etag in (v.strip() for v in if_none_match.split(','))
+                if_modified_since = self.headers.get('If-Modified-Since')
+                if if_modified_since is not None:
+                    try:
+                        return int(modifie_le) <= parsedate_to_datetime(if_modified_since).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                return False
+
+            def _repondre(self, statut, corps, type_contenu, entetes=None):
+                self.send_response(statut)
+                self.send_header('Content-Type', type_contenu)
+                self.send_header('Content-Length', str(len(corps)))
+                for nom, valeur in (entetes or {}).items():
+                    self.send_header(nom, valeur)
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur DVF local de substitution")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help="Répertoire de CSV DVF ({annee}/{code}.csv ou {code}.csv)")
+    parser.add_argument('--lignes', type=int, default=500, help="Lignes des CSV générés")
+    parser.add_argument('--latence', type=float, default=0.0, help="Latence injectée (s)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="Part de réponses 429/503")
+    args = parser.parse_args()
+
+    serveur = ServeurDVFLocal(args.fixtures, port=args.port, nb_lignes=args.lignes,
+                              latence=args.latence, taux_erreur=args.taux_erreur)
+    print(f"🛰️  Serveur DVF local sur http://127.0.0.1:{serveur.port}")
+    print(f"   DVF_URL_DATAGOUV={serveur.url_datagouv}")
+    print(f"   DVF_URL_DVFPLUS={serveur.url_dvfplus}")
+    try:
+        serveur._serveur.serve_forever()
+    except KeyboardInterrupt:
+        serveur._serveur.server_close()
@@ -0,0 +1,309 @@
+"""
+Estimateur Immobilier - Service HTTP d'estimation (ASGI)
+Expose `estimer_bien` (bien seul) et `estimer_biens` (lot) en JSON. Les demandes
+simultanées d'une même commune partagent une seule récupération (single-flight)
+et les analyses sont conservées en mémoire pour tout le processus ; le cache
+disque des transactions est commun à tous les processus workers.
+
+Usage :
+    python dvf_service.py --port 8000 --workers 4
+    uvicorn dvf_service:app --workers 4
+
+Endpoints :
+    GET  /sante
+    POST /estimation    {"code_insee": "33063", "surface": 75, "pieces": 3, "standing": "Standard"}
+                        (facultatifs : "mode": "comparables", "hedonique" ou "recent", "type_local",
+                         "latitude", "longitude")
+    POST /estimations   {"biens": [{"code_insee": ..., "surface": ..., ...}, ...]}
+    GET  /metriques     (format texte Prometheus)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dvf_backend import (
+    BienImmobilier, MODES_ESTIMATION, Standing,
+    estimer_bien_async, estimer_biens, estimer_depuis_analyse, estimer_par_marche, estimer_par_modele
+)
+from dvf_chargements import ChargementsAnalyses
+from dvf_metriques import METRIQUES
+from dvf_resultats import Estimation
+
+
+logger = logging.getLogger(__name__)
+
+# Durée de conservation d'une analyse de marché dans le processus (secondes)
+TTL_ANALYSES = float(os.environ.get('DVF_SERVICE_TTL', 3600))
+# Threads de chargement des analyses par processus
+THREADS_CHARGEMENT = int(os.environ.get('DVF_SERVICE_THREADS', 16))
+# Délai avant d'interroger la source DVF secondaire en parallèle (secondes)
+DELAI_HEDGE = 1.0
+# Latence maximale d'une récupération avant bascule sur les données simulées (secondes)
+DEADLINE_ESTIMATION = 8.0
+# Nombre maximal de biens par requête de lot
+TAILLE_MAX_LOT = 10_000
+# Taille maximale d'un corps de requête (octets)
+TAILLE_MAX_CORPS = 10 * 1024 * 1024
+# Estimation à partir de l'analyse d'une commune, par mode (défaut : moyenne communale)
+ESTIMATEURS_ANALYSE = {'hedonique': estimer_par_modele, 'recent': estimer_par_marche}
+
+
+class RequeteInvalide(ValueError):
+    """Corps ou paramètres de requête invalides (réponse 400)"""
+
+
+# ============================================================================
+# CHARGEMENTS PARTAGÉS
+# ============================================================================
+
+_chargements: Optional[ChargementsAnalyses] = None
+
+
+def obtenir_chargements() -> ChargementsAnalyses:
+    """Chargements des analyses du processus (créés au premier appel)"""
+    global _chargements
+    if _chargements is None:
+        _chargements = ChargementsAnalyses(
+            workers=THREADS_CHARGEMENT,
+            ttl=TTL_ANALYSES,
+            delai_hedge=DELAI_HEDGE,
+            deadline=DEADLINE_ESTIMATION
+        )
+    return _chargements
+
+
+# ============================================================================
+# ENDPOINTS
+# ============================================================================
+
+async def _sante(_: Optional[Dict]) -> Tuple[int, Dict]:
+    return 200, {'statut': 'ok', 'pid': os.getpid(), 'chargements': obtenir_chargements().stats()}
+
+
+async def _estimation(donnees: Optional[Dict]) -> Tuple[int, Dict]:
+    """Estimation d'un bien : {"estimation": {...} ou null, "avertissement": ...}"""
+    donnees = _objet(donnees)
+    bien = _lire_bien(donnees)
+    
+    mode = donnees.get('mode', 'moyenne')
+    if mode not in MODES_ESTIMATION:
+        raise RequeteInvalide(f"Mode inconnu : {mode}")
+    if mode == 'comparables':
+        # Transactions relues du cache disque, index de comparables mémorisé par commune
+        estimation, warning = await estimer_bien_async(
+            bien.ville, bien.code_insee, bien.surface_habitable, bien.nombre_pieces, bien.standing,
+            delai_hedge=DELAI_HEDGE, deadline=DEADLINE_ESTIMATION, mode=mode,
+            type_local=bien.type_local, latitude=bien.latitude, longitude=bien.longitude
+        )
+        return 200, {'estimation': estimation, 'avertissement': warning}
+
+    analyse, warning = await obtenir_chargements().obtenir(bien.code_insee)
+    estimation = None
+    if analyse is not None:
+        estimer = ESTIMATEURS_ANALYSE.get(mode, estimer_depuis_analyse)
+        estimation, warning = estimer(bien, analyse, warning)
+
+    return 200, {'estimation': estimation, 'avertissement': warning}
+
+
+async def _estimations(donnees: Optional[Dict]) -> Tuple[int, Dict]:
+    """Estimation d'un lot : {"resultats": [...]} dans l'ordre des biens reçus"""
+    biens = _objet(donnees).get('biens')
+    if not isinstance(biens, list) or not biens:
+        raise RequeteInvalide("'biens' doit être une liste non vide")
+    if len(biens) > TAILLE_MAX_LOT:
+        raise RequeteInvalide(f"Au plus {TAILLE_MAX_LOT} biens par requête")
+
+    lignes = [_lire_bien(_objet(b)) for b in biens]
+    df = pd.DataFrame({
+        'code_insee': [b.code_insee for b in lignes],
+        'surface': [b.surface_habitable for b in lignes],
+        'pieces': [b.nombre_pieces for b in lignes],
+        'standing': [b.standing for b in lignes],
+    })
+
+    # Une analyse par commune distincte, partagée avec les requêtes concurrentes
+    codes = list(dict.fromkeys(df['code_insee']))
+    analyses = await asyncio.gather(*(obtenir_chargements().obtenir(code) for code in codes))
+
+    resultats = await asyncio.to_thread(estimer_biens, df, analyses_connues=dict(zip(codes, analyses)))
+    return 200, {'resultats': [
+        {cle: (None if pd.isna(valeur) else valeur) for cle, valeur in ligne.items()}
+        for ligne in resultats.to_dict(orient='records')
+    ]}
+
+
+async def _metriques(_: Optional[Dict]) -> Tuple[int, str]:
+    return 200, METRIQUES.exporter_prometheus()
+
+
+_ROUTES = {
+    ('GET', '/sante'): _sante,
+    ('POST', '/estimation'): _estimation,
+    ('POST', '/estimations'): _estimations,
+    ('GET', '/metriques'): _metriques,
+}
+
+
+def _objet(donnees) -> Dict:
+    if not isinstance(donnees, dict):
+        raise RequeteInvalide("Objet JSON attendu")
+    return donnees
+
+
+def _lire_bien(donnees: Dict) -> BienImmobilier:
+    """Valide un bien reçu en JSON (standing : libellé "Standard" ou nom "STANDARD")"""
+    code_insee = str(donnees.get('code_insee') or '').strip()
+    if not code_insee:
+        raise RequeteInvalide("'code_insee' est obligatoire")
+
+    try:
+        surface = float(donnees['surface'])
+        pieces = int(donnees.get('pieces', 1))
+    except (KeyError, TypeError, ValueError):
+        raise RequeteInvalide("'surface' (nombre) est obligatoire et 'pieces' doit être un entier")
+    if not surface > 0 or pieces < 1:
+        raise RequeteInvalide("'surface' et 'pieces' doivent être positifs")
+
+    libelle = str(donnees.get('standing', Standing.STANDARD.value))
+    standing = next((s for s in Standing if libelle in (s.value, s.name)), None)
+    if standing is None:
+        raise RequeteInvalide(f"Standing inconnu : {libelle}")
+
+    try:
+        latitude = None if donnees.get('latitude') is None else float(donnees['latitude'])
+        longitude = None if donnees.get('longitude') is None else float(donnees['longitude'])
+    except (TypeError, ValueError):
+        raise RequeteInvalide("'latitude' et 'longitude' doivent être des nombres")
+    type_local = donnees.get('type_local')
+
+    return BienImmobilier(code_insee, str(donnees.get('ville', '')), surface, pieces, standing,
+                          type_local=None if type_local is None else str(type_local),
+                          latitude=latitude, longitude=longitude)
+
+
+# ============================================================================
+# APPLICATION ASGI
+# ============================================================================
+
+async def app(scope, receive, send) -> None:
+    """Application ASGI (uvicorn, hypercorn...)"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    debut = time.perf_counter()
+    chemin = scope['path'].rstrip('/') or '/'
+    route = _ROUTES.get((scope['method'], chemin))
+
+    if route is None:
+        connu = any(c == chemin for _, c in _ROUTES)
+        statut, reponse = (405, {'erreur': 'Méthode non autorisée'}) if connu else (404, {'erreur': 'Introuvable'})
+    else:
+        try:
+            statut, reponse = await route(await _lire_json(receive))
+        except RequeteInvalide as e:
+            statut, reponse = 400, {'erreur': str(e)}
+        except Exception as e:
+            logger.exception("Erreur lors du traitement de %s", chemin)
+            statut, reponse = 500, {'erreur': str(e)}
+
+    await _repondre(send, statut, reponse)
+
+    # Chemins inconnus regroupés : pas un label par URL sondée
+    label = chemin if route is not None else 'autre'
+    METRIQUES.compter('dvf_service_requetes_total', route=label, statut=str(statut))
+    METRIQUES.observer('dvf_service_secondes', time.perf_counter() - debut, route=label)
+
+
+async def _lire_json(receive) -> Optional[Dict]:
+    morceaux = []
+    taille = 0
+    while True:
+        message = await receive()
+        corps = message.get('body', b'')
+        taille += len(corps)
+        if taille > TAILLE_MAX_CORPS:
+            raise RequeteInvalide("Corps de requête trop volumineux")
+        morceaux.append(corps)
+        if not message.get('more_body', False):
+            break
+
+    brut = b''.join(morceaux)
+    if not brut:
+        return None
+    try:
+        return json.loads(brut)
+    except ValueError:
+        raise RequeteInvalide("JSON invalide")
+
+
+async def _repondre(send, statut: int, reponse) -> None:
+    if isinstance(reponse, str):
+        corps, type_contenu = reponse.encode('utf-8'), b'text/plain; version=0.0.4; charset=utf-8'
+    else:
+        corps = json.dumps(reponse, ensure_ascii=False, default=_serialiser).encode('utf-8')
+        type_contenu = b'application/json'
+
+    await send({
+        'type': 'http.response.start',
+        'status': statut,
+        'headers': [(b'content-type', type_contenu), (b'content-length', str(len(corps)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': corps})
+
+
+def _serialiser(valeur):
+    """Types NumPy / pandas des estimations vers JSON"""
+    if isinstance(valeur, np.integer):
+        return int(valeur)
+    if isinstance(valeur, np.floating):
+        return float(valeur)
+    if isinstance(valeur, Estimation):
+        return valeur.vers_dict()
+    if isinstance(valeur, pd.Timestamp):
+        return valeur.isoformat()
+    if isinstance(valeur, pd.DataFrame):
+        # tolist() convertit en types Python natifs (bien plus rapide que to_json) ;
+        # valeurs manquantes en null (NaN n'est pas du JSON valide)
+        if valeur.isna().values.any():
+            valeur = valeur.astype(object).where(valeur.notna(), None)
+        colonnes = [str(c) for c in valeur.columns]
+        return [dict(zip(colonnes, ligne)) for ligne in zip(*(valeur[c].tolist() for c in valeur.columns))]
+    if isinstance(valeur, Standing):
+        return valeur.value
+    raise TypeError(f"Type non sérialisable : {type(valeur).__name__}")
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service HTTP d'estimation DVF")
+    parser.add_argument('--hote', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="Processus servant les requêtes")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    print(f"🛰️  Service d'estimation sur http://{args.hote}:{args.port} ({args.workers} worker(s))")
+    uvicorn.run('dvf_service:app', host=args.hote, port=args.port, workers=args.workers,
+                log_level='warning')
@@ -0,0 +1,425 @@
+"""
+Estimateur Immobilier - Table précalculée des statistiques de marché
+Calcule, pour toutes les communes d'un fichier DVF en masse, ce que retourne
+`analyser_marche` (min/max/moyen/médiane après suppression des 5% extrêmes,
+évolution annuelle) en une passe groupby vectorisée, et l'enregistre dans une
+table compacte interrogeable en O(1).
+
+Avec --workers N, les communes sont réparties entre N processus qui lisent
+leurs transactions dans des tampons de mémoire partagée (aucun DataFrame
+sérialisé) ; le résultat est identique.
+
+Usage :
+    python dvf_stats_communes.py --sortie stats_communes.npz full_2022.csv.gz full_2023.csv.gz
+    python dvf_stats_communes.py --workers 32 --sortie stats_communes.npz full_*.csv.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Parties de communes par processus (équilibre la charge entre processus)
+PARTIES_PAR_WORKER = 4
+
+
+# ============================================================================
+# CALCUL
+# ============================================================================
+
+def calculer_stats_communes(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Statistiques de marché de toutes les communes en une passe
+
+    Args:
+        df: Transactions filtrées avec code_commune, date_mutation,
+            valeur_fonciere et surface_reelle_bati
+
+    Returns:
+        Tableaux de la table : codes, min, max, moyen, mediane, nb_transactions
+        et l'évolution annuelle au format CSR (evo_debut, evo_annees, evo_prix)
+    """
+    df = df[df['code_commune'].notna()]
+    codes, communes = pd.factorize(df['code_commune'].astype(str), sort=True)
+    prix_m2 = (df['valeur_fonciere'] / df['surface_reelle_bati']).to_numpy()
+    annees = df['date_mutation'].dt.year.to_numpy()
+
+    # Bornes 5% / 95% par commune (mêmes quantiles interpolés que analyser_marche)
+    quantiles = pd.Series(prix_m2).groupby(codes).quantile([0.05, 0.95]).unstack()
+    q5 = quantiles[0.05].to_numpy()[codes]
+    q95 = quantiles[0.95].to_numpy()[codes]
+    masque = (prix_m2 >= q5) & (prix_m2 <= q95)
+
+    propres = pd.DataFrame({'code': codes[masque], 'annee': annees[masque], 'prix_m2': prix_m2[masque]})
+    agregats = propres.groupby('code')['prix_m2'].agg(['min', 'max', 'mean', 'median', 'count'])
+    agregats = agregats.reindex(np.arange(len(communes)))
+
+    # Évolution par année, triée par commune puis année
+    evolution = propres.groupby(['code', 'annee'])['prix_m2'].mean().reset_index()
+    evo_debut = np.searchsorted(evolution['code'].to_numpy(), np.arange(len(communes) + 1))
+
+    return {
+        'codes': np.asarray(communes, dtype=str),
+        'min': _tronquer(agregats['min']),
+        'max': _tronquer(agregats['max']),
+        'moyen': _tronquer(agregats['mean']),
+        'mediane': _tronquer(agregats['median']),
+        'nb_transactions': agregats['count'].fillna(0).to_numpy(dtype=np.int32),
+        'evo_debut': evo_debut.astype(np.int32),
+        'evo_annees': evolution['annee'].to_numpy(dtype=np.int16),
+        'evo_prix': evolution['prix_m2'].to_numpy(dtype=np.float64),
+    }
+
+
+def _tronquer(serie: pd.Series) -> np.ndarray:
+    """Troncature vers zéro identique à int(), 0 pour les valeurs manquantes"""
+    return np.trunc(serie.fillna(0).to_numpy()).astype(np.int32)
+
+
+def construire_table(fichiers: Iterable[str], sortie: str, taille_chunk: int = 500_000,
+                     workers: int = 1) -> Dict:
+    """
+    Lit des fichiers DVF en masse (CSV, éventuellement gzippés) et écrit la table
+
+    Returns:
+        Résumé (communes, transactions, durée)
+    """
+    from dvf_backend import lire_csv_dvf
+
+    debut = time.perf_counter()
+    morceaux = [
+        lire_csv_dvf(fichier, colonnes_supplementaires=('code_commune',), taille_chunk=taille_chunk)
+        for fichier in fichiers
+    ]
+    morceaux = [m for m in morceaux if not m.empty]
+    if not morceaux:
+        raise ValueError("Aucune transaction exploitable dans les fichiers fournis")
+    df = pd.concat(morceaux, ignore_index=True)
+    df = df.dropna(subset=['code_commune'])
+
+    if workers > 1:
+        table = calculer_stats_communes_parallele(df, workers)
+    else:
+        table = calculer_stats_communes(df)
+    np.savez(sortie, **table)
+
+    return {
+        'communes': len(table['codes']),
+        'transactions': len(df),
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+# ============================================================================
+# CALCUL PARALLÈLE (MÉMOIRE PARTAGÉE)
+# ============================================================================
+
+def calculer_stats_communes_parallele(df: pd.DataFrame, workers: int) -> Dict[str, np.ndarray]:
+    """
+    Même table que `calculer_stats_communes`, calcul réparti entre processus
+
+    Le parent ne fait que numéroter les communes et recopier trois colonnes
+    (commune, prix au m², date) dans des tampons de mémoire partagée ; les
+    processus y lisent leurs lignes sans copie ni sérialisation, en trois
+    passes :
+
+    1. chaque tranche de lignes compte ses ventes par commune ;
+    2. chaque tranche range ses lignes à leur place dans l'ordre des communes
+       (positions déduites des comptes par le parent) ;
+    3. chaque plage de communes d'effectifs voisins (PARTIES_PAR_WORKER par
+       processus) calcule ses statistiques, seules renvoyées au parent.
+    """
+    # Importé ici : le backend lit la table sans charger multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    codes, communes = pd.factorize(df['code_commune'], sort=True)
+    nb_lignes, nb_communes = len(codes), len(communes)
+    # Commune manquante : rangée après les autres et ignorée, comme par groupby
+    codes[codes < 0] = nb_communes
+    # Moins de 65 535 communes (France entière) : tri par base sur 16 bits, linéaire
+    type_code = np.uint16 if nb_communes < (1 << 16) - 1 else np.int32
+    tranches = _tranches_lignes(nb_lignes, workers)
+
+    tampons = _TamponsPartages({
+        'codes': ((nb_lignes,), type_code),
+        'prix_m2': ((nb_lignes,), np.float64),
+        'dates': ((nb_lignes,), np.int64),
+        'comptes': ((len(tranches), nb_communes + 1), np.int64),
+        'positions': ((len(tranches), nb_communes + 1), np.int64),
+        'prix_ranges': ((nb_lignes,), np.float64),
+        'annees_rangees': ((nb_lignes,), np.int16),
+        'debut': ((nb_communes + 2,), np.int64),
+    })
+    try:
+        tampons['codes'][:] = codes
+        np.divide(df['valeur_fonciere'].to_numpy(dtype=np.float64),
+                  df['surface_reelle_bati'].to_numpy(dtype=np.float64), out=tampons['prix_m2'])
+        tampons['dates'][:] = df['date_mutation'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attacher_tampons,
+                                 initargs=(tampons.descripteurs,)) as executeur:
+            list(executeur.map(_compter_tranche, tranches))
+
+            comptes = tampons['comptes']
+            debut = np.concatenate([[0], np.cumsum(comptes.sum(axis=0))])
+            tampons['debut'][:] = debut
+            np.subtract(debut[:-1] + np.cumsum(comptes, axis=0), comptes, out=tampons['positions'])
+            list(executeur.map(_ranger_tranche, tranches))
+
+            plages = _plages_equilibrees(debut[:-1], workers * PARTIES_PAR_WORKER)
+            parties = list(executeur.map(_stats_plage, plages))
+    finally:
+        tampons.liberer()
+
+    table = {cle: np.concatenate([p[cle] for p in parties])
+             for cle in ('min', 'max', 'moyen', 'mediane', 'nb_transactions', 'evo_annees', 'evo_prix')}
+    tailles_evo = np.concatenate([p['evo_tailles'] for p in parties])
+    table['evo_debut'] = np.concatenate([[0], np.cumsum(tailles_evo)]).astype(np.int32)
+    table['codes'] = np.asarray(communes, dtype=str)
+    return table
+
+
+def _tranches_lignes(nb_lignes: int, nb_tranches: int) -> List[Tuple[int, int, int]]:
+    """Tranches de lignes de tailles égales : [(indice, début, fin)]"""
+    bornes = np.linspace(0, nb_lignes, nb_tranches + 1).astype(np.int64)
+    return [(i, int(a), int(b)) for i, (a, b) in enumerate(zip(bornes[:-1], bornes[1:]))]
+
+
+def _plages_equilibrees(debut: np.ndarray, nb_parties: int) -> List[Tuple[int, int]]:
+    """Plages de communes [c0, c1) d'environ len / nb_parties transactions chacune"""
+    bornes = np.searchsorted(debut, np.linspace(0, debut[-1], nb_parties + 1), side='left')
+    bornes[0], bornes[-1] = 0, len(debut) - 1
+    bornes = np.unique(np.clip(bornes, 0, len(debut) - 1))
+    return [(int(a), int(b)) for a, b in zip(bornes[:-1], bornes[1:])]
+
+
+class _TamponsPartages(dict):
+    """Tableaux NumPy nommés dans des segments de mémoire partagée (processus parent)"""
+
+    def __init__(self, formes: Dict[str, Tuple[Tuple[int, ...], object]]):
+        super().__init__()
+        from multiprocessing.shared_memory import SharedMemory
+
+        self._segments = []
+        self.descripteurs = {}
+        try:
+            for nom, (forme, dtype) in formes.items():
+                taille = max(int(np.prod(forme)) * np.dtype(dtype).itemsize, 1)
+                segment = SharedMemory(create=True, size=taille)
+                self._segments.append(segment)
+                self[nom] = np.ndarray(forme, dtype=dtype, buffer=segment.buf)
+                self.descripteurs[nom] = (segment.name, forme, np.dtype(dtype).str)
+        except BaseException:
+            self.liberer()
+            raise
+
+    def liberer(self) -> None:
+        self.clear()
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+
+# Tampons du processus worker, attachés une fois par `_attacher_tampons`
+_tampons_worker: Dict[str, np.ndarray] = {}
+_segments_worker = []
+
+
+def _attacher_tampons(descripteurs: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> None:
+    from multiprocessing.shared_memory import SharedMemory
+
+    for nom, (segment_nom, forme, dtype) in descripteurs.items():
+        # Les workers partagent le suivi des ressources du parent : les
+        # segments sont détruits une seule fois, par `liberer`
+        segment = SharedMemory(name=segment_nom)
+        _segments_worker.append(segment)
+        _tampons_worker[nom] = np.ndarray(forme, dtype=np.dtype(dtype), buffer=segment.buf)
+
+
+def _compter_tranche(tranche: Tuple[int, int, int]) -> None:
+    """Passe 1 : ventes de la tranche par commune"""
+    i, debut, fin = tranche
+    comptes = _tampons_worker['comptes'][i]
+    comptes[:] = np.bincount(_tampons_worker['codes'][debut:fin], minlength=len(comptes))
+
+
+def _ranger_tranche(tranche: Tuple[int, int, int]) -> None:
+    """Passe 2 : lignes de la tranche recopiées à leur place dans l'ordre des communes"""
+    i, debut, fin = tranche
+    codes = _tampons_worker['codes'][debut:fin]
+    ordre = np.argsort(codes, kind='stable')
+    codes_ordonnes = codes[ordre]
+
+    # Rang de chaque ligne parmi celles de sa commune dans la tranche
+    comptes = _tampons_worker['comptes'][i]
+    rangs = np.arange(fin - debut) - (np.cumsum(comptes) - comptes)[codes_ordonnes]
+    destinations = _tampons_worker['positions'][i][codes_ordonnes] + rangs
+
+    _tampons_worker['prix_ranges'][destinations] = _tampons_worker['prix_m2'][debut:fin][ordre]
+    dates = _tampons_worker['dates'][debut:fin][ordre].view('datetime64[ns]')
+    _tampons_worker['annees_rangees'][destinations] = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def _stats_plage(plage: Tuple[int, int]) -> Dict[str, np.ndarray]:
+    """Passe 3 : statistiques des communes [c0, c1)"""
+    c0, c1 = plage
+    debut = _tampons_worker['debut'][c0:c1 + 1]
+    lignes = slice(int(debut[0]), int(debut[-1]))
+    return stats_tranche(_tampons_worker['prix_ranges'][lignes], _tampons_worker['annees_rangees'][lignes],
+                         debut - debut[0])
+
+
+def stats_tranche(prix_m2: np.ndarray, annees: np.ndarray, debut: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Statistiques de communes consécutives, transactions rangées par commune
+
+    Mêmes règles que `calculer_stats_communes` (quantiles 5% / 95% interpolés,
+    valeurs conservées bornes comprises), sans pandas : une fois les prix de
+    chaque commune triés, les valeurs conservées forment une plage contiguë
+    [a, b) dont se déduisent min, max, moyenne et médiane.
+
+    Args:
+        debut: Début des transactions de chaque commune (nb_communes + 1 bornes)
+    """
+    effectifs = np.diff(debut)
+    communes = np.repeat(np.arange(len(effectifs)), effectifs)
+
+    # Prix triés au sein de chaque commune, en un seul tri sur (commune, prix) :
+    # les plages des communes restent à leurs bornes `debut`
+    tries = prix_m2[np.lexsort((prix_m2, communes))]
+
+    q5 = _quantile_trie(tries, debut[:-1], effectifs, 0.05)[communes]
+    q95 = _quantile_trie(tries, debut[:-1], effectifs, 0.95)[communes]
+    a = debut[:-1] + np.bincount(communes, weights=tries < q5, minlength=len(effectifs)).astype(np.int64)
+    b = debut[1:] - np.bincount(communes, weights=tries > q95, minlength=len(effectifs)).astype(np.int64)
+    nb = b - a
+    garde = (tries >= q5) & (tries <= q95)
+    sommes = np.bincount(communes[garde], weights=tries[garde], minlength=len(effectifs))
+    mediane = _quantile_trie(tries, a, nb, 0.5)
+
+    # Évolution : moyenne par (commune, année) des valeurs conservées, dans
+    # l'ordre d'origine pour garder l'année de chaque vente
+    garde = (prix_m2 >= q5) & (prix_m2 <= q95)
+    premiere_annee = int(annees.min()) if len(annees) else 0
+    etendue = int(annees.max()) - premiere_annee + 1 if len(annees) else 1
+    cles = communes[garde] * etendue + (annees[garde] - premiere_annee)
+    cles_uniques, inverse = np.unique(cles, return_inverse=True)
+    evo_prix = np.bincount(inverse, weights=prix_m2[garde]) / np.bincount(inverse)
+    evo_communes, evo_annees = np.divmod(cles_uniques, etendue)
+
+    return {
+        'min': np.trunc(tries[a]).astype(np.int32),
+        'max': np.trunc(tries[b - 1]).astype(np.int32),
+        'moyen': np.trunc(sommes / nb).astype(np.int32),
+        'mediane': np.trunc(mediane).astype(np.int32),
+        'nb_transactions': nb.astype(np.int32),
+        'evo_tailles': np.bincount(evo_communes, minlength=len(effectifs)),
+        'evo_annees': (evo_annees + premiere_annee).astype(np.int16),
+        'evo_prix': evo_prix,
+    }
+
+
+def _quantile_trie(valeurs: np.ndarray, debut: np.ndarray, effectifs: np.ndarray, q: float) -> np.ndarray:
+    """Quantile q (interpolation linéaire) de plages triées [debut, debut + effectifs)"""
+    position = (effectifs - 1) * q
+    bas = np.floor(position).astype(np.int64)
+    haut = np.minimum(bas + 1, effectifs - 1)
+    v_bas, v_haut = valeurs[debut + bas], valeurs[debut + haut]
+    return v_bas + (v_haut - v_bas) * (position - bas)
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+
+class AnalysePrecalculee(dict):
+    """
+    Analyse lue dans la table : l'évolution (DataFrame) n'est construite qu'à
+    la première lecture de analyse['evolution'], la tendance est calculée
+    sur les tableaux NumPy. Une estimation n'importe ainsi jamais pandas.
+    """
+
+    def __init__(self, annees, prix, **champs):
+        super().__init__(**champs)
+        self._annees = annees
+        self._prix = prix
+
+    def __missing__(self, cle: str):
+        if cle != 'evolution':
+            raise KeyError(cle)
+        evolution = self['evolution'] = pd.DataFrame({
+            'annee': self._annees.astype(np.int32),
+            'prix_m2': self._prix,
+        })
+        return evolution
+
+
+class TableStatsCommunes:
+    """Table des statistiques par commune, chargée une fois en mémoire"""
+
+    def __init__(self, chemin: str):
+        with np.load(chemin, allow_pickle=False) as archive:
+            self._tableaux = {cle: archive[cle] for cle in archive.files}
+        self._positions = {code: i for i, code in enumerate(self._tableaux['codes'].tolist())}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, code_insee: str) -> bool:
+        return code_insee in self._positions
+
+    def analyse(self, code_insee: str) -> Optional[Dict]:
+        """Résultat au format de `analyser_marche`, ou None si la commune est absente"""
+        i = self._positions.get(code_insee)
+        if i is None:
+            return None
+
+        t = self._tableaux
+        stats = {
+            'min': int(t['min'][i]),
+            'max': int(t['max'][i]),
+            'moyen': int(t['moyen'][i]),
+            'mediane': int(t['mediane'][i]),
+            'nb_transactions': int(t['nb_transactions'][i]),
+        }
+        debut, fin = t['evo_debut'][i], t['evo_debut'][i + 1]
+        annees, prix = t['evo_annees'][debut:fin], t['evo_prix'][debut:fin]
+
+        # Même pente que `_calculer_tendance` du backend (première / dernière année)
+        tendance = 0
+        if len(annees) >= 2 and annees[-1] > annees[0]:
+            tendance = float(prix[-1] - prix[0]) / int(annees[-1] - annees[0])
+
+        return AnalysePrecalculee(
+            annees, prix,
+            prix_moyen_m2=stats['moyen'],
+            stats=stats,
+            tendance=tendance,
+        )
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Table des statistiques de marché par commune")
+    parser.add_argument('fichiers', nargs='+', help="Fichiers DVF CSV (.csv ou .csv.gz)")
+    parser.add_argument('--sortie', required=True, help="Fichier .npz de sortie")
+    parser.add_argument('--chunk', type=int, default=500_000, help="Lignes lues par bloc")
+    parser.add_argument('--workers', type=int, default=1, help="Processus de calcul (mémoire partagée)")
+    args = parser.parse_args()
+
+    print(f"📊 Calcul des statistiques à partir de {len(args.fichiers)} fichier(s)...")
+    resume = construire_table(args.fichiers, args.sortie, taille_chunk=args.chunk, workers=args.workers)
+    print(f"✅ {resume['communes']:,} communes et {resume['transactions']:,} transactions "
+          f"en {resume['duree_s']} s".replace(',', ' '))
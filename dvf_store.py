@@ -0,0 +1,304 @@
+"""
+Estimateur Immobilier - Store local des transactions DVF
+Ingestion en masse des fichiers DVF (départements / France entière) dans un
+stockage colonnaire partitionné par département et année, avec un index
+code INSEE -> plage de lignes et une lecture en mémoire mappée.
+
+Usage :
+    python dvf_store.py --store ./store_dvf full_2022.csv.gz full_2023.csv.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+_FICHIER_INDEX = 'index.json'
+_FICHIER_META = 'meta.json'
+
+
+def departement_commune(code_insee: str) -> str:
+    """Code département d'une commune (3 caractères pour l'outre-mer)"""
+    code_insee = str(code_insee)
+    return code_insee[:3] if code_insee.startswith('97') else code_insee[:2]
+
+
+# ============================================================================
+# INGESTION
+# ============================================================================
+
+def ingerer_dvf(fichiers: Iterable[str], racine: str, taille_chunk: int = 500_000) -> Dict:
+    """
+    Ingère des fichiers DVF (CSV, éventuellement gzippés) dans le store local
+
+    Les fichiers sont lus par blocs de `taille_chunk` lignes, filtrés avec les
+    mêmes règles que `_filtrer_transactions`, puis répartis par partition
+    (département, année). Chaque morceau de partition est trié et déversé
+    sur disque dès la lecture de son bloc : la mémoire reste bornée par un
+    bloc, puis par la plus grosse partition lors de la fusion finale, et non
+    par le volume total du fichier. Chaque partition touchée est entièrement
+    réécrite.
+
+    Returns:
+        Résumé de l'ingestion (lignes lues, lignes conservées, partitions écrites)
+    """
+    from dvf_backend import COLONNES_CSV_DVF, DTYPES_CSV_DVF, _filtrer_transactions
+
+    colonnes = set(COLONNES_CSV_DVF) | {'code_commune'}
+
+    # Nombre de morceaux triés déversés par partition
+    partitions: Dict[Tuple[str, int], int] = {}
+    lignes_lues = 0
+    lignes_conservees = 0
+    debut = time.perf_counter()
+
+    os.makedirs(racine, exist_ok=True)
+    temporaire = os.path.join(racine, f".ingestion.{os.getpid()}")
+    shutil.rmtree(temporaire, ignore_errors=True)
+
+    try:
+        for fichier in fichiers:
+            lecteur = pd.read_csv(
+                fichier,
+                usecols=lambda c: c in colonnes,
+                dtype=DTYPES_CSV_DVF,
+                chunksize=taille_chunk,
+            )
+            for chunk in lecteur:
+                lignes_lues += len(chunk)
+                df = _filtrer_transactions(chunk, colonnes_supplementaires=('code_commune',))
+                if df.empty or 'code_commune' not in df.columns:
+                    continue
+
+                df = df.dropna(subset=['code_commune'])
+                lignes_conservees += len(df)
+
+                departements = df['code_commune'].map(departement_commune)
+                annees = df['date_mutation'].dt.year
+                for (dept, annee), groupe in df.groupby([departements, annees], sort=False):
+                    cle = (dept, int(annee))
+                    numero = partitions.get(cle, 0)
+                    _deverser_morceau(os.path.join(temporaire, dept, str(cle[1]), f"{numero:05d}"),
+                                      _trier(groupe))
+                    partitions[cle] = numero + 1
+
+        for (dept, annee), nb_morceaux in partitions.items():
+            dossier = os.path.join(temporaire, dept, str(annee))
+            morceaux = [_charger_morceau(os.path.join(dossier, f"{numero:05d}"))
+                        for numero in range(nb_morceaux)]
+            _ecrire_partition(racine, dept, annee, pd.concat(morceaux, ignore_index=True))
+            shutil.rmtree(dossier, ignore_errors=True)
+    finally:
+        shutil.rmtree(temporaire, ignore_errors=True)
+
+    return {
+        'lignes_lues': lignes_lues,
+        'lignes_conservees': lignes_conservees,
+        'partitions': sorted(f"{dept}/{annee}" for dept, annee in partitions),
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+def _trier(df: pd.DataFrame) -> pd.DataFrame:
+    """Tri stable par commune puis date (les morceaux triés se fusionnent sans réordonner)"""
+    return df.sort_values(['code_commune', 'date_mutation'], kind='mergesort', ignore_index=True)
+
+
+def _sauver_colonnes(dossier: str, df: pd.DataFrame) -> Dict[str, Dict]:
+    """Écrit chaque colonne dans un fichier .npy et retourne leur description"""
+    colonnes = {}
+    for nom in df.columns:
+        serie = df[nom]
+        if pd.api.types.is_numeric_dtype(serie.dtype) or pd.api.types.is_datetime64_dtype(serie.dtype):
+            tableau = serie.to_numpy()
+            colonnes[nom] = {'type': 'natif'}
+        else:
+            categorie = serie.astype('category')
+            tableau = categorie.cat.codes.to_numpy()
+            colonnes[nom] = {'type': 'category',
+                             'categories': [str(c) for c in categorie.cat.categories]}
+        np.save(os.path.join(dossier, f"{nom}.npy"), tableau)
+    return colonnes
+
+
+def _decoder_colonne(tableau, info: Dict):
+    """Reconstruit une colonne écrite par `_sauver_colonnes`"""
+    if info['type'] == 'category':
+        return pd.Categorical.from_codes(tableau, categories=info['categories'])
+    return tableau
+
+
+def _deverser_morceau(dossier: str, df: pd.DataFrame) -> None:
+    """Écrit un morceau trié de partition dans le répertoire temporaire d'ingestion"""
+    os.makedirs(dossier)
+    colonnes = _sauver_colonnes(dossier, df)
+    with open(os.path.join(dossier, _FICHIER_META), 'w') as f:
+        json.dump({'colonnes': colonnes}, f)
+
+
+def _charger_morceau(dossier: str) -> pd.DataFrame:
+    """Relit un morceau écrit par `_deverser_morceau`"""
+    with open(os.path.join(dossier, _FICHIER_META)) as f:
+        colonnes = json.load(f)['colonnes']
+    return pd.DataFrame({
+        nom: _decoder_colonne(np.load(os.path.join(dossier, f"{nom}.npy")), info)
+        for nom, info in colonnes.items()
+    })
+
+
+def _ecrire_partition(racine: str, dept: str, annee: int, df: pd.DataFrame) -> None:
+    """Écrit une partition triée par code commune, une colonne .npy par fichier"""
+    df = _trier(df)
+    codes = df['code_commune'].to_numpy(dtype=str)
+
+    # Index code INSEE -> [début, fin[
+    uniques, debuts = np.unique(codes, return_index=True)
+    fins = np.append(debuts[1:], len(codes))
+    index = {str(c): [int(d), int(f)] for c, d, f in zip(uniques, debuts, fins)}
+
+    dossier = os.path.join(racine, dept, str(annee))
+    temporaire = f"{dossier}.{os.getpid()}.tmp"
+    shutil.rmtree(temporaire, ignore_errors=True)
+    os.makedirs(temporaire)
+
+    colonnes = _sauver_colonnes(temporaire, df.drop(columns='code_commune'))
+
+    with open(os.path.join(temporaire, _FICHIER_INDEX), 'w') as f:
+        json.dump(index, f)
+    with open(os.path.join(temporaire, _FICHIER_META), 'w') as f:
+        json.dump({
+            'colonnes': colonnes,
+            'lignes': len(df),
+            'ingere_le': datetime.now().isoformat(timespec='seconds'),
+        }, f)
+
+    shutil.rmtree(dossier, ignore_errors=True)
+    os.replace(temporaire, dossier)
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+
+class _Partition:
+    """Partition (département, année) ouverte en mémoire mappée"""
+
+    def __init__(self, dossier: str, signature: Tuple[int, int, int]):
+        self.signature = signature
+        with open(os.path.join(dossier, _FICHIER_INDEX)) as f:
+            self.index = json.load(f)
+        with open(os.path.join(dossier, _FICHIER_META)) as f:
+            self.meta = json.load(f)
+        self.colonnes = {
+            nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode='r')
+            for nom in self.meta['colonnes']
+        }
+
+    def tranche(self, code_insee: str) -> Optional[Dict[str, object]]:
+        plage = self.index.get(code_insee)
+        if plage is None:
+            return None
+        debut, fin = plage
+
+        # Vues sur les fichiers mappés, sans copie
+        return {nom: _decoder_colonne(tableau[debut:fin], self.meta['colonnes'][nom])
+                for nom, tableau in self.colonnes.items()}
+
+
+class StoreDVF:
+    """
+    Lecteur du store local produit par `ingerer_dvf`
+
+    Les partitions ouvertes sont gardées en cache, associées à la signature
+    (inode, date, taille) de leur fichier meta.json : une partition réécrite
+    par une nouvelle ingestion est rouverte à la lecture suivante.
+    """
+
+    def __init__(self, racine: str):
+        self.racine = racine
+        self._partitions: Dict[Tuple[str, int], _Partition] = {}
+        self._verrou = threading.Lock()
+
+    def annees(self, dept: str) -> List[int]:
+        """Années disponibles pour un département"""
+        try:
+            return sorted(int(n) for n in os.listdir(os.path.join(self.racine, dept)) if n.isdigit())
+        except OSError:
+            return []
+
+    def lire_commune(self, code_insee: str, annees: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Transactions d'une commune, toutes années confondues (ou `annees`)"""
+        dept = departement_commune(code_insee)
+        morceaux = []
+
+        for annee in (annees if annees is not None else self.annees(dept)):
+            partition = self._partition(dept, annee)
+            if partition is None:
+                continue
+            donnees = partition.tranche(code_insee)
+            if donnees is not None:
+                morceaux.append(pd.DataFrame(donnees, copy=False))
+
+        if not morceaux:
+            return pd.DataFrame()
+        if len(morceaux) == 1:
+            return morceaux[0]
+        return pd.concat(morceaux, ignore_index=True)
+
+    def invalider(self) -> None:
+        """Referme toutes les partitions ouvertes"""
+        with self._verrou:
+            self._partitions.clear()
+
+    def _partition(self, dept: str, annee: int) -> Optional[_Partition]:
+        cle = (dept, int(annee))
+        dossier = os.path.join(self.racine, dept, str(annee))
+        try:
+            etat = os.stat(os.path.join(dossier, _FICHIER_META))
+        except OSError:
+            with self._verrou:
+                self._partitions.pop(cle, None)
+            return None
+        signature = (etat.st_ino, etat.st_mtime_ns, etat.st_size)
+
+        with self._verrou:
+            partition = self._partitions.get(cle)
+            if partition is None or partition.signature != signature:
+                try:
+                    partition = _Partition(dossier, signature)
+                except (OSError, ValueError):
+                    self._partitions.pop(cle, None)
+                    return None
+                self._partitions[cle] = partition
+            return partition
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion des fichiers DVF dans le store local")
+    parser.add_argument('fichiers', nargs='+', help="Fichiers DVF CSV (.csv ou .csv.gz)")
+    parser.add_argument('--store', required=True, help="Répertoire racine du store")
+    parser.add_argument('--chunk', type=int, default=500_000, help="Lignes lues par bloc")
+    args = parser.parse_args()
+
+    print(f"📦 Ingestion de {len(args.fichiers)} fichier(s) dans {args.store}...")
+    resume = ingerer_dvf(args.fichiers, args.store, taille_chunk=args.chunk)
+    print(f"✅ {resume['lignes_conservees']:,} / {resume['lignes_lues']:,} lignes conservées "
+          f"en {resume['duree_s']} s".replace(',', ' '))
+    print(f"✅ {len(resume['partitions'])} partition(s) écrite(s)")
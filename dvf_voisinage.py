@@ -0,0 +1,331 @@
+"""
+Estimateur Immobilier - Index de voisinage des communes
+Construit hors ligne, à partir d'un fichier géographique local, le centroïde
+de chaque commune et la liste de ses communes limitrophes, enregistrés dans
+une table compacte (.npz, listes d'adjacence au format CSR). À l'usage, les
+voisins d'une commune se lisent en O(1) et les anneaux successifs (voisins,
+voisins des voisins...) sont parcourus en largeur, un anneau à la fois.
+
+Fichiers acceptés :
+- GeoJSON des contours communaux (propriété code, code_insee ou INSEE_COM) :
+  deux communes sont voisines si leurs contours partagent un sommet ;
+- CSV des centroïdes (code_insee, latitude, longitude) : les NB_PLUS_PROCHES
+  centroïdes les plus proches tiennent lieu de voisins.
+Une commune sans voisin par ses contours (île, contour isolé) reçoit aussi
+ses NB_PLUS_PROCHES plus proches centroïdes.
+
+Usage :
+    python dvf_voisinage.py communes.geojson --sortie voisinage.npz
+    python dvf_voisinage.py communes.csv --sortie voisinage.npz --k 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dvf_differe import ModuleDiffere
+
+# Importés au premier usage (voir dvf_differe)
+np = ModuleDiffere('numpy', __name__, 'np')
+pd = ModuleDiffere('pandas', __name__, 'pd')
+
+
+# Version du format de l'index
+VERSION_VOISINAGE = 1
+
+# Voisins par plus proches centroïdes (CSV, ou commune sans contour partagé)
+NB_PLUS_PROCHES = 6
+
+# Propriétés GeoJSON et colonnes CSV reconnues pour le code INSEE
+CHAMPS_CODE = ('code_insee', 'code', 'INSEE_COM', 'insee', 'code_commune_INSEE', 'code_commune')
+COLONNES_LATITUDE = ('latitude', 'latitude_centre', 'lat')
+COLONNES_LONGITUDE = ('longitude', 'longitude_centre', 'lon', 'lng')
+
+# Précision des sommets comparés (1e-6 degré ≈ 10 cm)
+_PRECISION_SOMMETS = 1e6
+
+_KM_PAR_DEGRE = 111.32
+
+
+# ============================================================================
+# CONSTRUCTION
+# ============================================================================
+
+def construire_index(source: str, sortie: str, k: int = NB_PLUS_PROCHES) -> Dict:
+    """
+    Construit l'index de voisinage d'un GeoJSON de contours ou d'un CSV de centroïdes
+
+    Returns:
+        Résumé (communes, voisins par commune en moyenne, durée)
+    """
+    debut = time.perf_counter()
+    if source.endswith(('.geojson', '.json')):
+        codes, latitude, longitude, paires = _lire_geojson(source)
+    else:
+        codes, latitude, longitude = _lire_centroides(source)
+        paires = np.empty((0, 2), dtype=np.int64)
+
+    # Plus proches centroïdes pour toutes les communes sans voisin par contour
+    isolees = np.setdiff1d(np.arange(len(codes)), paires.ravel())
+    if len(isolees) and len(codes) > 1:
+        proches = _plus_proches(latitude, longitude, isolees, min(k, len(codes) - 1))
+        paires = np.vstack([paires, np.column_stack([np.repeat(isolees, proches.shape[1]), proches.ravel()])])
+
+    table = _tableau_adjacence(codes, latitude, longitude, paires)
+    np.savez(sortie, **table)
+
+    return {
+        'communes': len(codes),
+        'voisins_moyen': round(len(table['voisins']) / max(len(codes), 1), 1),
+        'duree_s': round(time.perf_counter() - debut, 2),
+    }
+
+
+def _lire_geojson(chemin: str) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Codes, centroïdes et paires de communes partageant un sommet de contour"""
+    with open(chemin, encoding='utf-8') as f:
+        entites = json.load(f)['features']
+
+    codes, latitude, longitude = [], [], []
+    sommets, proprietaires = [], []
+    for entite in entites:
+        code = next((str(entite['properties'][c]) for c in CHAMPS_CODE
+                     if entite.get('properties', {}).get(c)), None)
+        geometrie = entite.get('geometry')
+        if code is None or not geometrie:
+            continue
+        polygones = geometrie['coordinates']
+        if geometrie['type'] == 'Polygon':
+            polygones = [polygones]
+        elif geometrie['type'] != 'MultiPolygon':
+            continue
+
+        # Centroïde pondéré par l'aire des contours extérieurs
+        aire_totale, cx, cy = 0.0, 0.0, 0.0
+        for polygone in polygones:
+            anneau = np.asarray(polygone[0], dtype=np.float64)[:, :2]
+            aire, x, y = _centroide_anneau(anneau)
+            aire_totale += aire
+            cx += aire * x
+            cy += aire * y
+            for contour in polygone:
+                points = np.asarray(contour, dtype=np.float64)[:, :2]
+                sommets.append(points)
+                proprietaires.append(np.full(len(points), len(codes), dtype=np.int64))
+        if aire_totale == 0:
+            points = np.vstack([np.asarray(p[0], dtype=np.float64)[:, :2] for p in polygones])
+            cx, cy = points.mean(axis=0)
+        else:
+            cx, cy = cx / aire_totale, cy / aire_totale
+
+        codes.append(code.zfill(5))
+        longitude.append(cx)
+        latitude.append(cy)
+
+    if not codes:
+        raise ValueError(f"Aucune commune lisible dans {chemin}")
+    paires = _paires_sommets_partages(np.vstack(sommets), np.concatenate(proprietaires))
+    return codes, np.asarray(latitude), np.asarray(longitude), paires
+
+
+def _centroide_anneau(anneau: np.ndarray) -> Tuple[float, float, float]:
+    """(aire, x, y) d'un contour fermé par la formule du lacet"""
+    x, y = anneau[:, 0], anneau[:, 1]
+    produit = x[:-1] * y[1:] - x[1:] * y[:-1]
+    aire = produit.sum() / 2
+    if aire == 0:
+        return 0.0, float(x.mean()), float(y.mean())
+    cx = ((x[:-1] + x[1:]) * produit).sum() / (6 * aire)
+    cy = ((y[:-1] + y[1:]) * produit).sum() / (6 * aire)
+    return abs(aire), float(cx), float(cy)
+
+
+def _paires_sommets_partages(points: np.ndarray, proprietaires: np.ndarray) -> np.ndarray:
+    """Paires (i, j) de communes distinctes ayant au moins un sommet commun"""
+    lon = np.round((points[:, 0] + 180) * _PRECISION_SOMMETS).astype(np.int64)
+    lat = np.round((points[:, 1] + 90) * _PRECISION_SOMMETS).astype(np.int64)
+    cles = np.unique(np.column_stack([(lon << 28) | lat, proprietaires]), axis=0)
+
+    # Sommets triés par clé : les communes d'un même sommet sont consécutives
+    paires = []
+    for ecart in range(1, len(cles)):
+        meme_sommet = cles[ecart:, 0] == cles[:-ecart, 0]
+        if not meme_sommet.any():
+            break
+        paires.append(np.column_stack([cles[:-ecart, 1][meme_sommet], cles[ecart:, 1][meme_sommet]]))
+    if not paires:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.vstack(paires)
+
+
+def _lire_centroides(chemin: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    df = pd.read_csv(chemin, dtype=str)
+    colonnes = {
+        nom: next((c for c in candidats if c in df.columns), None)
+        for nom, candidats in (('code', CHAMPS_CODE), ('latitude', COLONNES_LATITUDE),
+                               ('longitude', COLONNES_LONGITUDE))
+    }
+    manquantes = [nom for nom, colonne in colonnes.items() if colonne is None]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes dans {chemin} : {', '.join(manquantes)}")
+
+    df = pd.DataFrame({
+        'code': df[colonnes['code']].str.strip().str.zfill(5),
+        'latitude': pd.to_numeric(df[colonnes['latitude']], errors='coerce'),
+        'longitude': pd.to_numeric(df[colonnes['longitude']], errors='coerce'),
+    }).dropna().drop_duplicates('code')
+    if df.empty:
+        raise ValueError(f"Aucune commune lisible dans {chemin}")
+    return df['code'].tolist(), df['latitude'].to_numpy(), df['longitude'].to_numpy()
+
+
+def _plus_proches(latitude: np.ndarray, longitude: np.ndarray, indices: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices des k centroïdes les plus proches de chaque commune de `indices` (elle exclue)
+
+    Recherche exacte sur une grille d'environ k communes par cellule : le
+    carré de cellules autour d'une commune est élargi jusqu'à contenir k
+    candidats tous plus proches que son bord.
+    """
+    x, y = _projeter(latitude, longitude)
+    cote = max(float(np.ptp(x)), float(np.ptp(y)), 1e-9) * math.sqrt((k + 1) / len(x))
+    cx = np.floor((x - x.min()) / cote).astype(np.int64)
+    cy = np.floor((y - y.min()) / cote).astype(np.int64)
+    largeur = int(cy.max()) + 1
+    cellules_points = cx * largeur + cy
+
+    ordre = np.argsort(cellules_points, kind='stable')
+    cellules, debuts = np.unique(cellules_points[ordre], return_index=True)
+    contenu = dict(zip(cellules.tolist(), np.split(ordre, debuts[1:])))
+    etendue = max(int(cx.max()), int(cy.max())) + 1
+
+    proches = np.empty((len(x), k), dtype=np.int64)
+    cellules_cibles = cellules_points[indices]
+    for cellule in np.unique(cellules_cibles).tolist():
+        points = indices[cellules_cibles == cellule]
+        i, j = divmod(cellule, largeur)
+        rayon = 1
+        while True:
+            candidats = np.concatenate([
+                contenu.get(a * largeur + b, np.empty(0, dtype=np.int64))
+                for a in range(i - rayon, i + rayon + 1) if a >= 0
+                for b in range(j - rayon, j + rayon + 1) if 0 <= b < largeur
+            ])
+            distances = np.hypot(x[points, None] - x[None, candidats], y[points, None] - y[None, candidats])
+            distances[points[:, None] == candidats[None, :]] = np.inf
+            if len(candidats) > k:
+                rangs = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                kieme = np.take_along_axis(distances, rangs, axis=1).max()
+                if kieme <= rayon * cote or rayon > etendue:
+                    proches[points] = candidats[rangs]
+                    break
+            rayon += 1
+    return proches[indices]
+
+
+def _projeter(latitude: np.ndarray, longitude: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Projection équirectangulaire locale (km)"""
+    km_par_degre_lon = _KM_PAR_DEGRE * math.cos(math.radians(float(np.mean(latitude))))
+    return np.asarray(longitude) * km_par_degre_lon, np.asarray(latitude) * _KM_PAR_DEGRE
+
+
+def _tableau_adjacence(codes: List[str], latitude: np.ndarray, longitude: np.ndarray,
+                       paires: np.ndarray) -> Dict[str, np.ndarray]:
+    """Tableaux de l'index : adjacence symétrique, sans doublon, au format CSR"""
+    paires = np.vstack([paires, paires[:, ::-1]])
+    paires = np.unique(paires[paires[:, 0] != paires[:, 1]], axis=0)
+    debut = np.searchsorted(paires[:, 0], np.arange(len(codes) + 1))
+    return {
+        'version': np.array(VERSION_VOISINAGE),
+        'codes': np.asarray(codes, dtype=str),
+        'latitude': np.asarray(latitude, dtype=np.float32),
+        'longitude': np.asarray(longitude, dtype=np.float32),
+        'debut': debut.astype(np.int32),
+        'voisins': paires[:, 1].astype(np.int32),
+    }
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+
+class IndexVoisinage:
+    """Index de voisinage chargé une fois en mémoire"""
+
+    def __init__(self, chemin: str):
+        with np.load(chemin, allow_pickle=False) as archive:
+            version = int(archive['version'])
+            if version != VERSION_VOISINAGE:
+                raise ValueError(f"Version d'index incompatible : {version} (attendue : {VERSION_VOISINAGE})")
+            self._codes = archive['codes'].tolist()
+            self._debut = archive['debut']
+            self._voisins = archive['voisins']
+            self._x, self._y = _projeter(archive['latitude'].astype(np.float64),
+                                         archive['longitude'].astype(np.float64))
+        self._positions = {code: i for i, code in enumerate(self._codes)}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code_insee: str) -> bool:
+        return code_insee in self._positions
+
+    def voisins(self, code_insee: str) -> List[str]:
+        """Communes limitrophes (liste vide si la commune est absente)"""
+        i = self._positions.get(code_insee)
+        if i is None:
+            return []
+        return [self._codes[j] for j in self._voisins[self._debut[i]:self._debut[i + 1]]]
+
+    def anneaux(self, code_insee: str, nb_max: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Anneaux successifs autour de la commune : voisins, puis voisins des
+        voisins non encore vus... chacun trié par distance des centroïdes
+
+        Parcours en largeur paresseux : un anneau n'est calculé que s'il est lu.
+        """
+        origine = self._positions.get(code_insee)
+        if origine is None:
+            return
+        vus = {origine}
+        anneau = np.array([origine])
+        rang = 0
+        while nb_max is None or rang < nb_max:
+            candidats = np.concatenate([self._voisins[self._debut[i]:self._debut[i + 1]] for i in anneau])
+            anneau = np.array([j for j in dict.fromkeys(candidats.tolist()) if j not in vus], dtype=np.int64)
+            if not len(anneau):
+                return
+            vus.update(anneau.tolist())
+            distances = np.hypot(self._x[anneau] - self._x[origine], self._y[anneau] - self._y[origine])
+            anneau = anneau[np.argsort(distances, kind='stable')]
+            rang += 1
+            yield [self._codes[j] for j in anneau]
+
+    def distance_km(self, code_a: str, code_b: str) -> Optional[float]:
+        """Distance entre centroïdes (km), None si une commune est absente"""
+        a, b = self._positions.get(code_a), self._positions.get(code_b)
+        if a is None or b is None:
+            return None
+        return float(math.hypot(self._x[a] - self._x[b], self._y[a] - self._y[b]))
+
+
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index de voisinage des communes")
+    parser.add_argument('source', help="GeoJSON des contours communaux ou CSV des centroïdes")
+    parser.add_argument('--sortie', required=True, help="Fichier .npz de sortie")
+    parser.add_argument('--k', type=int, default=NB_PLUS_PROCHES,
+                        help="Plus proches centroïdes retenus faute de contour partagé")
+    args = parser.parse_args()
+
+    print(f"🗺️  Construction de l'index de voisinage depuis {args.source}...")
+    resume = construire_index(args.source, args.sortie, k=args.k)
+    print(f"✅ {resume['communes']:,} communes, {resume['voisins_moyen']} voisins en moyenne "
+          f"en {resume['duree_s']} s".replace(',', ' '))
@@ -0,0 +1,68 @@
+"""
+Estimateur Immobilier - Vérifications des benchmarks
+Contrôles de benchmark_dvf.py exécutés par pytest : budget de démarrage
+(import de dvf_backend, estimation depuis la table sans pandas), lecture en
+flux équivalente à l'ancien parsing, et détection des régressions de
+`comparer`. Les mesures elles-mêmes restent dans benchmark_dvf.py.
+
+Usage :
+    python -m pytest -q test_benchmark_dvf.py
+"""
+
+import pandas as pd
+import pytest
+
+import benchmark_dvf
+import dvf_fetch
+from dvf_serveur_local import ServeurDVFLocal
+
+
+@pytest.fixture(autouse=True)
+def session():
+    dvf_fetch.configurer_session(requetes_par_seconde=None, backoff=0)
+    yield
+    dvf_fetch.configurer_session()
+
+
+# ============================================================================
+# DÉMARRAGE
+# ============================================================================
+
+def test_demarrage_dans_le_budget():
+    resultats = benchmark_dvf.bench_demarrage(repetitions=3)
+    table = resultats['estimation_table']
+    assert resultats['import_ms'] <= benchmark_dvf.BUDGET_IMPORT_MS
+    assert not table['pandas_importe']
+    assert table['valeur_estimee'] > 0
+
+
+# ============================================================================
+# PARSING
+# ============================================================================
+
+def test_parsing_flux_identique_au_parsing_complet():
+    with ServeurDVFLocal(nb_lignes=2000) as serveur:
+        url = serveur.url_datagouv.format(annee=2023, dept='33', code_insee='33063')
+        avant = benchmark_dvf._parsing_complet(url)
+        apres = benchmark_dvf._parsing_flux(url)
+
+    assert len(apres) == len(avant) > 0
+    pd.testing.assert_frame_equal(apres.reset_index(drop=True), avant[list(apres.columns)].reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+
+# ============================================================================
+# COMPARAISON DE RÉFÉRENCES
+# ============================================================================
+
+def _resultats(**durees_ms):
+    return {'resultats': {cle: {'median_s': ms / 1000} for cle, ms in durees_ms.items()}}
+
+
+def test_comparer_signale_les_regressions():
+    reference = _resultats(lente=10.0, bruit=0.1, rapide=10.0, stable=10.0)
+    actuel = _resultats(lente=15.0, bruit=0.5, rapide=5.0, stable=10.5, nouvelle=1.0)
+
+    # Écart sous le plancher de bruit, amélioration, variation sous le seuil : non signalés
+    assert benchmark_dvf.comparer(actuel, reference) == ['lente']
+    assert benchmark_dvf.comparer(actuel, reference, seuil=0.6) == []
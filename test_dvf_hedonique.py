@@ -0,0 +1,132 @@
+"""
+Estimateur Immobilier - Tests du modèle hédonique
+Ajustement sur des transactions synthétiques de coefficients connus,
+comparaison de la prédiction à des moindres carrés directs (indicatrices
+communes) et traitement des types de local hors modèle.
+
+Usage :
+    python -m pytest -q test_dvf_hedonique.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dvf_backend
+from dvf_hedonique import VARIABLES, EntraineurHedonique, ModeleHedonique, matrice_variables
+
+COMMUNES = ('33063', '33281', '33318', '33522')
+EFFETS_COMMUNES = (8.2, 7.9, 7.6, 7.4)
+COEF_LOG_SURFACE = -0.15
+COEF_PIECES = 0.03
+COEF_MAISON = -0.10
+EFFETS_ANNEES = {2021: 0.0, 2022: 0.05, 2023: 0.08}
+
+
+def _transactions(n: int = 4000, bruit: float = 0.05, graine: int = 0) -> pd.DataFrame:
+    """Transactions d'un département dont le log du prix au m² suit le modèle exactement (plus un bruit)"""
+    rng = np.random.default_rng(graine)
+    commune = rng.integers(len(COMMUNES), size=n)
+    surface = rng.uniform(20, 200, size=n)
+    pieces = rng.integers(1, 7, size=n).astype(float)
+    maison = rng.random(n) < 0.4
+    annee = rng.choice(list(EFFETS_ANNEES), size=n)
+
+    log_prix_m2 = (np.asarray(EFFETS_COMMUNES)[commune] + COEF_LOG_SURFACE * np.log(surface)
+                   + COEF_PIECES * pieces + COEF_MAISON * maison
+                   + np.vectorize(EFFETS_ANNEES.get)(annee) + rng.normal(0, bruit, size=n))
+    return pd.DataFrame({
+        'code_commune': np.asarray(COMMUNES)[commune],
+        'date_mutation': pd.to_datetime([f"{a}-06-15" for a in annee]),
+        'valeur_fonciere': np.exp(log_prix_m2) * surface,
+        'surface_reelle_bati': surface,
+        'nombre_pieces_principales': pieces,
+        'type_local': np.where(maison, 'Maison', 'Appartement'),
+    })
+
+
+@pytest.fixture
+def modele(tmp_path):
+    entraineur = EntraineurHedonique()
+    entraineur.ajouter(_transactions())
+    chemin = str(tmp_path / 'modele.npz')
+    np.savez(chemin, **entraineur.ajuster())
+    return ModeleHedonique(chemin)
+
+
+# ============================================================================
+# TYPES DE LOCAL
+# ============================================================================
+
+def test_type_hors_modele_non_extrapole(modele):
+    prediction = modele.predire(['33063'] * 4, np.full(4, 60.0), np.full(4, 3.0),
+                                ['Appartement', 'Maison', None, 'Local industriel'])
+    assert np.isfinite(prediction['prix_m2'][:3]).all()
+    assert np.isnan(prediction['prix_m2'][3])
+    assert np.isnan(prediction['prix_m2_bas'][3]) and np.isnan(prediction['prix_m2_haut'][3])
+
+
+def test_type_hors_modele_repli_sur_moyenne_communale(modele, monkeypatch):
+    monkeypatch.setattr(dvf_backend, 'obtenir_modele_hedonique', lambda: modele)
+    df = _transactions(500)
+    analyse = dvf_backend.analyser_marche(df, '33063')
+
+    bien = dvf_backend.BienImmobilier('33063', 'Bordeaux', 60, 3, dvf_backend.Standing.STANDARD,
+                                      type_local='Local industriel')
+    estimation, warning = dvf_backend.estimer_par_modele(bien, analyse)
+    assert estimation.mode == 'moyenne'
+    assert warning == dvf_backend.MESSAGE_TYPE_HORS_MODELE
+
+    bien.type_local = 'Maison'
+    estimation, warning = dvf_backend.estimer_par_modele(bien, analyse)
+    assert estimation.mode == 'hedonique' and warning is None
+
+
+# ============================================================================
+# AJUSTEMENT (COMPLÉMENT DE SCHUR)
+# ============================================================================
+
+def _colonne(nom: str) -> int:
+    return VARIABLES.index(nom)
+
+
+def test_coefficients_retrouves():
+    entraineur = EntraineurHedonique()
+    # Deux blocs : les statistiques suffisantes s'accumulent
+    df = _transactions(bruit=0.01)
+    entraineur.ajouter(df.iloc[:1500])
+    entraineur.ajouter(df.iloc[1500:])
+    table = entraineur.ajuster()
+
+    beta = table['coefficients'][0]
+    assert beta[_colonne('log_surface')] == pytest.approx(COEF_LOG_SURFACE, abs=0.01)
+    assert beta[_colonne('pieces')] == pytest.approx(COEF_PIECES, abs=0.005)
+    assert beta[_colonne('type_Maison')] == pytest.approx(COEF_MAISON, abs=0.005)
+    # Effets annuels relatifs à la première année présente (référence exclue)
+    assert beta[_colonne('annee_2021')] == 0.0
+    for annee, effet in EFFETS_ANNEES.items():
+        assert beta[_colonne(f"annee_{annee}")] == pytest.approx(effet, abs=0.005)
+
+    effets = dict(zip(table['communes'], table['effets_communes']))
+    for code, effet in zip(COMMUNES, EFFETS_COMMUNES):
+        assert effets[code] == pytest.approx(effet, abs=0.02)
+    assert table['sigma'][0] == pytest.approx(0.01, rel=0.1)
+
+
+def test_prediction_identique_aux_moindres_carres_directs(modele):
+    df = _transactions()
+    surface = df['surface_reelle_bati'].to_numpy()
+    pieces = df['nombre_pieces_principales'].to_numpy()
+    annees = df['date_mutation'].dt.year.to_numpy()
+    y = np.log(df['valeur_fonciere'].to_numpy() / surface)
+
+    # Régression complète : variables actives + une indicatrice par commune
+    x = matrice_variables(surface, pieces, df['type_local'], annees)
+    x = x[:, (x != 0).any(axis=0)]
+    x = np.delete(x, -len(EFFETS_ANNEES), axis=1)  # année de référence
+    indicatrices = (df['code_commune'].to_numpy()[:, None] == np.asarray(COMMUNES)).astype(float)
+    conception = np.hstack([x, indicatrices])
+    attendu = conception @ np.linalg.lstsq(conception, y, rcond=None)[0]
+
+    prediction = modele.predire(df['code_commune'], surface, pieces, df['type_local'], annees)
+    np.testing.assert_allclose(np.log(prediction['prix_m2']), attendu, atol=1e-4)
@@ -0,0 +1,137 @@
+"""
+Estimateur Immobilier - Tests des statistiques de marché glissantes
+Quantiles et moyennes tronquées tirés des histogrammes logarithmiques comparés
+aux valeurs exactes sur les ventes (à une largeur de classe près), et prix
+pondéré dans le temps de `estimation_ponderee`.
+
+Usage :
+    python -m pytest -q test_dvf_marche.py
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dvf_marche
+from dvf_marche import StatistiquesMarche, indice_mois, quantiles_histogrammes
+
+# Écart relatif maximal dû à la discrétisation : une classe de prix
+TOLERANCE_CLASSE = math.exp(dvf_marche._LARGEUR_CLASSE) - 1
+CODE = '33063'
+
+
+def _ventes(n: int = 20_000, mois: int = 60, hausse_mensuelle: float = 0.0, graine: int = 0) -> pd.DataFrame:
+    """Ventes d'une commune réparties sur `mois` mois à partir de janvier 2019"""
+    rng = np.random.default_rng(graine)
+    age = rng.integers(mois, size=n)
+    dates = pd.to_datetime({'year': 2019 + age // 12, 'month': age % 12 + 1, 'day': 15})
+    surface = rng.uniform(20, 150, size=n)
+    prix_m2 = rng.lognormal(math.log(3000), 0.35, size=n) * (1 + hausse_mensuelle * age)
+    return pd.DataFrame({
+        'code_commune': CODE,
+        'date_mutation': dates,
+        'valeur_fonciere': prix_m2 * surface,
+        'surface_reelle_bati': surface,
+    })
+
+
+def _prix_m2(df: pd.DataFrame) -> np.ndarray:
+    return (df['valeur_fonciere'] / df['surface_reelle_bati']).to_numpy()
+
+
+def _quantile_pondere(valeurs: np.ndarray, poids: np.ndarray, q: float) -> float:
+    ordre = np.argsort(valeurs)
+    cumul = np.cumsum(poids[ordre])
+    return float(valeurs[ordre][np.searchsorted(cumul, q * cumul[-1])])
+
+
+@pytest.fixture(scope='module')
+def ventes():
+    return _ventes()
+
+
+@pytest.fixture(scope='module')
+def statistiques(ventes):
+    statistiques = StatistiquesMarche()
+    assert statistiques.ajouter(ventes) == len(ventes)
+    return statistiques
+
+
+# ============================================================================
+# STATISTIQUES SUR HISTOGRAMMES
+# ============================================================================
+
+@pytest.mark.parametrize('q', [0.05, 0.25, 0.5, 0.75, 0.95])
+def test_quantiles_a_une_classe_pres(statistiques, ventes, q):
+    _, nombres, _ = statistiques.histogrammes(CODE)
+    quantile = quantiles_histogrammes(nombres.sum(axis=0)[None, :], q)[0]
+    assert quantile == pytest.approx(np.quantile(_prix_m2(ventes), q), rel=TOLERANCE_CLASSE)
+
+
+def test_quantile_ligne_vide():
+    assert np.isnan(quantiles_histogrammes(np.zeros((1, dvf_marche.NB_CLASSES)), 0.5)[0])
+
+
+def test_serie_glissante_a_une_classe_pres(statistiques, ventes):
+    serie = statistiques.serie(CODE, pas='trimestre', fenetre=12)
+    assert len(serie) == 20
+    assert serie['ventes'].sum() == len(ventes)
+
+    # Dernier trimestre : fenêtre des 12 derniers mois (année 2023)
+    derniere = _prix_m2(ventes[ventes['date_mutation'].dt.year == 2023])
+    ligne = serie.iloc[-1]
+    assert ligne['volume'] == len(derniere)
+    assert ligne['mediane'] == pytest.approx(np.median(derniere), rel=TOLERANCE_CLASSE)
+
+    tries = np.sort(derniere)
+    coupe = int(len(tries) * dvf_marche.FRACTION_TRONQUEE)
+    assert ligne['moyenne_tronquee'] == pytest.approx(tries[coupe:len(tries) - coupe].mean(),
+                                                      rel=TOLERANCE_CLASSE)
+
+
+def test_ajout_incremental_identique(ventes):
+    en_une_fois = StatistiquesMarche()
+    en_une_fois.ajouter(ventes)
+    par_lots = StatistiquesMarche()
+    melangees = ventes.sample(frac=1, random_state=0)
+    for debut in range(0, len(melangees), 7000):
+        par_lots.ajouter(melangees.iloc[debut:debut + 7000])
+
+    for a, b in zip(en_une_fois.histogrammes(CODE), par_lots.histogrammes(CODE)):
+        np.testing.assert_allclose(a, b)
+
+
+# ============================================================================
+# ESTIMATION PONDÉRÉE DANS LE TEMPS
+# ============================================================================
+
+def test_estimation_ponderee_mediane_et_quartiles():
+    ventes = _ventes(hausse_mensuelle=0.01)
+    # Vente hors horizon : ignorée
+    ancienne = _ventes(n=1).assign(date_mutation=pd.Timestamp('2013-06-15'))
+    statistiques = StatistiquesMarche()
+    statistiques.ajouter(pd.concat([ventes, ancienne], ignore_index=True))
+
+    estimation = statistiques.estimation_ponderee(CODE)
+    age = statistiques.mois_max - ventes['date_mutation'].map(indice_mois).to_numpy()
+    poids = 0.5 ** (age / dvf_marche.DEMI_VIE_MOIS)
+    prix_m2 = _prix_m2(ventes)
+
+    assert estimation['volume'] == len(ventes)
+    assert estimation['volume_effectif'] == pytest.approx(poids.sum())
+    for cle, q in (('prix_m2_bas', 0.25), ('prix_m2', 0.5), ('prix_m2_haut', 0.75)):
+        assert estimation[cle] == pytest.approx(_quantile_pondere(prix_m2, poids, q), rel=TOLERANCE_CLASSE)
+
+    # Pondération : plus proche des ventes récentes que la médiane brute
+    assert estimation['prix_m2'] > np.median(prix_m2)
+    # Hausse de 1 % par mois sur une base de 3 000 €/m² (médiane) : environ 360 €/m²/an
+    assert estimation['tendance'] == pytest.approx(360, rel=0.15)
+
+
+def test_estimation_ponderee_volume_insuffisant(statistiques):
+    # Toutes les ventes ont plus de 5 ans à la référence
+    reference = indice_mois('2029-01-01')
+    assert statistiques.estimation_ponderee(CODE, mois_reference=reference) is None
+    assert statistiques.estimation_ponderee('99999') is None
@@ -0,0 +1,193 @@
+"""
+Estimateur Immobilier - Tests de la récupération DVF contre le serveur local
+Cache disque (hits, misses, revalidation 304), récupération concurrente de
+plusieurs communes et rejeu déterministe d'une archive avec erreurs 429/503
+injectées.
+
+Usage :
+    python -m pytest -q test_dvf_recuperation.py
+"""
+
+import pandas as pd
+import pytest
+
+import dvf_backend
+import dvf_fetch
+from dvf_rejeu import enregistrer_communes
+from dvf_serveur_local import ServeurDVFLocal, generer_csv_dvf
+
+ANNEES = (2022, 2023)
+COMMUNES = ('33063', '69123', '13055')
+
+
+@pytest.fixture(scope='module')
+def serveur():
+    with ServeurDVFLocal(nb_lignes=200) as srv:
+        yield srv
+
+
+@pytest.fixture
+def serveur_partiel(tmp_path, monkeypatch):
+    """Serveur sans génération : seul le millésime 2023 de Bordeaux existe (404 ailleurs)"""
+    fixtures = tmp_path / 'fixtures'
+    (fixtures / '2023').mkdir(parents=True)
+    (fixtures / '2023' / '33063.csv').write_bytes(generer_csv_dvf('33063', 2023, 200))
+    with ServeurDVFLocal(str(fixtures), generer=False) as srv:
+        monkeypatch.setattr(dvf_backend, 'URL_DATAGOUV', srv.url_datagouv)
+        monkeypatch.setattr(dvf_backend, 'URL_DVFPLUS', srv.url_dvfplus)
+        yield srv
+
+
+@pytest.fixture(autouse=True)
+def backend(serveur, tmp_path, monkeypatch):
+    """Backend pointé sur le serveur local, sans store ni voisinage, cache dans tmp_path"""
+    monkeypatch.setattr(dvf_backend, 'URL_DATAGOUV', serveur.url_datagouv)
+    monkeypatch.setattr(dvf_backend, 'URL_DVFPLUS', serveur.url_dvfplus)
+    dvf_backend.configurer_logs('ERROR')
+    dvf_backend.configurer_store(None)
+    dvf_backend.configurer_voisinage(None)
+    dvf_backend.configurer_hors_ligne(False)
+    dvf_backend.configurer_annees(ANNEES)
+    dvf_backend.configurer_cache(str(tmp_path / 'cache'))
+    dvf_fetch.configurer_rejeu(None)
+    dvf_fetch.configurer_session(requetes_par_seconde=None, backoff=0)
+    yield dvf_backend
+    dvf_fetch.configurer_rejeu(None)
+    dvf_fetch.configurer_session()
+    dvf_backend.configurer_cache(actif=False)
+
+
+# ============================================================================
+# CACHE DISQUE
+# ============================================================================
+
+def test_cache_hits_et_misses(serveur):
+    requetes = serveur.nb_requetes
+    df, warning = dvf_backend.recuperer_transactions_dvf('33063')
+    assert warning is None and not df.empty
+    assert serveur.nb_requetes - requetes == len(ANNEES)
+
+    stats = dvf_backend.obtenir_cache().stats()
+    assert stats['hits'] == 0
+    assert stats['ecritures'] >= len(ANNEES)
+
+    # Cache chaud : aucune requête, lecture de la fenêtre assemblée
+    requetes = serveur.nb_requetes
+    df_chaud, _ = dvf_backend.recuperer_transactions_dvf('33063')
+    assert serveur.nb_requetes == requetes
+    assert dvf_backend.obtenir_cache().stats()['hits'] == stats['hits'] + 1
+    pd.testing.assert_frame_equal(df_chaud, df, check_categorical=False)
+
+
+def test_revalidation_304(serveur, tmp_path):
+    df, _ = dvf_backend.recuperer_transactions_dvf('33063')
+
+    # TTL nul : chaque millésime est revalidé par une requête conditionnelle
+    dvf_backend.configurer_cache(str(tmp_path / 'cache'), ttl=0)
+    non_modifies = serveur.nb_non_modifies
+    df_revalide, warning = dvf_backend.recuperer_transactions_dvf('33063')
+
+    assert warning is None
+    assert serveur.nb_non_modifies - non_modifies == len(ANNEES)
+    pd.testing.assert_frame_equal(df_revalide, df, check_categorical=False)
+
+    # Source injoignable : l'entrée périmée sert de repli
+    dvf_backend.configurer_hors_ligne(True)
+    df_hors_ligne, warning = dvf_backend.recuperer_transactions_dvf('33063')
+    assert warning is None
+    assert len(df_hors_ligne) == len(df)
+
+
+def test_fenetre_partielle_sans_requete_a_chaud(serveur_partiel):
+    dvf_backend.configurer_annees(range(2019, 2025))
+    df, warning = dvf_backend.recuperer_transactions_dvf('33063')
+    assert warning is None and not df.empty
+    assert serveur_partiel.nb_requetes == 6
+
+    # Millésimes en 404 mis en cache comme entrées négatives : fenêtre lue sans réseau
+    df_chaud, warning = dvf_backend.recuperer_transactions_dvf('33063')
+    assert warning is None
+    assert serveur_partiel.nb_requetes == 6
+    pd.testing.assert_frame_equal(df_chaud, df, check_categorical=False)
+
+
+def test_commune_absente_sans_requete_a_chaud(serveur_partiel):
+    # Aucun millésime ni DVF+ : toutes les réponses 404 sont des entrées négatives
+    _, warning = dvf_backend.recuperer_transactions_dvf('33114')
+    assert dvf_backend.donnees_simulees(warning)
+    requetes = serveur_partiel.nb_requetes
+    assert requetes == len(ANNEES) + 1
+
+    hits = dvf_backend.obtenir_cache().stats()['hits']
+    _, warning = dvf_backend.recuperer_transactions_dvf('33114')
+    assert dvf_backend.donnees_simulees(warning)
+    assert serveur_partiel.nb_requetes == requetes
+    assert dvf_backend.obtenir_cache().stats()['hits'] == hits + len(ANNEES) + 1
+
+
+# ============================================================================
+# RÉCUPÉRATION CONCURRENTE
+# ============================================================================
+
+def test_communes_concurrentes_identiques_au_sequentiel(serveur):
+    dvf_backend.configurer_cache(actif=False)
+    sequentiel = dvf_backend.recuperer_transactions_communes(COMMUNES, workers=1)
+
+    requetes = serveur.nb_requetes
+    concurrent = dvf_backend.recuperer_transactions_communes(COMMUNES + COMMUNES[:1], workers=len(COMMUNES))
+
+    assert list(concurrent) == list(COMMUNES)
+    assert serveur.nb_requetes - requetes == len(COMMUNES) * len(ANNEES)
+    for code in COMMUNES:
+        df, warning = concurrent[code]
+        assert warning is None and not df.empty
+        pd.testing.assert_frame_equal(df, sequentiel[code][0], check_categorical=False)
+
+
+# ============================================================================
+# REJEU DÉTERMINISTE
+# ============================================================================
+
+def _rejouer(archive: str):
+    """Récupère COMMUNES en rejeu avec erreurs injectées, retourne (résultats, compteurs)"""
+    dvf_fetch.configurer_rejeu(archive, mode='rejouer', taux_erreur=0.5, graine=7)
+    resultats = dvf_backend.recuperer_transactions_communes(COMMUNES, workers=len(COMMUNES))
+    adaptateur = dvf_fetch.obtenir_session().get_adapter('http://')
+    return resultats, (adaptateur.nb_requetes, adaptateur.nb_erreurs_injectees)
+
+
+def test_rejeu_deterministe_avec_erreurs_injectees(serveur, tmp_path):
+    archive = str(tmp_path / 'archive')
+    resume = enregistrer_communes(archive, COMMUNES, workers=len(COMMUNES))
+    assert resume['communes'] == len(COMMUNES)
+
+    dvf_backend.configurer_cache(actif=False)
+    requetes = serveur.nb_requetes
+    premier, compteurs = _rejouer(archive)
+    second, compteurs_bis = _rejouer(archive)
+
+    assert serveur.nb_requetes == requetes  # aucun accès réseau en rejeu
+    assert compteurs == compteurs_bis
+    assert compteurs[1] > 0
+    for code in COMMUNES:
+        assert premier[code][1] == second[code][1]
+        pd.testing.assert_frame_equal(premier[code][0], second[code][0], check_categorical=False)
+
+
+def test_relances_soumises_au_limiteur(serveur, tmp_path):
+    archive = str(tmp_path / 'archive')
+    enregistrer_communes(archive, COMMUNES[:1])
+
+    dvf_backend.configurer_cache(actif=False)
+    dvf_fetch.configurer_session(requetes_par_seconde=1000, backoff=0)
+    dvf_fetch.configurer_rejeu(archive, mode='rejouer', taux_erreur=0.5, graine=7)
+    adaptateur = dvf_fetch.obtenir_session().get_adapter('http://')
+
+    jetons = []
+    attendre = adaptateur.limiteur.attendre
+    adaptateur.limiteur.attendre = lambda hote: (jetons.append(hote), attendre(hote))
+    dvf_backend.recuperer_transactions_dvf(COMMUNES[0])
+
+    # Chaque tentative, relances 429/503 comprises, prend un jeton
+    assert adaptateur.nb_erreurs_injectees > 0
+    assert len(jetons) == adaptateur.nb_requetes
@@ -0,0 +1,92 @@
+"""
+Estimateur Immobilier - Tests de la table des prix de référence
+Aller-retour calcul / écriture / lecture en mémoire mappée, ventes de types
+hors TYPES_REFERENCE comptées une seule fois dans les agrégats, et ordre de
+repli de `TableReferences.prix` (année, type, puis département).
+
+Usage :
+    python -m pytest -q test_dvf_references.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dvf_references import NB_VENTES_MIN, TableReferences, calculer_references, ecrire_references
+
+# (commune, type de local, année, prix au m², nombre de ventes)
+VENTES = [
+    ('33063', 'Appartement', 2022, 4000, 6),
+    ('33063', 'Local industriel. commercial ou assimilé', 2022, 10_000, 5),
+    ('33063', 'Appartement', 2023, 5000, NB_VENTES_MIN - 2),
+    ('33114', 'Maison', 2022, 2000, 5),
+]
+
+
+def _transactions() -> pd.DataFrame:
+    lignes = [(code, type_local, annee, prix_m2) for code, type_local, annee, prix_m2, nb in VENTES
+              for _ in range(nb)]
+    df = pd.DataFrame(lignes, columns=['code_commune', 'type_local', 'annee', 'prix_m2'])
+    return pd.DataFrame({
+        'code_commune': df['code_commune'],
+        'type_local': df['type_local'],
+        'date_mutation': pd.to_datetime(df['annee'].astype(str) + '-06-15'),
+        'valeur_fonciere': df['prix_m2'] * 50.0,
+        'surface_reelle_bati': 50.0,
+    })
+
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    chemin = str(tmp_path_factory.mktemp('references') / 'references_prix.bin')
+    ecrire_references(chemin, **calculer_references(_transactions()))
+    return TableReferences(chemin)
+
+
+# ============================================================================
+# ALLER-RETOUR
+# ============================================================================
+
+def test_aller_retour(tmp_path):
+    references = calculer_references(_transactions())
+    chemin = str(tmp_path / 'references_prix.bin')
+    ecrire_references(chemin, **references)
+    table = TableReferences(chemin)
+
+    assert len(table) == 3 and '33' in table and '33063' in table and '33000' not in table
+    np.testing.assert_array_equal(np.asarray(table._prix), references['prix'])
+
+
+def test_type_hors_reference_compte_une_fois(table):
+    # Tous types, toutes années : 6 × 4 000, 3 × 5 000, 5 × 10 000 (médiane 5 000)
+    assert table.prix('33063') == 5000
+    # Tous types en 2022 : 6 × 4 000 et 5 × 10 000
+    assert table.prix('33063', annee=2022) == 4000
+
+
+# ============================================================================
+# ORDRE DE REPLI
+# ============================================================================
+
+def test_type_et_annee_publies(table):
+    assert table.prix('33063', 'Appartement', 2022) == 4000
+
+
+def test_repli_sur_toutes_annees(table):
+    # Moins de NB_VENTES_MIN ventes en 2023, année hors table
+    assert table.prix('33063', 'Appartement', 2023) == 4000
+    assert table.prix('33063', 'Appartement', 2010) == 4000
+
+
+def test_repli_sur_tous_types(table):
+    # Aucune maison dans la commune : tous types de la même année, puis toutes années
+    assert table.prix('33063', 'Maison', 2022) == 4000
+    assert table.prix('33114', 'Appartement') == 2000
+    # Type hors TYPES_REFERENCE : tous types
+    assert table.prix('33063', 'Local industriel. commercial ou assimilé', 2022) == 4000
+
+
+def test_repli_sur_departement(table):
+    assert table.prix('33999', 'Maison', 2022) == 2000
+    assert table.prix('33999', 'Appartement', 2022) == 4000
+    assert table.prix('75056') is None
@@ -0,0 +1,69 @@
+"""
+Estimateur Immobilier - Tests de la table précalculée des statistiques
+La table construite en série et en parallèle (mémoire partagée) doit donner,
+commune par commune, ce que retourne `analyser_marche` sur les mêmes
+transactions.
+
+Usage :
+    python -m pytest -q test_dvf_stats_communes.py
+"""
+
+import pandas as pd
+import pytest
+
+import dvf_backend
+from dvf_serveur_local import generer_dataframe_dvf
+from dvf_stats_communes import TableStatsCommunes, construire_table
+
+ANNEES = (2021, 2022, 2023)
+# Effectifs et niveaux de prix différents : plages de communes déséquilibrées
+COMMUNES = {'33063': (400, 4500.0), '33114': (30, 2100.0), '69123': (250, 5200.0), '13055': (120, 3800.0)}
+
+
+@pytest.fixture(scope='module')
+def fichier_dvf(tmp_path_factory):
+    """Fichier DVF en masse (plusieurs communes et millésimes)"""
+    chemin = tmp_path_factory.mktemp('dvf') / 'full.csv'
+    pd.concat([
+        generer_dataframe_dvf(code, annee, nb_lignes, prix_m2)
+        for code, (nb_lignes, prix_m2) in COMMUNES.items() for annee in ANNEES
+    ], ignore_index=True).to_csv(chemin, index=False)
+    return str(chemin)
+
+
+@pytest.fixture(scope='module')
+def transactions(fichier_dvf):
+    return dvf_backend.lire_csv_dvf(fichier_dvf, colonnes_supplementaires=('code_commune',))
+
+
+@pytest.fixture(scope='module', params=[1, 2], ids=['serie', 'parallele'])
+def table(request, fichier_dvf, tmp_path_factory):
+    sortie = str(tmp_path_factory.mktemp('table') / 'stats.npz')
+    # Petits blocs : la lecture en flux assemble plusieurs morceaux
+    resume = construire_table([fichier_dvf], sortie, taille_chunk=500, workers=request.param)
+    assert resume['communes'] == len(COMMUNES)
+    return TableStatsCommunes(sortie)
+
+
+# ============================================================================
+# ÉQUIVALENCE AVEC analyser_marche
+# ============================================================================
+
+@pytest.mark.parametrize('code', list(COMMUNES))
+def test_table_identique_a_analyser_marche(table, transactions, code):
+    attendu = dvf_backend.analyser_marche(transactions[transactions['code_commune'] == code], code)
+    analyse = table.analyse(code)
+
+    assert analyse['stats'] == attendu['stats']
+    assert analyse['prix_moyen_m2'] == attendu['prix_moyen_m2']
+    assert analyse['tendance'] == pytest.approx(attendu['tendance'])
+
+    evolution = analyse['evolution']
+    assert evolution['annee'].tolist() == attendu['evolution']['annee'].tolist()
+    assert evolution['prix_m2'].to_numpy() == pytest.approx(attendu['evolution']['prix_m2'].to_numpy())
+
+
+def test_commune_absente(table):
+    assert '99999' not in table
+    assert table.analyse('99999') is None
+    assert len(table) == len(COMMUNES)
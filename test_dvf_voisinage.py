@@ -0,0 +1,128 @@
+"""
+Estimateur Immobilier - Tests du complément par les communes voisines
+Index de voisinage construit depuis un CSV de centroïdes et store local de
+quelques petites communes : les anneaux de voisines sont élargis jusqu'au
+seuil de transactions, pas au-delà, et les données ainsi complétées sont
+étiquetées autrement que les données simulées.
+
+Usage :
+    python -m pytest -q test_dvf_voisinage.py
+"""
+
+import pandas as pd
+import pytest
+
+import dvf_backend
+from dvf_serveur_local import generer_dataframe_dvf
+from dvf_store import ingerer_dvf
+from dvf_voisinage import IndexVoisinage, construire_index
+
+ANNEE = 2023
+SEUIL = dvf_backend.NB_TRANSACTIONS_MIN_VOISINAGE
+
+# Communes alignées d'ouest en est (longitude) ; avec deux plus proches
+# centroïdes, chaque anneau autour de CENTRE compte une commune de chaque côté
+CENTRE = '33100'
+LONGITUDES = {
+    '33105': -0.05, '33104': -0.04, '33103': -0.031, '33102': -0.021, '33101': -0.01,
+    CENTRE: 0.0,
+    '33111': 0.01, '33112': 0.019, '33113': 0.03, '33114': 0.04, '33115': 0.05,
+}
+# Ventes en store : le centre et le premier anneau restent sous le seuil, la
+# plus proche commune du deuxième anneau le franchit
+VENTES = {
+    CENTRE: 5, '33101': 5, '33111': 5,
+    '33112': 20, '33102': 40,
+    '33103': 20, '33113': 20,
+}
+
+
+def _ventes_valides(code: str, nb: int) -> pd.DataFrame:
+    """Exactement `nb` mutations retenues par le filtrage"""
+    brut = generer_dataframe_dvf(code, ANNEE, 3 * nb + 20)
+    valides = dvf_backend._filtrer_transactions(brut, ('code_commune',))
+    return brut.loc[valides.index[:nb]]
+
+
+@pytest.fixture(scope='module')
+def fichiers(tmp_path_factory):
+    dossier = tmp_path_factory.mktemp('voisinage')
+    centroides = dossier / 'communes.csv'
+    pd.DataFrame({
+        'code_insee': list(LONGITUDES),
+        'latitude': 44.8,
+        'longitude': list(LONGITUDES.values()),
+    }).to_csv(centroides, index=False)
+    construire_index(str(centroides), str(dossier / 'voisinage.npz'), k=2)
+
+    dvf = dossier / 'dvf.csv'
+    pd.concat([_ventes_valides(code, nb) for code, nb in VENTES.items()]).to_csv(dvf, index=False)
+    ingerer_dvf([str(dvf)], str(dossier / 'store'))
+    return str(dossier / 'voisinage.npz'), str(dossier / 'store')
+
+
+@pytest.fixture(autouse=True)
+def backend(fichiers, monkeypatch):
+    """Store et voisinage locaux, hors ligne et sans cache : aucune autre source"""
+    voisinage, store = fichiers
+    dvf_backend.configurer_logs('ERROR')
+    dvf_backend.configurer_store(store)
+    dvf_backend.configurer_voisinage(voisinage)
+    dvf_backend.configurer_hors_ligne(True)
+    dvf_backend.configurer_annees((ANNEE,))
+    dvf_backend.configurer_cache(actif=False)
+
+    # Communes effectivement lues par le complément
+    lues = []
+    transactions_locales = dvf_backend._transactions_locales
+    monkeypatch.setattr(dvf_backend, '_transactions_locales',
+                        lambda code: (lues.append(code), transactions_locales(code))[1])
+    yield lues
+    dvf_backend.configurer_store(None)
+    dvf_backend.configurer_voisinage(None)
+    dvf_backend.configurer_hors_ligne(False)
+
+
+# ============================================================================
+# ÉLARGISSEMENT DES ANNEAUX
+# ============================================================================
+
+def test_anneaux_du_centroide(fichiers):
+    index = IndexVoisinage(fichiers[0])
+    assert list(index.anneaux(CENTRE, 3)) == [['33101', '33111'], ['33112', '33102'], ['33113', '33103']]
+
+
+def test_elargissement_arrete_au_seuil(backend):
+    df, warning = dvf_backend.recuperer_transactions_dvf(CENTRE)
+
+    # Centre + premier anneau (15 ventes) puis la plus proche du deuxième (20) :
+    # 33102, plus loin dans le même anneau, n'est pas retenue
+    assert len(df) == VENTES[CENTRE] + VENTES['33101'] + VENTES['33111'] + VENTES['33112'] >= SEUIL
+    assert warning == dvf_backend.MESSAGE_VOISINAGE.format(nb=3)
+    # Troisième anneau jamais lu
+    assert not {'33103', '33113'} & set(backend)
+
+
+def test_commune_au_dessus_du_seuil_non_completee(backend):
+    df, warning = dvf_backend.recuperer_transactions_dvf('33102')
+    assert warning is None
+    assert len(df) == VENTES['33102']
+    assert backend == []
+
+
+# ============================================================================
+# ÉTIQUETAGE DE LA SOURCE
+# ============================================================================
+
+def test_voisinage_distingue_des_donnees_simulees():
+    _, warning = dvf_backend.recuperer_transactions_dvf(CENTRE)
+    assert not dvf_backend.donnees_simulees(warning)
+    assert dvf_backend.source_donnees(warning) == dvf_backend.SOURCE_VOISINAGE
+
+    # Commune absente du store et de l'index : simulation
+    _, warning = dvf_backend.recuperer_transactions_dvf('33199')
+    assert dvf_backend.donnees_simulees(warning)
+    assert dvf_backend.source_donnees(warning) == dvf_backend.SOURCE_SIMULEE
+
+    # Commune au-dessus du seuil : ses propres ventes
+    assert dvf_backend.source_donnees(dvf_backend.recuperer_transactions_dvf('33102')[1]) == dvf_backend.SOURCE_DVF